@@ -1,30 +1,47 @@
+import importlib
+from collections import OrderedDict
+
 import panel as pn
 import panel_material_ui as pmu
 
 from panel_lca_app_concept.theming import theme_config
-from panel_lca_app_concept.demo_databases import add_chem_demo_project
-from panel_lca_app_concept.pages.home import create_home_view
-from panel_lca_app_concept.pages.calculation_setup import create_calculation_setup_view
-from panel_lca_app_concept.pages.impact_overview import create_impact_overview_view
+from panel_lca_app_concept.demo_databases import ensure_demo_project
+from panel_lca_app_concept.events import THEME_CHANGED, publish
+from panel_lca_app_concept.metrics import timed
 
 # Initialize Panel extensions
 pn.extension("plotly", "tabulator", notifications=True)
 pn.config.css_files.append("https://fonts.googleapis.com/icon?family=Material+Icons+Outlined")
 
-# Initialize demo data
-add_chem_demo_project()
+# Initialize demo data, restored from the prebuilt snapshot if it is outdated
+ensure_demo_project()
 
-# Route mapping for hash-based navigation
+# Route mapping for hash-based navigation: route -> (page module, view function).
+# Pages are imported when their route is first visited, so starting a worker
+# does not load bw2calc, plotly and the other page dependencies.
 ROUTES = {
-    "home": create_home_view,
-    "modeling/calculation-setup": create_calculation_setup_view,
-    "results/impact-overview": create_impact_overview_view,
+    "home": ("panel_lca_app_concept.pages.home", "create_home_view"),
+    "modeling/calculation-setup": ("panel_lca_app_concept.pages.calculation_setup", "create_calculation_setup_view"),
+    "results/impact-overview": ("panel_lca_app_concept.pages.impact_overview", "create_impact_overview_view"),
+    "results/contribution-analysis": ("panel_lca_app_concept.pages.contribution_analysis", "create_contribution_analysis_view"),
+}
+
+# Route most likely visited next, built in the background after a route is shown
+PREFETCH_ROUTES = {
+    "home": "modeling/calculation-setup",
+    "modeling/calculation-setup": "results/impact-overview",
+    "results/impact-overview": "results/contribution-analysis",
 }
 
+# Number of built views kept per session
+VIEW_CACHE_SIZE = 4
+
 class App:
     def __init__(self):
         # Create containers for main content
         self.main_container = pn.Column(sizing_mode="stretch_width")
+        # Views built in this session, by route
+        self._views = OrderedDict()
 
         # Create nav buttons BEFORE any rendering so highlight logic works
         self.home_button = pmu.Button(
@@ -69,6 +86,7 @@ class App:
             "home": self.home_button,
             "modeling/calculation-setup": self.modeling_button,
             "results/impact-overview": self.results_button,
+            "results/contribution-analysis": self.results_button,
         }
 
         nav = pn.Row(
@@ -115,6 +133,8 @@ class App:
             theme_config=theme_config,
         )
 
+        self.page.param.watch(self._on_theme_toggle, "dark_theme")
+
         # Set up routing once the page is loaded (ensures hash is available on reload)
         pn.state.onload(self._setup_routing)
 
@@ -134,6 +154,11 @@ class App:
         # Watch for future hash changes (back/forward, button clicks)
         loc.param.watch(self.render_from_location, "hash")
 
+    def _on_theme_toggle(self, event):
+        """Tell charts about a theme flip instead of having them poll for it"""
+        pn.config.theme = "dark" if event.new else "default"
+        publish(THEME_CHANGED, dark=event.new)
+
     def _highlight_active_button(self, path: str):
         default_ss = [
             ":host .MuiButton-text {font-size: 14px; font-weight: 400;} .MuiIcon-root {font-family: 'Material Icons Outlined' !important;}"
@@ -186,8 +211,9 @@ class App:
         return (pn.state.location.hash or "").lstrip("#/").strip("/") or "home"
 
     def resolve_view(self, path: str):
-        """Get the view function for a given path"""
-        return ROUTES.get(path, ROUTES["home"])
+        """Get the view function for a given path, importing its page on first use"""
+        module, name = ROUTES.get(path, ROUTES["home"])
+        return getattr(importlib.import_module(module), name)
 
     def render_from_location(self, _=None):
         """Update view and menu selection based on current hash"""
@@ -195,22 +221,54 @@ class App:
         self._highlight_active_button(path)
         self._render_route(path)
 
+    def _get_view(self, path: str):
+        """Get the view of a route, building it only if it is not cached yet"""
+        key = ROUTES.get(path, ROUTES["home"])
+        if key in self._views:
+            self._views.move_to_end(key)
+            return self._views[key], True
+        # Builds are timed apart from _render_route, which mostly swaps cached views
+        with timed("app._build_view"):
+            view = self.resolve_view(path)()
+        self._views[key] = view
+        while len(self._views) > VIEW_CACHE_SIZE:
+            self._views.popitem(last=False)
+        return view, False
+
+    def _prefetch(self, path: str):
+        """Build the view of a route in the next event loop iteration, if not cached"""
+        # Checked without importing the page, that is left to the background build
+        if ROUTES.get(path, ROUTES["home"]) in self._views:
+            return
+
+        def build():
+            try:
+                self._get_view(path)
+            except Exception as e:
+                print(f"Error prefetching route {path}: {e}")
+
+        if pn.state.curdoc is not None:
+            pn.state.execute(build, schedule=True)
+
+    @timed("app._render_route")
     def _render_route(self, path: str):
         """Render the given route path"""
         try:
-            # Get view function for current path
-            main_func = self.resolve_view(path)
+            main_view, _ = self._get_view(path)
 
-            # Update main content
-            main_view = main_func()
-            self.main_container.clear()
-            self.main_container.append(main_view)
+            # Swap the view in, the previous one stays cached for the next visit
+            if len(self.main_container) != 1 or self.main_container[0] is not main_view:
+                self.main_container.objects = [main_view]
 
         except Exception as e:
             print(f"Error rendering route {path}: {e}")
             # Fallback to home if there's an error
             if path != "home":
                 self._render_route("home")
+            return
+
+        if path in PREFETCH_ROUTES:
+            self._prefetch(PREFETCH_ROUTES[path])
 
 # Create and serve the app
 app = App()
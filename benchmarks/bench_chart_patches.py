@@ -0,0 +1,133 @@
+"""
+Measure what a chart update sends to the browser.
+
+Renders the stacked bar and Sankey figures in a Plotly pane attached to a
+Bokeh document and records every document change an update causes. Each
+change is serialized as the PATCH-DOC message the server would send, so the
+printed counts and sizes (JSON plus binary buffers) are per user action.
+The per-trace assignments ``charts.py`` used before ``patch_figure``, and
+the loop-based Sankey with one link per product and stage it drew before
+minor flows were folded, are kept below as the reference.
+
+    python benchmarks/bench_chart_patches.py --products 8 500
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import panel as pn
+import plotly.graph_objects as go
+from bokeh.document import Document
+from bokeh.protocol import Protocol
+
+from panel_lca_app_concept import charts
+from panel_lca_app_concept.calculation import N_CONTRIBUTORS, OTHER_LABEL
+
+COLORS = [f"#{i:02x}4fcf" for i in range(0, 255, 28)]
+
+
+def results(n_products: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    stages = [f"process {i} (GLO)" for i in range(N_CONTRIBUTORS)] + [OTHER_LABEL]
+    return pd.DataFrame(
+        [(f"product {p}", stage, float(rng.uniform(0, 10))) for p in range(n_products) for stage in stages],
+        columns=["product", "stage", "value"],
+    )
+
+
+def legacy_update_stacked_bars(fig, df, norm=False, colors=None, unit="kg CO₂e"):
+    df = charts._prep(df, norm)
+    stages = charts._stages(df)
+    wide = df.pivot_table(index="product", columns="stage", values="value", aggfunc="sum").fillna(0)
+    bg = charts.current_bg_color()
+    for i, stage in enumerate(stages):
+        fig.data[i].x = wide.index; fig.data[i].y = wide[stage]
+        fig.data[i].hovertemplate = charts._hovertemplate(stage, norm, unit)
+        fig.data[i].marker.line.color = bg
+        if colors: fig.data[i].marker.color = colors[i % len(colors)]
+    fig.update_layout(yaxis_title=(unit if not norm else "Share"))
+
+
+def legacy_sankey_links(df):
+    # Total footprint -> products -> stages
+    prod_totals = df.groupby("product", sort=False)["value"].sum()
+    products = list(prod_totals.index)
+    stages = charts._stages(df)
+    nodes = ["Total footprint"] + products + stages
+    idx_total = 0
+    idx_prod = {p: i+1 for i,p in enumerate(products)}
+    off_stage = 1+len(products)
+    idx_stage = {s: off_stage+i for i,s in enumerate(stages)}
+    src,tgt,val=[],[],[]
+    for p in products: src+= [idx_total]; tgt+= [idx_prod[p]]; val+= [float(prod_totals[p])]
+    flows = df.groupby(["product", "stage"], sort=False)["value"].sum()
+    for (p, s), v in flows.items(): src+= [idx_prod[p]]; tgt+= [idx_stage[s]]; val+= [float(v)]
+    return nodes, src, tgt, val
+
+
+def legacy_plot_sankey(df) -> go.Figure:
+    nodes, src, tgt, val = legacy_sankey_links(df)
+    rng = np.random.default_rng(0)
+    node_cols = [f"rgba({50+rng.integers(0,205)},{50+rng.integers(0,205)},{50+rng.integers(0,205)},1.0)" for _ in nodes]
+    link_cols = [node_cols[s].replace(",1.0)",",0.5)") for s in src]
+    return go.Figure([go.Sankey(arrangement="snap",
+        node=dict(label=nodes, pad=15, thickness=20, color=node_cols),
+        link=dict(source=src, target=tgt, value=val, color=link_cols)
+    )])
+
+
+def legacy_update_sankey(fig, df):
+    nodes, src, tgt, val = legacy_sankey_links(df)
+    fig.data[0].link.value = val
+
+
+def measure(fig, update) -> tuple[int, int]:
+    """Run ``update()`` on a rendered figure and return (messages, bytes) it causes."""
+    pane = pn.pane.Plotly(fig)
+    doc = Document()
+    root = pane.get_root(doc)
+    doc.add_root(root)
+    events = []
+    doc.on_change(events.append)
+    update()
+    protocol = Protocol()
+    size = 0
+    for event in events:
+        msg = protocol.create("PATCH-DOC", [event])
+        size += len(msg.header_json) + len(msg.metadata_json) + len(msg.content_json)
+        size += sum(len(buffer.to_bytes()) for buffer in msg.buffers)
+    pane._cleanup(root)
+    return len(events), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[8, 500])
+    args = parser.parse_args()
+
+    print(f"{'products':>8} {'chart':<13} {'path':<7} {'messages':>8} {'bytes':>10}")
+    for n in args.products:
+        before, after = results(n, seed=0), results(n, seed=1)
+        cases = {
+            "stacked bars": (
+                lambda: charts.plot_stacked_bars(before, colors=COLORS),
+                lambda fig: legacy_update_stacked_bars(fig, after, colors=COLORS),
+                lambda: charts.plot_stacked_bars(before, colors=COLORS),
+                lambda fig: charts.update_stacked_bars(fig, after, colors=COLORS),
+            ),
+            "sankey": (
+                lambda: legacy_plot_sankey(before),
+                lambda fig: legacy_update_sankey(fig, after),
+                lambda: charts.plot_sankey(before),
+                lambda fig: charts.update_sankey(fig, after),
+            ),
+        }
+        for chart, (legacy_plot, legacy, plot, patched) in cases.items():
+            for path, make, update in (("legacy", legacy_plot, legacy), ("patch", plot, patched)):
+                fig = make()
+                messages, size = measure(fig, lambda: update(fig))
+                print(f"{n:>8} {chart:<13} {path:<7} {messages:>8} {size:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare ``SearchIndex`` against the linear scan ``bw.filter_results`` used to do.
+
+Runs on synthetic in-memory records, so the scan is timed without the SQLite
+reads and Activity proxies it paid for originally; the real gap is larger.
+
+    python benchmarks/bench_search.py --rows 20000 50000
+"""
+import argparse
+import random
+import string
+import time
+
+from panel_lca_app_concept.search import SearchIndex
+
+QUERIES = [
+    {"name": "m"},
+    {"name": "market for"},
+    {"name": "electricity", "location": "DE"},
+    {"product": "steel", "location": "RER"},
+    {"name": "production of", "product": "acid"},
+    {"name": "zz"},
+]
+WORDS = [
+    "market for", "production of", "treatment of", "electricity", "heat", "steel",
+    "acid", "methanol", "ammonia", "cement", "transport", "waste", "voltage",
+]
+LOCATIONS = ["DE", "FR", "CH", "RER", "GLO", "RoW", "US", "CN", "CA-QC", "IN"]
+
+
+def make_records(n: int, seed: int = 0):
+    """ecoinvent-like records: each product is made in several locations."""
+    rng = random.Random(seed)
+    products = [
+        f"{rng.choice(WORDS)} {''.join(rng.choices(string.ascii_lowercase, k=6))}"
+        for _ in range(max(n // 5, 1))
+    ]
+    for i in range(n):
+        product = rng.choice(products)
+        name = f"{rng.choice(WORDS[:3])} {product}"
+        yield i, name, product, rng.choice(LOCATIONS)
+
+
+def scan(records, name="", product="", location="", limit=100):
+    """The pre-index ``filter_results`` loop over plain dicts."""
+    result = [
+        act["id"] for act in records
+        if name.lower() in act.get("name").lower()
+        and product.lower() in act.get("reference product", "").lower()
+        and location.lower() in act.get("location", "").lower()
+    ]
+    return result[:limit]
+
+
+def keystrokes(query):
+    """Every intermediate query while typing ``query`` field by field."""
+    typed, strokes = {}, []
+    for field, term in query.items():
+        for i in range(1, len(term) + 1):
+            typed[field] = term[:i]
+            strokes.append(dict(typed))
+    return strokes
+
+
+def timed(func, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 20_000, 100_000])
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    for n in args.rows:
+        records = list(make_records(n))
+        dicts = [
+            {"id": i, "name": nm, "reference product": pr, "location": loc}
+            for i, nm, pr, loc in records
+        ]
+        build = timed(lambda: SearchIndex.from_records(records), repeat=1)
+        # Each field remembers its last term, so the correctness check gets its own index
+        checked, index = SearchIndex.from_records(records), SearchIndex.from_records(records)
+        print(f"\n{n} rows, index build {build * 1e3:.1f} ms")
+        for query in QUERIES:
+            expected = scan(dicts, **query, limit=args.limit)
+            assert checked.search(**query, limit=args.limit) == expected, query
+            strokes = keystrokes(query)
+            t_scan = timed(lambda: [scan(dicts, **q, limit=args.limit) for q in strokes], 3)
+            t_index = timed(
+                lambda: [index.search(**q, limit=args.limit) for q in strokes], 3
+            )
+            print(
+                f"  {str(query):50s} {len(strokes):2d} keys"
+                f"  scan {t_scan / len(strokes) * 1e3:7.2f} ms/key"
+                f"  index {t_index / len(strokes) * 1e3:7.3f} ms/key"
+                f"  x{t_scan / max(t_index, 1e-9):.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Time the data, chart and Brightway hot paths and check them for regressions.
+
+Builds one synthetic Brightway project per size with
+``add_synthetic_database`` in a temporary ``BRIGHTWAY2_DIR`` (or ``--bw-dir``)
+and times the functions pages call on every interaction. Each entry is the best
+of ``--repeat`` runs in milliseconds. ``--output`` saves them as JSON,
+``--compare`` reports every entry that got slower than a saved run by more
+than ``--threshold`` (and ``--noise-ms``) and exits with status 1 if there is
+one. Nothing needs a network connection.
+
+    python benchmarks/bench_suite.py --sizes 1000 10000 100000 --output bench.json
+    python benchmarks/bench_suite.py --sizes 1000 10000 --compare bench.json
+    python benchmarks/bench_suite.py --compare bench.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+SEARCH_QUERIES = [
+    {"name": "production"},
+    {"product": "product 12"},
+    {"name": "product 1", "location": "DE"},
+]
+METHOD_WORDS = ["climate change", "acidification", "eutrophication", "land use", "water use", "toxicity"]
+
+
+def timed(func, repeat=5):
+    """Best of ``repeat`` runs of ``func()`` in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def make_methods(n: int, seed: int = 0) -> list[tuple]:
+    """``n`` distinct method tuples shaped like ecoinvent's (source, method, category, indicator)."""
+    rng = np.random.default_rng(seed)
+    sources = [f"source {i}" for i in range(max(n // 500, 1))]
+    return [
+        (
+            sources[i % len(sources)],
+            f"method {rng.integers(0, 20)}",
+            f"{METHOD_WORDS[i % len(METHOD_WORDS)]} {rng.integers(0, 10)}",
+            f"indicator {i}",
+        )
+        for i in range(n)
+    ]
+
+
+def bench_brightway(sizes, repeat) -> dict:
+    from bw2data import projects
+
+    from panel_lca_app_concept import bw
+    from panel_lca_app_concept.demo_databases import add_synthetic_database
+    from panel_lca_app_concept.helpers import build_nested_options
+
+    results = {}
+    for n in sizes:
+        projects.set_current(f"bench-{n}")
+        start = time.perf_counter()
+        add_synthetic_database(n)
+        print(f"{n} activities written in {time.perf_counter() - start:.1f} s")
+
+        # The catalog is cached until the database changes, so time the first load
+        bw._catalog_cache.clear()
+        results[f"bw.load_process_catalog.cold[{n}]"] = timed(lambda: bw.load_process_catalog("synthetic"), 1)
+        results[f"bw.load_process_catalog[{n}]"] = timed(lambda: bw.load_process_catalog("synthetic"), repeat)
+        # One page of the process table, filtered and sorted like the Tabulator sends it
+        results[f"bw.query_processes[{n}]"] = timed(
+            lambda: bw.query_processes("synthetic", SEARCH_QUERIES[0], [("product", True)], offset=n // 2), repeat
+        )
+        process_ids = bw.query_processes("synthetic", limit=repeat)["id"].tolist()
+        bw._process_details.cache_clear()
+        results[f"bw.load_process_details.cold[{n}]"] = timed(
+            lambda: bw.load_process_details(process_ids.pop()), len(process_ids)
+        )
+        # The first search builds the shared index, later ones only query it
+        bw._search_indices.clear()
+        bw._catalog_cache.clear()
+        results[f"bw.filter_results.cold[{n}]"] = timed(
+            lambda: bw.filter_results("synthetic", **SEARCH_QUERIES[0]), 1
+        )
+        results[f"bw.filter_results[{n}]"] = timed(
+            lambda: [bw.filter_results("synthetic", **query) for query in SEARCH_QUERIES], repeat
+        )
+        bw._count_processes.cache_clear()
+        results[f"bw.count_processes.cold[{n}]"] = timed(
+            lambda: bw.count_processes("synthetic", SEARCH_QUERIES[2]), 1
+        )
+        methods = make_methods(n)
+        results[f"helpers.build_nested_options[{n}]"] = timed(lambda: build_nested_options(methods), repeat)
+    return results
+
+
+def bench_charts(repeat) -> dict:
+    from panel_lca_app_concept.charts import plot_sankey, plot_stacked_bars, update_sankey
+    from panel_lca_app_concept.data import PRODUCTS, compute_footprint
+
+    df = compute_footprint(PRODUCTS)
+    fewer = compute_footprint(PRODUCTS[:3])
+    fig = plot_sankey(df)
+    return {
+        "data.compute_footprint": timed(lambda: compute_footprint(PRODUCTS), repeat),
+        "charts.plot_stacked_bars": timed(lambda: plot_stacked_bars(df), repeat),
+        "charts.plot_sankey": timed(lambda: plot_sankey(df), repeat),
+        "charts.update_sankey": timed(lambda: (update_sankey(fig, fewer), update_sankey(fig, df)), repeat),
+    }
+
+
+def bench_demo_project() -> dict:
+    from panel_lca_app_concept.demo_databases import add_chem_demo_project
+
+    # Deletes and rebuilds the project every time, so one run is representative
+    return {"demo_databases.add_chem_demo_project": timed(add_chem_demo_project, 1)}
+
+
+def compare(baseline: dict, current: dict, threshold: float, noise_ms: float) -> list[str]:
+    """Print both runs side by side and return the names of the regressed entries."""
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[name], current[name]
+        change = new / old - 1 if old else 0.0
+        regressed = change > threshold and new - old > noise_ms
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<48} {old:>10.2f} {new:>10.2f} {change:>+8.0%}{'  REGRESSION' if regressed else ''}")
+    for name in sorted(baseline.keys() ^ current.keys()):
+        print(f"{name:<48} only in {'baseline' if name in baseline else 'current run'}")
+    return regressions
+
+
+def load(path) -> dict:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--bw-dir", help="Brightway directory for the benchmark projects, a temporary one by default")
+    parser.add_argument("--skip-demo", action="store_true", help="don't time add_chem_demo_project")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="baseline results; with a second file, compare the two without running")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--noise-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        regressions = compare(load(args.compare[0]), load(args.compare[1]), args.threshold, args.noise_ms)
+        sys.exit(1 if regressions else 0)
+
+    # bw2data reads its directory on import, so set it before anything imports it
+    bw_dir = args.bw_dir or tempfile.mkdtemp(prefix="panel-lca-bench-")
+    os.environ["BRIGHTWAY2_DIR"] = bw_dir
+    print(f"Brightway directory: {bw_dir}")
+
+    results = bench_brightway(args.sizes, args.repeat)
+    results.update(bench_charts(args.repeat))
+    if not args.skip_demo:
+        results.update(bench_demo_project())
+
+    print(f"\n{'benchmark':<48} {'ms':>10}")
+    for name, ms in results.items():
+        print(f"{name:<48} {ms:>10.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved to {args.output}")
+
+    if args.compare:
+        regressions = compare(load(args.compare[0]), results, args.threshold, args.noise_ms)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measure what appending, deleting and editing a table row costs.
+
+Attaches a Tabulator to a Bokeh document and records every document change
+one row operation causes. Each change is serialized as the PATCH-DOC message
+the server would send. The printed time covers the update and the
+serialization, i.e. the server's share of the round trip. "legacy" rebuilds
+the DataFrame and assigns it, as the calculation setup page did before
+``TableModel``.
+
+    python benchmarks/bench_table_patches.py --rows 1000 10000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import panel as pn
+from bokeh.document import Document
+from bokeh.protocol import Protocol
+
+from panel_lca_app_concept.tables import TableModel
+
+
+def table(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Amount": rng.uniform(0, 10, n_rows),
+        "id": np.arange(n_rows, dtype=np.int64),
+        "Product": [f"product {i}" for i in range(n_rows)],
+        "Process": [f"production of product {i}" for i in range(n_rows)],
+        "Location": rng.choice(["DE", "FR", "GLO", "RoW"], n_rows),
+    })
+
+
+def measure(df, update) -> tuple[int, int, float]:
+    """Run ``update(table)`` on a rendered Tabulator and return (messages, bytes, ms)."""
+    widget = pn.widgets.Tabulator(df, pagination=None, show_index=False, hidden_columns=["id"])
+    doc = Document()
+    root = widget.get_root(doc)
+    doc.add_root(root)
+    events = []
+    doc.on_change(events.append)
+    protocol = Protocol()
+    start = time.perf_counter()
+    update(widget)
+    size = 0
+    for event in events:
+        msg = protocol.create("PATCH-DOC", [event])
+        size += len(msg.header_json) + len(msg.metadata_json) + len(msg.content_json)
+        size += sum(len(buffer.to_bytes()) for buffer in msg.buffers)
+    elapsed = (time.perf_counter() - start) * 1000
+    widget._cleanup(root)
+    return len(events), size, elapsed
+
+
+def legacy_append(widget, row):
+    widget.value = pd.concat([widget.value, row], ignore_index=True)
+
+
+def legacy_delete(widget, position):
+    df = widget.value.reset_index(drop=True)
+    widget.value = df.drop(index=position).reset_index(drop=True)
+
+
+def legacy_edit(widget, position, amount):
+    df = widget.value.copy()
+    df.iloc[position, df.columns.get_loc("Amount")] = amount
+    widget.value = df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'operation':<9} {'path':<7} {'messages':>8} {'bytes':>12} {'ms':>8}")
+    for n in args.rows:
+        df = table(n)
+        row = table(1)
+        middle = n // 2
+        cases = {
+            "append": (
+                lambda w: legacy_append(w, row),
+                lambda w: TableModel(w).append(row),
+            ),
+            "delete": (
+                lambda w: legacy_delete(w, middle),
+                lambda w: TableModel(w).delete([TableModel(w).row_id(middle)]),
+            ),
+            "edit": (
+                lambda w: legacy_edit(w, middle, 42.0),
+                lambda w: TableModel(w).update(TableModel(w).row_id(middle), Amount=42.0),
+            ),
+        }
+        for operation, (legacy, model) in cases.items():
+            for path, update in (("legacy", legacy), ("model", model)):
+                messages, size, elapsed = measure(df, update)
+                print(f"{n:>7} {operation:<9} {path:<7} {messages:>8} {size:>12,} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,307 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+
 import bw2data as bd
-import bw2calc as bc
+import pandas as pd
+from peewee import fn
+from tornado.ioloop import IOLoop
 from bw2data.backends import ActivityDataset as AD
-from panel_lca_app_concept.helpers import build_nested_options
+from bw2data.backends import ExchangeDataset as ED
+from bw2data.backends import Activity, Exchange, sqlite3_lci_db
+from panel_lca_app_concept.helpers import MethodTree, build_nested_options
+from panel_lca_app_concept.metrics import timed
+from panel_lca_app_concept.search import SearchIndex
+from panel_lca_app_concept.workers import forward_writes, is_reader, on_change, project_lock
+
+# Process catalogs shared by all sessions: (project, db) -> (modified, DataFrame)
+_catalog_cache = {}
+# Search indices shared by all sessions: (project, db) -> (modified, SearchIndex)
+_search_indices = {}
+# Method trees shared by all sessions: project -> (methods.json version, MethodTree)
+_method_trees = {}
+# Exchange lists of recently shown processes kept by load_process_details
+PROCESS_DETAILS_CACHE_SIZE = 128
+# Catalog columns that can be filtered and sorted in the database
+_PROCESS_FIELDS = {"product": AD.product, "name": AD.name, "location": AD.location}
+# Event loop that switches projects, so worker threads never rebind bw2data's database themselves
+_loop = None
+_loop_thread = None
 
 
+@timed()
 def list_projects() -> list[str]:
     """List all available Brightway2 projects."""
     return [proj.name for proj in bd.projects]
 
+@timed()
 def set_current_project(project_name: str) -> None:
-    """Set the current Brightway2 project."""
-    bd.projects.set_current(project_name)
+    """Set the current Brightway2 project, read-only in reader processes."""
+    global _loop, _loop_thread
+    loop = IOLoop.current(instance=False)
+    if loop is not None:
+        _loop, _loop_thread = loop, threading.get_ident()
+    # Switching reconnects the SQLite database, so it is skipped if the project is current already
+    if bd.projects.current != project_name:
+        with project_lock:
+            bd.projects.set_current(project_name, writable=not is_reader())
+
+def _switch_on_loop(project_name: str) -> None:
+    if _loop is None or threading.get_ident() == _loop_thread:
+        set_current_project(project_name)
+        return
+    switched = Future()
+
+    def switch():
+        try:
+            set_current_project(project_name)
+        except Exception as e:
+            switched.set_exception(e)
+        else:
+            switched.set_result(None)
 
+    _loop.add_callback(switch)
+    switched.result()
+
+@contextmanager
+def project_data(project_name: str | None):
+    """
+    Keep ``project_name`` current while reading its data, e.g. in a job.
+
+    bw2data has one current project per process and switching it rebinds
+    the SQLite database under every thread, so worker threads never switch
+    themselves: if another project is current, the event loop is asked to
+    switch and the block waits until it has. Sessions switching projects
+    wait for the block, so keep it to the database reads. With ``None``,
+    the current project is used as is. Only the wait for the project is
+    timed, as ``bw.project_data``.
+    """
+    if project_name is None:
+        yield
+        return
+    with timed("bw.project_data"):
+        while True:
+            project_lock.acquire()
+            if bd.projects.current == project_name:
+                break
+            project_lock.release()
+            _switch_on_loop(project_name)
+    try:
+        yield
+    finally:
+        project_lock.release()
+
+@timed()
+def data_version() -> tuple:
+    """Changes whenever a database of the current project is modified or methods are registered or deleted."""
+    databases = tuple(sorted((name, meta.get("modified")) for name, meta in bd.databases.items()))
+    return _methods_version(), databases
+
+@timed()
 def list_databases() -> list[str]:
     """List all available Brightway2 projects."""
     return list(bd.databases)
 
-def list_processes(db_name: str):
-    """List all processes in a given Brightway2 database."""
-    db = bd.Database(db_name)
-    return list((act for act in db))
+@timed()
+def load_process_catalog(db_name: str) -> pd.DataFrame:
+    """
+    Load id, reference product, name and location of every node in a database.
+
+    Only these columns are read from ``ActivityDataset`` in a single query, no
+    Activity proxies are built. The string columns are stored as categoricals.
+    One copy is kept per (project, database) and rebuilt only when the
+    database's ``modified`` timestamp changes, so the returned frame is shared
+    and must not be modified in place.
+    """
+    key = (bd.projects.current, db_name)
+    modified = bd.databases[db_name].get("modified")
+    cached = _catalog_cache.get(key)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+
+    query = (
+        AD.select(AD.id, AD.product, AD.name, AD.location)
+        .where(AD.database == db_name)
+        .tuples()
+    )
+    catalog = pd.DataFrame.from_records(
+        list(query), columns=["id", "product", "name", "location"]
+    ).astype({
+        "id": "int64",
+        "product": "category",
+        "name": "category",
+        "location": "category",
+    })
+    _catalog_cache[key] = (modified, catalog)
+    return catalog
+
+def _process_query(db_name: str, filters, *columns):
+    """Select ``columns`` of the nodes in a database whose fields contain the filter terms."""
+    query = AD.select(*columns).where(AD.database == db_name)
+    for field, term in filters:
+        # ``contains`` escapes LIKE wildcards; SQLite's LIKE ignores ASCII case
+        query = query.where(_PROCESS_FIELDS[field].contains(term))
+    return query
+
+@lru_cache(maxsize=256)
+def _count_processes(project: str, db_name: str, modified, filters: tuple) -> int:
+    return _process_query(db_name, filters, fn.COUNT(AD.id)).scalar()
+
+@timed()
+def count_processes(db_name: str, filters: dict | None = None) -> int:
+    """
+    Count the nodes of a database matching ``filters``.
+
+    ``filters`` maps catalog fields (``product``, ``name``, ``location``) to
+    substrings, compared without case. Counts are cached until the database
+    is modified.
+    """
+    filters = tuple(sorted((k, v) for k, v in (filters or {}).items() if v))
+    return _count_processes(bd.projects.current, db_name, bd.databases[db_name].get("modified"), filters)
+
+@timed()
+def query_processes(db_name: str, filters: dict | None = None, sorters=(), offset: int = 0,
+                    limit: int = 100) -> pd.DataFrame:
+    """
+    Load one page of the process catalog, filtered and sorted in the database.
+
+    ``filters`` is as for ``count_processes``; ``sorters`` is a sequence of
+    ``(field, ascending)`` pairs, compared without case like Tabulator does.
+    Only ``limit`` rows starting at ``offset`` are read, so memory use and
+    latency do not grow with the size of the database. Returns the columns
+    of ``load_process_catalog``.
+    """
+    query = _sorted_process_query(db_name, filters, sorters).limit(limit).offset(offset).tuples()
+    return pd.DataFrame.from_records(list(query), columns=["id", "product", "name", "location"])
+
+def _sorted_process_query(db_name: str, filters, sorters):
+    filters = [(k, v) for k, v in (filters or {}).items() if v]
+    order = [
+        fn.lower(_PROCESS_FIELDS[field]).asc() if ascending else fn.lower(_PROCESS_FIELDS[field]).desc()
+        for field, ascending in sorters
+    ]
+    return _process_query(db_name, filters, AD.id, AD.product, AD.name, AD.location).order_by(*order, AD.id)
+
+def iter_processes(db_name: str, filters: dict | None = None, sorters=(), chunk_rows: int = 50_000,
+                   project: str | None = None):
+    """
+    Read the catalog of ``query_processes`` in DataFrames of ``chunk_rows`` rows.
 
+    Each chunk is a query of its own in ``project`` (see ``project_data``),
+    so the chunks can be consumed in a worker thread while sessions switch
+    projects in between, and memory use does not grow with the size of the
+    database. Yields at least one, possibly empty, frame. Each chunk is timed
+    as ``bw.iter_processes``, including the wait for the project.
+    """
+    offset = 0
+    while True:
+        with timed("bw.iter_processes") as timer, project_data(project):
+            chunk = timer.payload = query_processes(db_name, filters, sorters, offset, chunk_rows)
+        if chunk.empty and offset:
+            return
+        yield chunk
+        if len(chunk) < chunk_rows:
+            return
+        offset += chunk_rows
+
+@timed()
 def search_db(db, term: str) :
     return bd.Database(db).search(term)
 
-def filter_results(db, name="", product="", location=""):
+@timed()
+def get_search_index(db_name: str) -> SearchIndex:
+    """
+    Get the shared search index of a database.
+
+    The index is built once from the process catalog and rebuilt only when the
+    database was modified by something other than ``create_process``, which
+    adds its node to the index directly.
+    """
+    key = (bd.projects.current, db_name)
+    modified = bd.databases[db_name].get("modified")
+    cached = _search_indices.get(key)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+
+    catalog = load_process_catalog(db_name)
+    index = SearchIndex.from_records(
+        zip(catalog["id"], catalog["name"], catalog["product"], catalog["location"])
+    )
+    _search_indices[key] = (modified, index)
+    return index
+
+def _refresh_search_index(db_name: str, modified_before, node=None) -> None:
+    """
+    Add ``node`` to an existing search index and mark it as up to date.
+
+    ``modified_before`` is the database's ``modified`` timestamp before the
+    write. An index that was already stale then misses other changes, so it
+    is dropped and rebuilt in full on its next use instead.
+    """
+    key = (bd.projects.current, db_name)
+    cached = _search_indices.get(key)
+    if cached is None:
+        return
+    if cached[0] != modified_before:
+        del _search_indices[key]
+        return
+    index = cached[1]
+    if node is not None:
+        index.add(node.id, node.get("name"), node.get("reference product"), node.get("location"))
+    _search_indices[key] = (bd.databases[db_name].get("modified"), index)
+
+@timed()
+def filter_results(db, name="", product="", location="", limit=100):
     """Filter results based on name, product, and location."""
-    return [act for act in bd.Database(db)
-            if name.lower() in act.get("name").lower() and
-            product.lower() in act.get("reference product", "").lower() and
-            location.lower() in act.get("location", "").lower()]
+    ids = get_search_index(db).search(name, product, location, limit=limit)
+    if not ids:
+        return []
+    by_id = {ds.id: ds for ds in AD.select().where(AD.id.in_(ids))}
+    return [Activity(by_id[id_]) for id_ in ids if id_ in by_id]
     
+@timed()
 def query_distinct_process_names(db):
     query = AD.select(AD.name).where(AD.database == db).distinct()
     return [entry.name for entry in query]
 
+@timed()
 def get_method_options():
     method_list = [m for m in bd.methods]
     return build_nested_options(method_list)
 
+def _methods_version():
+    """Version of the methods registry file, which is rewritten when methods are registered or deleted."""
+    try:
+        stat = os.stat(bd.methods.filepath)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+@timed()
+def get_method_tree() -> MethodTree:
+    """
+    Get the shared method tree of the current project.
+
+    Built once per project and rebuilt only when the methods registry file
+    changes, i.e. when methods are registered or deleted.
+    """
+    version = _methods_version()
+    cached = _method_trees.get(bd.projects.current)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    tree = MethodTree(bd.methods)
+    _method_trees[bd.projects.current] = (version, tree)
+    return tree
+
+@timed()
+@forward_writes
 def create_process(db, name, product, location, unit, process_production_amount, **metadata):
     """Create a new process in the specified database."""
+    modified = bd.databases[db].get("modified")
     db = bd.Database(db)
     process = db.new_node(
         name=name,
@@ -55,23 +316,65 @@ def create_process(db, name, product, location, unit, process_production_amount,
         amount=process_production_amount,
         type="production"
     ).save()
+    _refresh_search_index(process["database"], modified, process)
     return process
 
-def list_process_inputs(process_db, process_name, process_product, process_location):
-    """List all inputs for a given process."""
-    process = bd.get_node(database=process_db, name=process_name, product=process_product, location=process_location)
-    if not process:
-        raise ValueError("Process not found.")
-    return list(process.technosphere())
+@lru_cache(maxsize=PROCESS_DETAILS_CACHE_SIZE)
+def _process_details(project: str, process_id: int, versions: tuple) -> pd.DataFrame:
+    Output, Input = AD.alias(), AD.alias()
+    query = (
+        ED.select(ED.id, ED.type, ED.data, Input.id, Input.product, Input.name, Input.location)
+        .join(Output, on=(ED.output_database == Output.database) & (ED.output_code == Output.code))
+        .join(Input, on=(ED.input_database == Input.database) & (ED.input_code == Input.code))
+        .where(Output.id == process_id)
+        .where(ED.type.in_(["production", "technosphere", "biosphere"]))
+        .tuples()
+    )
+    return pd.DataFrame.from_records(
+        [(exchange_id, type_, data.get("amount"), id_, product, name, location)
+         for exchange_id, type_, data, id_, product, name, location in query],
+        columns=["exchange", "type", "amount", "id", "product", "name", "location"],
+    )
 
-def list_process_production(process_db, process_name, process_product, process_location):
-    """List all production for a given process."""
-    process = bd.get_node(database=process_db, name=process_name, product=process_product, location=process_location)
-    if not process:
-        raise ValueError("Process not found.")
-    return list(process.production())
+@timed()
+def load_process_details(process_id: int) -> pd.DataFrame:
+    """
+    Load the production, technosphere and biosphere exchanges of a process.
+
+    One query joins the exchanges with the process and their input nodes, so
+    no Activity or Exchange proxies are built. Returns one row per exchange
+    with its ``exchange`` id, ``type`` and ``amount`` and the input's ``id``,
+    ``product``, ``name`` and ``location``. The last ``PROCESS_DETAILS_CACHE_SIZE`` results are
+    cached until any database is modified, so the returned frame is shared
+    and must not be modified in place.
+    """
+    versions = tuple(sorted((name, meta.get("modified")) for name, meta in bd.databases.items()))
+    return _process_details(bd.projects.current, int(process_id), versions)
 
+@timed()
+@forward_writes
+def update_exchange_amounts(amounts: dict[int, float]) -> None:
+    """Set the amounts of exchanges, by exchange id, in one database transaction."""
+    with sqlite3_lci_db.transaction():
+        for dataset in ED.select().where(ED.id.in_(list(amounts))):
+            exchange = Exchange(dataset)
+            exchange["amount"] = float(amounts[dataset.id])
+            exchange.save()
 
+def _drop_caches(project: str) -> None:
+    """Forget everything cached for a project another process has changed."""
+    for cache in (_catalog_cache, _search_indices):
+        for key in [k for k in cache if k[0] == project]:
+            del cache[key]
+    _method_trees.pop(project, None)
+    _count_processes.cache_clear()
+    _process_details.cache_clear()
+
+on_change(_drop_caches)
+
+
+@timed()
+@forward_writes
 def add_input(process_db, process_name, process_product, process_location, input_db, input_name, input_product, input_location, amount):
     """Add an input to a process."""
     process = bd.get_node(database=process_db, name=process_name, product=process_product, location=process_location)
@@ -80,10 +383,12 @@ def add_input(process_db, process_name, process_product, process_location, input
     if not process or not input_act:
         raise ValueError("Process or input activity not found.")
     
+    modified = bd.databases[process_db].get("modified")
     process.new_edge(
         input=input_act,
         amount=amount,
         type="technosphere"
     ).save()
-    
+    _refresh_search_index(process_db, modified)
+
     return process
\ No newline at end of file
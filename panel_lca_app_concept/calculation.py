@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import copy
+from functools import partial
+from types import SimpleNamespace
+
+import bw2calc as bc
+import bw2data as bd
+import matrix_utils as mu
+import numpy as np
+import pandas as pd
+from bw2calc import PYPARDISO, UMFPACK, factorized
+from bw2data.backends import ActivityDataset as AD
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse.linalg import spsolve, spsolve_triangular, splu
+
+from panel_lca_app_concept.bw import project_data
+from panel_lca_app_concept.helpers import OTHER_LABEL
+from panel_lca_app_concept.matrix_cache import datapackage_key, get_matrix_cache, pack_sparse, unpack_sparse
+
+# Number of individually listed contributing processes per result, rest is "Other"
+N_CONTRIBUTORS = 8
+# Changed technosphere columns solved by low-rank updates before refactorizing
+LOW_RANK_MAX_COLUMNS = 16
+
+
+def _lu_solver(L, U, perm_r, perm_c):
+    """Solve ``Ax = b`` from stored SuperLU factors ``Pr A Pc = L U``."""
+    inverse_perm_r = np.argsort(perm_r)
+
+    def solve(b):
+        y = spsolve_triangular(L, b[inverse_perm_r], lower=True, unit_diagonal=True)
+        return spsolve_triangular(U, y, lower=False)[perm_c]
+
+    return solve
+
+
+def _lu_transposed_solver(L, U, perm_r, perm_c):
+    """Solve ``A^T x = b`` from stored SuperLU factors ``Pr A Pc = L U``."""
+    inverse_perm_c = np.argsort(perm_c)
+    L_T, U_T = L.T.tocsr(), U.T.tocsr()
+
+    def solve(b):
+        z = spsolve_triangular(U_T, b[inverse_perm_c], lower=True)
+        return spsolve_triangular(L_T, z, lower=False, unit_diagonal=True)[perm_r]
+
+    return solve
+
+
+def _low_rank_solvers(solver, transposed_solver, delta, columns):
+    """
+    Solvers for ``A + delta`` from solvers for ``A`` (Woodbury identity).
+
+    ``delta`` is nonzero only in ``columns``, so ``delta = U V^T`` with
+    ``U = delta[:, columns]`` and ``V`` the unit vectors of ``columns``. Each
+    solve costs one solve with ``A`` and a ``k x k`` system for ``k`` columns;
+    setting up takes ``k`` solves, the transposed side only on first use.
+    """
+    U = delta[:, columns].toarray()
+    Z = np.column_stack([solver(U[:, j]) for j in range(len(columns))])
+    capacitance = lu_factor(np.eye(len(columns)) + Z[columns, :])
+
+    def solve(b):
+        y = solver(b)
+        return y - Z @ lu_solve(capacitance, y[columns])
+
+    transposed = {}
+
+    def solve_transposed(b):
+        # (A + U V^T)^T = A^T + V U^T
+        if not transposed:
+            unit = np.zeros(delta.shape[0])
+            Zt = np.empty((delta.shape[0], len(columns)))
+            for j, col in enumerate(columns):
+                unit[col] = 1.0
+                Zt[:, j] = transposed_solver(unit)
+                unit[col] = 0.0
+            transposed["Zt"] = Zt
+            transposed["capacitance"] = lu_factor(np.eye(len(columns)) + U.T @ Zt)
+        y = transposed_solver(b)
+        return y - transposed["Zt"] @ lu_solve(transposed["capacitance"], U.T @ y)
+
+    return solve, solve_transposed
+
+
+class FactorizedMultiLCA(bc.MultiLCA):
+    """
+    MultiLCA that factorizes the technosphere matrix once and reuses the
+    factorization for every demand vector.
+
+    With a ``cache_key`` (see ``matrix_cache.datapackage_key``), the built
+    matrices, their index mappings and the LU factors are stored in the
+    matrix cache of the project current at construction and read back
+    memory-mapped on the next calculation over the same datapackages,
+    skipping both matrix building and factorization.
+    """
+
+    def __init__(self, *args, cache_key=None, databases=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.databases = databases
+        # Solving may run after another project has become current
+        self.matrix_cache = get_matrix_cache() if cache_key is not None else None
+
+    def _use_cache(self) -> bool:
+        return (
+            self.cache_key is not None
+            and not self.use_arrays
+            and not self.use_distributions
+            and not self.selective_use
+        )
+
+    def load_lci_data(self, nonsquare_ok=False) -> None:
+        cache = self.matrix_cache if self._use_cache() else None
+        arrays = cache.get(self.cache_key) if cache is not None else None
+        if arrays is not None:
+            self._restore_lci_data(arrays)
+            return
+        super().load_lci_data(nonsquare_ok=nonsquare_ok)
+        if cache is not None:
+            self.decompose_technosphere()
+            cache.put(self.cache_key, self._lci_arrays(), self.databases)
+
+    def _lci_arrays(self) -> dict:
+        arrays = {
+            **pack_sparse("technosphere", self.technosphere_matrix.tocsr()),
+            **pack_sparse("biosphere", self.biosphere_matrix.tocsr()),
+            "product_ids": self.technosphere_mm.row_mapper.array,
+            "activity_ids": self.technosphere_mm.col_mapper.array,
+            "biosphere_ids": self.biosphere_mm.row_mapper.array,
+        }
+        if hasattr(self, "lu"):
+            arrays.update({
+                **pack_sparse("lu.L", self.lu.L.tocsr()),
+                **pack_sparse("lu.U", self.lu.U.tocsr()),
+                "lu.perm_r": self.lu.perm_r,
+                "lu.perm_c": self.lu.perm_c,
+            })
+        return arrays
+
+    def _restore_lci_data(self, arrays: dict) -> None:
+        products = mu.ArrayMapper(array=np.asarray(arrays["product_ids"]))
+        activities = mu.ArrayMapper(array=np.asarray(arrays["activity_ids"]))
+        flows = mu.ArrayMapper(array=np.asarray(arrays["biosphere_ids"]), empty_ok=True)
+        self.technosphere_matrix = unpack_sparse("technosphere", arrays)
+        self.biosphere_matrix = unpack_sparse("biosphere", arrays)
+        # Stand-ins for the MappedMatrix objects, LCIA only needs their mappers
+        self.technosphere_mm = SimpleNamespace(
+            row_mapper=products, col_mapper=activities, matrix=self.technosphere_matrix
+        )
+        self.biosphere_mm = SimpleNamespace(
+            row_mapper=flows, col_mapper=activities, matrix=self.biosphere_matrix
+        )
+        self.dicts.product = partial(products.to_dict)
+        self.dicts.activity = partial(activities.to_dict)
+        self.dicts.biosphere = partial(flows.to_dict)
+        if "lu.perm_r" in arrays:
+            factors = (
+                unpack_sparse("lu.L", arrays),
+                unpack_sparse("lu.U", arrays),
+                arrays["lu.perm_r"],
+                arrays["lu.perm_c"],
+            )
+            self.solver = _lu_solver(*factors)
+            self.transposed_solver = _lu_transposed_solver(*factors)
+            self.factorization = (self.technosphere_matrix, self.solver, self.transposed_solver)
+
+    def decompose_technosphere(self) -> None:
+        if PYPARDISO or UMFPACK:
+            self.solver = factorized(self.technosphere_matrix.tocsc())
+            self.transposed_solver = None
+        else:
+            # Keep the SuperLU object so its factors can be cached
+            self.lu = splu(self.technosphere_matrix.tocsc())
+            self.solver = self.lu.solve
+            self.transposed_solver = partial(self.lu.solve, trans="T")
+        # The factorized matrix and its solvers, low-rank updates are relative to them
+        self.factorization = (self.technosphere_matrix, self.solver, self.transposed_solver)
+
+    def solve_transposed(self, vector: np.ndarray) -> np.ndarray:
+        """
+        Solve ``A^T x = vector`` for the technosphere matrix ``A``.
+
+        With the direct impact per unit of each activity as ``vector``, ``x``
+        is the cumulative impact per unit of each product.
+        """
+        if not hasattr(self, "solver"):
+            self.decompose_technosphere()
+        if getattr(self, "transposed_solver", None) is not None:
+            return self.transposed_solver(vector)
+        return spsolve(self.technosphere_matrix.T.tocsc(), vector)
+
+    def with_exchange_changes(self, changes, max_columns: int = LOW_RANK_MAX_COLUMNS) -> "FactorizedMultiLCA":
+        """
+        Copy of this solved LCA with changed exchange amounts, solved again.
+
+        ``changes`` are ``(type, input_id, output_id, delta)`` tuples adding
+        ``delta`` to the amount of an exchange; exchanges of activities
+        outside the matrices are ignored. The copy keeps this LCA's
+        factorization and solves the changed technosphere through a low-rank
+        (Sherman-Morrison/Woodbury) update of it, as long as at most
+        ``max_columns`` activities differ from the factorized matrix, and is
+        refactorized beyond that. This LCA is not modified, so it can be
+        shared, e.g. between sessions.
+        """
+        if not hasattr(self, "factorization"):
+            self.decompose_technosphere()
+        lca = copy.copy(self)
+        tech, bio = [], []
+        for type_, input_id, output_id, delta in changes:
+            col = self.dicts.activity.get(output_id)
+            if col is None:
+                continue
+            if type_ == "biosphere" and input_id in self.dicts.biosphere:
+                bio.append((self.dicts.biosphere[input_id], col, delta))
+            elif type_ in ("production", "technosphere") and input_id in self.dicts.product:
+                # Technosphere inputs are stored with a negative sign
+                tech.append((self.dicts.product[input_id], col, delta if type_ == "production" else -delta))
+        if tech:
+            rows, cols, values = zip(*tech)
+            lca.technosphere_matrix = (self.technosphere_matrix + sparse.csr_matrix(
+                (values, (rows, cols)), shape=self.technosphere_matrix.shape
+            )).tocsr()
+        if bio:
+            rows, cols, values = zip(*bio)
+            lca.biosphere_matrix = (self.biosphere_matrix + sparse.csr_matrix(
+                (values, (rows, cols)), shape=self.biosphere_matrix.shape
+            )).tocsr()
+
+        matrix, solver, transposed_solver = self.factorization
+        delta = (lca.technosphere_matrix - matrix).tocsc()
+        delta.eliminate_zeros()
+        columns = np.flatnonzero(np.diff(delta.indptr))
+        if len(columns) > max_columns:
+            lca.decompose_technosphere()
+        elif len(columns):
+            transposed_solver = transposed_solver or partial(spsolve, matrix.T.tocsc())
+            lca.solver, lca.transposed_solver = _low_rank_solvers(solver, transposed_solver, delta, columns)
+        else:
+            lca.solver, lca.transposed_solver = solver, transposed_solver
+        lca.lci_calculation()
+        lca.lcia_calculation()
+        return lca
+
+    def after_matrix_iteration(self) -> None:
+        # New matrix values (e.g. Monte Carlo) invalidate the factorization
+        self.decompose_technosphere()
+
+    def lci_calculation(self) -> None:
+        if not hasattr(self, "solver"):
+            self.decompose_technosphere()
+        count = len(self.dicts.activity)
+        self.supply_arrays = {
+            name: self.solver(arr) for name, arr in self.demand_arrays.items()
+        }
+        self.inventories = mu.SparseMatrixDict(
+            [
+                (name, self.biosphere_matrix @ sparse.spdiags([arr], [0], count, count))
+                for name, arr in self.supply_arrays.items()
+            ]
+        )
+
+
+def method_label(method: tuple) -> str:
+    return " | ".join(method)
+
+
+def method_unit(method: tuple) -> str:
+    return bd.methods.get(method, {}).get("unit", "")
+
+
+def functional_unit_demands(functional_unit: pd.DataFrame) -> dict[str, dict[int, float]]:
+    """
+    Turn the rows of the functional unit table into MultiLCA demands.
+
+    Each row becomes its own demand, labelled "Product (Location)"; repeated
+    labels get a running number.
+    """
+    demands = {}
+    for row in functional_unit.itertuples(index=False):
+        label = base = f"{row.Product} ({row.Location})"
+        n = 1
+        while label in demands:
+            n += 1
+            label = f"{base} #{n}"
+        demands[label] = {int(row.id): float(row.Amount)}
+    return demands
+
+
+def inventory_databases(demands: dict[str, dict[int, float]]) -> set[str]:
+    """Names of the databases the demanded activities and their supply chains live in."""
+    ids = {id_ for demand in demands.values() for id_ in demand}
+    names = {
+        name for (name,) in AD.select(AD.database).where(AD.id.in_(list(ids))).distinct().tuples()
+    }
+    return set().union(*(bd.Database(name).find_graph_dependents() for name in names))
+
+
+def activity_labels(ids) -> dict[int, str]:
+    """Fetch "name (location)" labels for activity ids in one query."""
+    query = (
+        AD.select(AD.id, AD.name, AD.location)
+        .where(AD.id.in_([int(i) for i in ids]))
+        .tuples()
+    )
+    return {id_: f"{name} ({location})" for id_, name, location in query}
+
+
+def _no_progress(fraction: float, message: str = "") -> None:
+    pass
+
+
+def calculate_footprints(functional_unit: pd.DataFrame, methods: list[tuple],
+                         n_contributors: int = N_CONTRIBUTORS, progress=_no_progress, return_lca: bool = False,
+                         project: str | None = None):
+    """
+    Calculate every functional unit row under every method in one MultiLCA.
+
+    Returns a long table with columns ``product`` (functional unit row),
+    ``method``, ``stage`` (the ``n_contributors`` processes contributing most
+    to that score, plus "Other") and ``value``. Summing ``value`` per product
+    and method gives the LCA score. ``progress(fraction, message)`` is called
+    between the steps (see ``jobs.Job``). With ``return_lca``, the solved
+    ``FactorizedMultiLCA`` is returned as well, e.g. for what-if updates.
+    Data is read from ``project``, or the current project if ``None`` (see
+    ``bw.project_data``).
+    """
+    if functional_unit.empty:
+        raise ValueError("Functional unit is empty.")
+    if not methods:
+        raise ValueError("No method selected.")
+
+    mlca = solve_multilca(functional_unit_demands(functional_unit), methods, progress, project)
+    progress(0.8, "Ranking contributions")
+    results = contribution_table(mlca, n_contributors, project)
+    progress(1.0, "Done")
+    return (results, mlca) if return_lca else results
+
+
+def solve_multilca(demands: dict[str, dict[int, float]], methods: list[tuple],
+                   progress=_no_progress, project: str | None = None) -> FactorizedMultiLCA:
+    """Run LCI and LCIA for all demands and methods, reusing cached matrices."""
+    progress(0.05, "Collecting data")
+    method_config = {"impact_categories": list(methods)}
+    # Only collecting the datapackages reads the project, solving reads their files
+    with project_data(project):
+        data_objs = bd.get_multilca_data_objs(demands, method_config)
+        databases = inventory_databases(demands)
+        mlca = FactorizedMultiLCA(
+            demands=demands,
+            method_config=method_config,
+            data_objs=data_objs,
+            cache_key=datapackage_key(databases),
+            databases=databases,
+        )
+    progress(0.2, "Solving inventories")
+    mlca.lci()
+    progress(0.6, "Characterizing")
+    mlca.lcia()
+    return mlca
+
+
+def contribution_table(mlca: bc.MultiLCA, n_contributors: int = N_CONTRIBUTORS,
+                       project: str | None = None) -> pd.DataFrame:
+    """Split each score of a solved MultiLCA into its top contributing processes."""
+    col_to_id = mlca.dicts.activity.reversed
+    contributions = {}
+    for (method, label), characterized in mlca.characterized_inventories.items():
+        per_activity = np.asarray(characterized.sum(axis=0)).ravel()
+        top = np.argsort(-np.abs(per_activity))[:n_contributors]
+        top = top[per_activity[top] != 0]
+        contributions[(method, label)] = (per_activity, top)
+
+    with project_data(project):
+        labels = activity_labels(
+            {col_to_id[col] for _, top in contributions.values() for col in top}
+        )
+    rows = []
+    for (method, label), (per_activity, top) in contributions.items():
+        for col in top:
+            rows.append((label, method_label(method), labels[col_to_id[col]], per_activity[col]))
+        rest = per_activity.sum() - per_activity[top].sum()
+        if len(top) < np.count_nonzero(per_activity) or not len(top):
+            rows.append((label, method_label(method), OTHER_LABEL, rest))
+
+    results = pd.DataFrame(rows, columns=["product", "method", "stage", "value"])
+    # Processes sharing a name and location are reported as one stage
+    return results.groupby(["product", "method", "stage"], sort=False, as_index=False)["value"].sum()
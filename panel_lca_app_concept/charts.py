@@ -1,93 +1,212 @@
-import plotly.graph_objects as go
-import pandas as pd
-import panel_lca_app_concept as lcapp
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
-print("Using panel_lca_app_concept version", lcapp.__version__)
+import numpy as np
+import pandas as pd
 
-from panel_lca_app_concept.data import STAGES, PRODUCTS, REACTANTS, PROCESSES, PRODUCT_MAT_SHARES, MAT_PROC_SHARES
+from panel_lca_app_concept.sankey import flows_from_table, link_colors, node_colors
 from panel_lca_app_concept.theming import current_bg_color
 
+# plotly is imported by the functions drawing a chart, so importing this module stays cheap
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
 def _prep(df: pd.DataFrame, norm: bool) -> pd.DataFrame:
     if not norm: return df
     g = df.groupby("product")["value"].transform("sum")
     out = df.copy(); out["value"] = out["value"] / g
     return out
 
-def plot_stacked_bars(df, norm=False, colors=None) -> go.Figure:
+def _stages(df: pd.DataFrame) -> list:
+    # stages keep the order in which they first appear in the data
+    return list(dict.fromkeys(df["stage"]))
+
+def _hovertemplate(stage, norm, unit):
+    return ("%{x}<br>Stage: "+stage+"<br>"+
+            ("Value: %{y:.3g} "+unit if not norm else "Share: %{y:.0%}")+
+            "<extra></extra>")
+
+def _bar_traces(wide, stages, norm, colors, unit, bg):
+    import plotly.graph_objects as go
+    return [go.Bar(
+        name=stage, x=wide.index, y=wide[stage],
+        hovertemplate=_hovertemplate(stage, norm, unit),
+        marker={"color": (colors[i % len(colors)] if colors else None),
+                "line":{"width":2,"color":bg}, "cornerradius":8}
+    ) for i, stage in enumerate(stages)]
+
+def plot_stacked_bars(df, norm=False, colors=None, unit="kg CO₂e") -> go.Figure:
+    import plotly.graph_objects as go
     df = _prep(df, norm)
-    wide = df.pivot(index="product", columns="stage", values="value").fillna(0)
+    stages = _stages(df)
+    wide = df.pivot_table(index="product", columns="stage", values="value", aggfunc="sum").fillna(0)
     bg = current_bg_color()
-    fig = go.Figure()
-    for i, stage in enumerate(STAGES):
-        if stage not in wide.columns: continue
-        fig.add_trace(go.Bar(
-            name=stage, x=wide.index, y=wide[stage],
-            hovertemplate=("%{x}<br>Stage: "+stage+"<br>"+
-                           ("Value: %{y:.1f} kg CO₂e" if not norm else "Share: %{y:.0%}")+
-                           "<extra></extra>"),
-            marker={"color": (colors[i] if colors else None),
-                    "line":{"width":2,"color":bg}, "cornerradius":8}
-        ))
-    fig.update_layout(barmode="stack", xaxis_title="", yaxis_title=("kg CO₂e" if not norm else "Share"),
+    fig = go.Figure(_bar_traces(wide, stages, norm, colors, unit, bg))
+    fig.update_layout(barmode="relative", xaxis_title="", yaxis_title=(unit if not norm else "Share"),
                       hovermode="closest", legend_title_text="Stage",
                       margin=dict(l=10,r=10,t=40,b=10), uirevision="keep",
                       paper_bgcolor=bg, plot_bgcolor=bg)
     return fig
 
-def update_stacked_bars(fig, df, norm=False, colors=None):
+def _changed(old, new) -> bool:
+    if isinstance(new, np.ndarray) or isinstance(old, (np.ndarray, tuple, list)):
+        try:
+            return not np.array_equal(np.asarray(old), np.asarray(new))
+        except Exception:
+            return True
+    return old != new
+
+def patch_figure(fig, traces, layout=None) -> int:
+    """
+    Set only the properties that differ from ``fig``, in a single update message.
+
+    ``traces[i]`` maps dotted property paths (e.g. "marker.line.color") to the
+    new values of ``fig.data[i]``, ``layout`` does the same for the layout.
+    Pass numeric arrays as NumPy arrays so they are sent as binary buffers.
+    Returns the number of changed properties.
+    """
+    changed = 0
+    with fig.batch_update():
+        for trace, props in zip(fig.data, traces):
+            for path, value in props.items():
+                if _changed(trace[path], value):
+                    trace[path] = value
+                    changed += 1
+        for path, value in (layout or {}).items():
+            if _changed(fig.layout[path], value):
+                fig.layout[path] = value
+                changed += 1
+    return changed
+
+def _bar_props(wide, stage, i, norm, colors, unit, bg):
+    props = {"name": stage, "x": wide.index.to_numpy(), "y": wide[stage].to_numpy(dtype=float),
+             "hovertemplate": _hovertemplate(stage, norm, unit), "marker.line.color": bg}
+    if colors: props["marker.color"] = colors[i % len(colors)]
+    return props
+
+def update_stacked_bars(fig, df, norm=False, colors=None, unit="kg CO₂e"):
     df = _prep(df, norm)
-    wide = df.pivot(index="product", columns="stage", values="value").fillna(0)
+    stages = _stages(df)
+    wide = df.pivot_table(index="product", columns="stage", values="value", aggfunc="sum").fillna(0)
     bg = current_bg_color()
-    for i, stage in enumerate(STAGES):
-        if stage not in wide.columns: continue
-        fig.data[i].x = wide.index; fig.data[i].y = wide[stage]
-        fig.data[i].hovertemplate = ("%{x}<br>Stage: "+stage+"<br>"+
-                                     ("Value: %{y:.1f} kg CO₂e" if not norm else "Share: %{y:.0%}")+
-                                     "<extra></extra>")
-        fig.data[i].marker.line.color = bg
-        if colors: fig.data[i].marker.color = colors[i]
-    fig.update_layout(yaxis_title=("kg CO₂e" if not norm else "Share"))
+    # reuse the existing traces, only add or drop the difference in stage count
+    bars = [i for i, trace in enumerate(fig.data) if trace.type == "bar"]
+    n_old = len(bars)
+    if len(stages) < n_old:
+        fig.data = [fig.data[i] for i in bars[:len(stages)]] + [t for t in fig.data if t.type != "bar"]
+    elif len(stages) > n_old:
+        fig.add_traces(_bar_traces(wide, stages, norm, colors, unit, bg)[n_old:])
+    bars = [i for i, trace in enumerate(fig.data) if trace.type == "bar"][:n_old]
+    props = [{} for _ in fig.data]
+    for i, stage in enumerate(stages[:n_old]):
+        props[bars[i]] = _bar_props(wide, stage, i, norm, colors, unit, bg)
+    patch_figure(
+        fig,
+        props,
+        {"yaxis.title.text": (unit if not norm else "Share"), "paper_bgcolor": bg, "plot_bgcolor": bg},
+    )
+
+UNCERTAINTY_TRACE = "95% interval"
+
+def update_uncertainty(fig, summary=None, norm=False):
+    """
+    Show Monte Carlo intervals of the product totals as error bars over the stacked bars.
+
+    ``summary`` has one row per product with ``median``, ``low`` and ``high``
+    (see ``montecarlo.summarize``); ``None`` or ``norm`` hides the error bars.
+    """
+    traces = [i for i, trace in enumerate(fig.data) if trace.name == UNCERTAINTY_TRACE]
+    if not traces:
+        if summary is None:
+            return
+        import plotly.graph_objects as go
+        fig.add_trace(go.Scatter(
+            name=UNCERTAINTY_TRACE, mode="markers", marker={"symbol": "line-ew-open", "size": 14},
+            hovertemplate="%{x}<br>Median: %{y:.3g}<br>95%: %{customdata[0]:.3g} – %{customdata[1]:.3g}<extra></extra>",
+        ))
+        traces = [len(fig.data) - 1]
+    props = [{} for _ in fig.data]
+    if summary is None or norm or summary.empty:
+        props[traces[0]] = {"visible": False}
+    else:
+        median = summary["median"].to_numpy(dtype=float)
+        props[traces[0]] = {
+            "visible": True,
+            "x": summary["product"].to_numpy(),
+            "y": median,
+            "error_y.type": "data",
+            "error_y.symmetric": False,
+            "error_y.array": summary["high"].to_numpy(dtype=float) - median,
+            "error_y.arrayminus": median - summary["low"].to_numpy(dtype=float),
+            "customdata": summary[["low", "high"]].to_numpy(dtype=float),
+        }
+    patch_figure(fig, props)
+
+def _sankey_links(df):
+    # Total footprint -> products -> stages
+    return flows_from_table(df, ["product", "stage"])
 
 def plot_sankey(df) -> go.Figure:
-    import numpy as np
-    # totals and flows
-    prod_totals = df.groupby("product")["value"].sum().reindex(PRODUCTS, fill_value=0)
-    pm = PRODUCT_MAT_SHARES.mul(prod_totals, axis=0)
-    mat_totals = pm.sum(axis=0).reindex(REACTANTS, fill_value=0)
-    mp = MAT_PROC_SHARES.mul(mat_totals, axis=0)
-    # nodes / indices
-    nodes = ["Total footprint"] + PRODUCTS + REACTANTS + PROCESSES
-    idx_total = 0
-    idx_prod = {p: i+1 for i,p in enumerate(PRODUCTS)}
-    off_mat = 1+len(PRODUCTS)
-    idx_mat = {m: off_mat+i for i,m in enumerate(REACTANTS)}
-    off_proc = off_mat + len(REACTANTS)
-    idx_proc = {r: off_proc+i for i,r in enumerate(PROCESSES)}
-    # links
-    src,tgt,val=[],[],[]
-    for p in PRODUCTS: src+= [idx_total]; tgt+= [idx_prod[p]]; val+= [float(prod_totals[p])]
-    for p in PRODUCTS:
-        for m in REACTANTS: src+= [idx_prod[p]]; tgt+= [idx_mat[m]]; val+= [float(pm.loc[p,m])]
-    for m in REACTANTS:
-        for r in PROCESSES: src+= [idx_mat[m]]; tgt+= [idx_proc[r]]; val+= [float(mp.loc[m,r])]
-    # colors
-    rng = np.random.default_rng(0)
-    node_cols = [f"rgba({50+rng.integers(0,205)},{50+rng.integers(0,205)},{50+rng.integers(0,205)},1.0)" for _ in nodes]
-    link_cols = [node_cols[s].replace(",1.0)",",0.5)") for s in src]
+    import plotly.graph_objects as go
+    nodes, src, tgt, val = _sankey_links(df)
+    node_cols = node_colors(nodes)
+    link_cols = link_colors(node_cols, src)
     return go.Figure([go.Sankey(arrangement="snap",
         node=dict(label=nodes, pad=15, thickness=20, color=node_cols),
         link=dict(source=src, target=tgt, value=val, color=link_cols)
     )])
 
 def update_sankey(fig, df):
-    prod_totals = df.groupby("product")["value"].sum().reindex(PRODUCTS, fill_value=0)
-    pm = PRODUCT_MAT_SHARES.mul(prod_totals, axis=0)
-    mat_totals = pm.sum(axis=0).reindex(REACTANTS, fill_value=0)
-    mp = MAT_PROC_SHARES.mul(mat_totals, axis=0)
-    vals=[]
-    for p in PRODUCTS: vals.append(float(prod_totals[p]))
-    for p in PRODUCTS:
-        for m in REACTANTS: vals.append(float(pm.loc[p,m]))
-    for m in REACTANTS:
-        for r in PROCESSES: vals.append(float(mp.loc[m,r]))
-    fig.data[0].link.value = vals
\ No newline at end of file
+    nodes, src, tgt, val = _sankey_links(df)
+    node_cols = node_colors(nodes)
+    link_cols = link_colors(node_cols, src)
+    patch_figure(fig, [{
+        "node.label": nodes, "node.color": node_cols,
+        "link.source": src, "link.target": tgt, "link.value": val, "link.color": link_cols,
+    }])
+
+def _tree_props(nodes: pd.DataFrame, unit: str) -> tuple[dict, str]:
+    ids = nodes["id"].to_numpy()
+    parents = nodes["parent"].to_numpy()
+    cumulative = nodes["cumulative"].to_numpy(dtype=float)
+    if (cumulative >= 0).all():
+        # parents must be at least the sum of their children, which rounding can break
+        child_sums = nodes.groupby("parent")["cumulative"].sum()
+        values = np.maximum(cumulative, child_sums.reindex(ids, fill_value=0).to_numpy())
+        branchvalues = "total"
+    else:
+        # credits: size each node by its own (direct) score, plotly adds the children
+        direct = nodes["direct"].to_numpy(dtype=float)
+        values = np.abs(np.where(np.isnan(direct), cumulative, direct))
+        branchvalues = "remainder"
+    return {
+        "ids": ids.astype(str),
+        "parents": np.array(["" if pd.isna(p) else str(int(p)) for p in parents]),
+        "labels": nodes["label"].to_numpy(dtype=str),
+        "values": values,
+        "customdata": cumulative,
+        "hovertemplate": "%{label}<br>Cumulative: %{customdata:.3g} "+unit+"<extra></extra>",
+    }, branchvalues
+
+def _tree_trace(kind, branchvalues):
+    import plotly.graph_objects as go
+    cls = go.Treemap if kind == "treemap" else go.Sunburst
+    return cls(branchvalues=branchvalues, maxdepth=4)
+
+def plot_supply_chain(nodes: pd.DataFrame, kind="sunburst", unit="kg CO₂e") -> go.Figure:
+    """Sunburst or treemap of the nodes found by a ``traversal.SupplyChainTraversal``."""
+    import plotly.graph_objects as go
+    bg = current_bg_color()
+    fig = go.Figure([_tree_trace(kind, "total")])
+    fig.update_layout(margin=dict(l=10,r=10,t=10,b=10), uirevision="keep", paper_bgcolor=bg, plot_bgcolor=bg)
+    update_supply_chain(fig, nodes, kind, unit)
+    return fig
+
+def update_supply_chain(fig, nodes: pd.DataFrame, kind="sunburst", unit="kg CO₂e"):
+    props, branchvalues = _tree_props(nodes, unit)
+    if fig.data[0].type != kind or fig.data[0].branchvalues != branchvalues:
+        fig.data = []
+        fig.add_trace(_tree_trace(kind, branchvalues))
+    bg = current_bg_color()
+    patch_figure(fig, [props], {"paper_bgcolor": bg, "plot_bgcolor": bg})
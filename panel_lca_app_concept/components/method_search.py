@@ -0,0 +1,29 @@
+import panel_material_ui as pmu
+
+# Suggestions shown while typing a method name
+METHOD_SEARCH_LIMIT = 50
+
+
+class MethodSearch(pmu.widgets.AutocompleteInput):
+    """
+    Autocomplete for LCIA methods, answered from a ``MethodTree`` search index.
+
+    Searches run on the server (``lazy_search``), so the method labels are
+    never sent to the browser.
+    """
+
+    def __init__(self, **params):
+        params.setdefault("lazy_search", True)
+        params.setdefault("search_strategy", "includes")
+        params.setdefault("case_sensitive", False)
+        super().__init__(**params)
+        self._tree = None
+
+    def set_tree(self, tree) -> None:
+        self._tree = tree
+        self.options = tree.labels
+
+    def _filter_options(self, query: str, case_sensitive=None, search_strategy=None) -> list:
+        if self._tree is None or not query or len(query) < self.min_characters:
+            return []
+        return self._tree.search(query, limit=METHOD_SEARCH_LIMIT)
@@ -1,4 +1,129 @@
+import os
+import shutil
+import tarfile
+from pathlib import Path
+
 import bw2data as bd
+import numpy as np
+from bw2data.project import ProjectDataset
+
+from panel_lca_app_concept.workers import forward_writes, is_reader, project_lock
+
+DEMO_PROJECT = "chem_demo"
+# Bump whenever add_chem_demo_project changes, so deployed snapshots are rebuilt
+DEMO_SNAPSHOT_VERSION = "1"
+_VERSION_MARKER = "demo_snapshot_version.txt"
+
+
+class DatabaseBuilder:
+    """
+    Collect nodes and exchanges in memory and write them in one go.
+
+    ``write`` hands everything to a single ``Database.write``, which inserts
+    all rows in one SQLite transaction and processes the datapackage once,
+    instead of one write and reprocessing per ``new_node(...).save()`` or
+    ``new_edge(...).save()``.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.data = {}
+
+    def __len__(self):
+        return len(self.data)
+
+    def add_node(self, code: str, name: str, unit: str, location=None,
+                 reference_product=None, production_amount=1, **data) -> tuple:
+        """Add a process node with its production exchange and return its key."""
+        key = (self.name, code)
+        node = {"name": name, "unit": unit, "exchanges": [], **data}
+        if location is not None:
+            node["location"] = location
+        if reference_product is not None:
+            node["reference product"] = reference_product
+        if production_amount is not None:
+            node["exchanges"].append({"input": key, "amount": production_amount, "type": "production"})
+        self.data[key] = node
+        return key
+
+    def add_exchange(self, output_code: str, input_key: tuple, amount: float,
+                     type: str = "technosphere", **data) -> None:
+        """Add an exchange from ``input_key`` into the node ``output_code``."""
+        self.data[(self.name, output_code)]["exchanges"].append(
+            {"input": input_key, "amount": amount, "type": type, **data}
+        )
+
+    def write(self, searchable: bool = True) -> bd.Database:
+        """Write all collected nodes and exchanges, replacing the database's content."""
+        db = bd.Database(self.name)
+        db.write(self.data, searchable=searchable)
+        return db
+
+
+def add_synthetic_database(n_processes: int = 1000, avg_degree: float = 5, n_biosphere: int = 100,
+                           name: str = "synthetic", seed: int = 0, cycle_share: float = 0.01,
+                           searchable: bool = False):
+    """
+    Write a random but solvable database to the current project for benchmarks.
+
+    Creates ``n_processes`` processes with on average ``avg_degree``
+    technosphere inputs each, a biosphere database ``f"{name} biosphere"`` of
+    ``n_biosphere`` flows (each process emits two of them) and a method
+    ``("synthetic", name, "random")`` characterizing every flow. Like real
+    supply chains, inputs mostly come from a few tiers further upstream and
+    only ``cycle_share`` of them close a loop. Each input amount is at most
+    ``0.5 / max(degree, avg_degree)``, so every column of the technosphere
+    matrix sums to at most half the production amount and the system is
+    always solvable.
+    """
+    rng = np.random.default_rng(seed)
+    biosphere_name = f"{name} biosphere"
+    biosphere = bd.Database(biosphere_name)
+    biosphere.write({
+        (biosphere_name, f"flow-{i}"): {
+            "type": "emission",
+            "name": f"flow {i}",
+            "unit": "kilogram",
+            "categories": ("air",),
+        }
+        for i in range(n_biosphere)
+    }, searchable=searchable)
+
+    locations = ["GLO", "RER", "RoW", "DE", "FR", "CH", "US", "CN"]
+    builder = DatabaseBuilder(name)
+    for i in range(n_processes):
+        builder.add_node(
+            f"process-{i}",
+            name=f"production of product {i}",
+            unit="kilogram",
+            location=locations[i % len(locations)],
+            reference_product=f"product {i}",
+        )
+
+    n_edges = rng.poisson(avg_degree, size=n_processes)
+    for i, degree in enumerate(n_edges):
+        # Suppliers sit mostly a few tiers upstream, loops stay local as well
+        offsets = rng.geometric(0.02, size=degree)
+        upstream = np.minimum(i + offsets, n_processes - 1)
+        downstream = np.maximum(i - offsets, 0)
+        inputs = np.where(rng.random(degree) < cycle_share, downstream, upstream)
+        # Scaled by the actual degree too, so hubs can't outweigh their own production
+        scale = max(degree, avg_degree, 1)
+        for j in np.unique(inputs):
+            if j == i:
+                continue
+            builder.add_exchange(f"process-{i}", (name, f"process-{j}"),
+                                 float(rng.uniform(0.01, 0.5) / scale))
+        for k in rng.choice(n_biosphere, size=min(2, n_biosphere), replace=False):
+            builder.add_exchange(f"process-{i}", (biosphere_name, f"flow-{k}"),
+                                 float(rng.uniform(0.1, 2)), type="biosphere")
+    db = builder.write(searchable=searchable)
+
+    bd.Method(("synthetic", name, "random")).write([
+        ((biosphere_name, f"flow-{i}"), float(cf))
+        for i, cf in enumerate(rng.uniform(0.5, 5, size=n_biosphere))
+    ])
+    return db
 
 
 def add_chem_demo_project():
@@ -9,10 +134,10 @@ def add_chem_demo_project():
     placeholders for demo purposes only.
     """
     # Reset demo project
-    if "chem_demo" in bd.projects:
-        bd.projects.delete_project("chem_demo", delete_dir=True)
+    if DEMO_PROJECT in bd.projects:
+        bd.projects.delete_project(DEMO_PROJECT, delete_dir=True)
         bd.projects.purge_deleted_directories()
-    bd.projects.set_current("chem_demo")
+    bd.projects.set_current(DEMO_PROJECT)
 
     # Minimal biosphere with CO2
     biosphere = bd.Database("biosphere")
@@ -29,8 +154,7 @@ def add_chem_demo_project():
     # Single background database with made-up processes
     if "background_chem" in bd.databases:
         del bd.databases["background_chem"]
-    background = bd.Database("background_chem")
-    background.register()
+    background = DatabaseBuilder("background_chem")
 
     # Rough CO2 intensities per unit output (very approximate demo values)
     processes = [
@@ -50,17 +174,114 @@ def add_chem_demo_project():
     ]
 
     for p in processes:
-        node = background.new_node(
-            p["code"], name=f"production of {p['name']}", unit=p["unit"], location="somewhere"
+        # Node with its production reference
+        background.add_node(
+            p["code"], name=f"production of {p['name']}", unit=p["unit"], location="somewhere",
+            reference_product=p["name"],
         )
-        node["reference product"] = p["name"]
-        node.save()
-        # Production reference
-        node.new_edge(input=node, amount=1, type="production").save()
         # CO2 emission to biosphere
-        node.new_edge(input=node_co2, amount=p["co2"], type="biosphere").save()
+        background.add_exchange(p["code"], node_co2.key, amount=p["co2"], type="biosphere")
+    background.write()
 
     # Simple GWP method that counts only CO2
     bd.Method(("example source", "simple", "climate change", "GWP100")).write([
         (("biosphere", "CO2"), 1),
     ])
+
+
+def snapshot_path(version=None) -> Path:
+    """Archive of the demo project, in ``PANEL_LCA_SNAPSHOT_DIR`` or else ``BRIGHTWAY2_DIR``."""
+    # A file, not a subdirectory: purge_deleted_directories removes unknown directories
+    directory = os.environ.get("PANEL_LCA_SNAPSHOT_DIR") or Path(bd.projects.dir).parent
+    return Path(directory) / f"{DEMO_PROJECT}-v{version or DEMO_SNAPSHOT_VERSION}.snapshot.tar"
+
+
+def installed_demo_version():
+    """Snapshot version of the installed demo project, ``None`` if it is missing; doesn't switch projects."""
+    if DEMO_PROJECT not in bd.projects:
+        return None
+    marker = Path(ProjectDataset.get(ProjectDataset.name == DEMO_PROJECT).dir) / _VERSION_MARKER
+    return marker.read_text().strip() if marker.exists() else None
+
+
+def _release_project(name: str) -> None:
+    # Switch away so no SQLite connection points into the project directory
+    others = [p.name for p in bd.projects if p.name != name]
+    bd.projects.set_current(others[0] if others else "default")
+
+
+def build_demo_snapshot(path=None) -> Path:
+    """
+    Build the demo project and store its directory as an uncompressed tar archive.
+
+    Meant to run once at image build time, e.g.
+    ``python -m panel_lca_app_concept.demo_databases``.
+    """
+    path = Path(path or snapshot_path())
+    add_chem_demo_project()
+    bd.databases.clean()
+    project_dir = Path(bd.projects.dir)
+    (project_dir / _VERSION_MARKER).write_text(DEMO_SNAPSHOT_VERSION)
+
+    _release_project(DEMO_PROJECT)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tarfile.open(tmp, "w") as archive:
+        archive.add(project_dir, arcname=".")
+    os.replace(tmp, path)
+    bd.projects.set_current(DEMO_PROJECT)
+    return path
+
+
+def restore_demo_snapshot(path=None) -> None:
+    """Replace the demo project with the content of a snapshot archive."""
+    path = Path(path or snapshot_path())
+    if DEMO_PROJECT in bd.projects:
+        bd.projects.delete_project(DEMO_PROJECT, delete_dir=True)
+    bd.projects.set_current(DEMO_PROJECT)
+    project_dir = Path(bd.projects.dir)
+
+    _release_project(DEMO_PROJECT)
+    shutil.rmtree(project_dir)
+    with tarfile.open(path) as archive:
+        if hasattr(tarfile, "data_filter"):
+            archive.extractall(project_dir, filter="data")
+        else:
+            archive.extractall(project_dir)
+    bd.projects.set_current(DEMO_PROJECT)
+
+
+@forward_writes
+def _install_demo_project() -> None:
+    if installed_demo_version() == DEMO_SNAPSHOT_VERSION:
+        return
+    path = snapshot_path()
+    if path.exists():
+        restore_demo_snapshot(path)
+    else:
+        build_demo_snapshot(path)
+
+
+def ensure_demo_project() -> None:
+    """
+    Make the demo project current, touching the disk only when needed.
+
+    Nothing is written if the installed project already has the current
+    snapshot version. Otherwise the snapshot archive is restored with a plain
+    file copy, and only without an archive is the project rebuilt (writing
+    the archive for the next worker). The copy is deliberate: hardlinks would
+    let the SQLite files of the running project write through to the archive.
+    In the shared worker mode only the writer process does this, readers
+    wait for it and open the project read-only. The installed version is
+    checked in this process, so a current project costs no call to the
+    writer.
+    """
+    if installed_demo_version() != DEMO_SNAPSHOT_VERSION:
+        _install_demo_project()
+    if bd.projects.current != DEMO_PROJECT:
+        with project_lock:
+            bd.projects.set_current(DEMO_PROJECT, writable=not is_reader())
+
+
+if __name__ == "__main__":
+    print(f"Wrote demo project snapshot to {build_demo_snapshot()}")
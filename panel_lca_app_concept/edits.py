@@ -0,0 +1,51 @@
+from panel_lca_app_concept.bw import update_exchange_amounts
+from panel_lca_app_concept.workers import run_write
+
+
+class ExchangeEdits:
+    """
+    Unit of work for exchange amount edits.
+
+    Edits are buffered per exchange, keeping the amount stored in the
+    database, until ``commit`` writes all of them in one transaction or
+    ``discard`` drops them. ``changes`` gives the pending edits in the form
+    ``FactorizedMultiLCA.with_exchange_changes`` takes.
+    """
+
+    def __init__(self):
+        # exchange id -> (type, input id, output id, stored amount, new amount)
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def set_amount(self, exchange_id: int, type_: str, input_id: int, output_id: int,
+                   old: float, new: float) -> None:
+        if exchange_id in self._pending:
+            old = self._pending[exchange_id][3]
+        if new == old:
+            self._pending.pop(exchange_id, None)
+        else:
+            self._pending[exchange_id] = (type_, input_id, output_id, float(old), float(new))
+
+    def amounts(self) -> dict[int, float]:
+        """Pending amount per exchange id."""
+        return {exchange_id: edit[4] for exchange_id, edit in self._pending.items()}
+
+    def changes(self) -> list[tuple]:
+        """Pending edits as ``(type, input_id, output_id, delta)``."""
+        return [(type_, input_id, output_id, new - old) for type_, input_id, output_id, old, new in self._pending.values()]
+
+    async def commit(self) -> list[tuple]:
+        """Write all pending edits of the current project, returning them as ``changes`` did."""
+        pending, changes = dict(self._pending), self.changes()
+        if pending:
+            await run_write(update_exchange_amounts, self.amounts())
+        # Edits made while the write was under way stay pending
+        for exchange_id, edit in pending.items():
+            if self._pending.get(exchange_id) == edit:
+                del self._pending[exchange_id]
+        return changes
+
+    def discard(self) -> None:
+        self._pending.clear()
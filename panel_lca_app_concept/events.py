@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+import panel as pn
+
+from panel_lca_app_concept.session import get_session_state
+
+# Topics
+THEME_CHANGED = "theme"
+PROJECT_CHANGED = "project"
+DATABASE_CHANGED = "database"
+RESULTS_CHANGED = "results"
+
+
+class EventBus:
+    """
+    Publish/subscribe bus of one browser session.
+
+    ``publish`` only records the event; delivery happens once on the next
+    tick of the session's event loop, after the current callback and any
+    other events it publishes. Repeated events of a topic collapse into the
+    latest one, and a subscriber to several topics that fired together is
+    called once, so a burst of changes causes a single redraw. Outside a
+    server session, events are delivered immediately.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+        self._pending = {}
+        self._scheduled = False
+
+    def subscribe(self, topics, callback):
+        """
+        Call ``callback(events)`` whenever one of ``topics`` is published.
+
+        ``events`` maps each fired topic to the payload it was last published
+        with. Returns a function that removes the subscription.
+        """
+        topics = (topics,) if isinstance(topics, str) else tuple(topics)
+        for topic in topics:
+            self._subscribers[topic].append(callback)
+
+        def unsubscribe():
+            for topic in topics:
+                if callback in self._subscribers[topic]:
+                    self._subscribers[topic].remove(callback)
+
+        return unsubscribe
+
+    def publish(self, topic: str, **payload) -> None:
+        self._pending[topic] = payload
+        if self._scheduled:
+            return
+        doc = pn.state.curdoc
+        if doc is not None and doc.session_context is not None:
+            self._scheduled = True
+            pn.state.execute(self.flush, schedule=True)
+        else:
+            self.flush()
+
+    def flush(self) -> None:
+        """Deliver all pending events now."""
+        self._scheduled = False
+        pending, self._pending = self._pending, {}
+        calls = {}
+        for topic, payload in pending.items():
+            for callback in self._subscribers.get(topic, []):
+                calls.setdefault(callback, {})[topic] = payload
+        for callback, events in calls.items():
+            try:
+                callback(events)
+            except Exception as e:
+                print(f"Event handler error for {list(events)}: {e}")
+
+
+def get_event_bus() -> EventBus:
+    """Get the event bus of the current session."""
+    state = get_session_state().namespace("events", bus=None)
+    if state["bus"] is None:
+        state["bus"] = EventBus()
+    return state["bus"]
+
+
+def publish(topic: str, **payload) -> None:
+    """Publish an event on the current session's bus."""
+    get_event_bus().publish(topic, **payload)
+
+
+def subscribe(topics, callback):
+    """Subscribe to events on the current session's bus."""
+    return get_event_bus().subscribe(topics, callback)
@@ -0,0 +1,267 @@
+"""
+Downloads of tables as CSV, Parquet or Excel files, written chunk by chunk.
+
+A table is exported from an iterator of DataFrame chunks, e.g. pages of a
+database query (``bw.iter_processes``) or slices of a result table, so it
+is never held in memory as a whole. The file is written to a temporary
+file in a worker thread while the event loop keeps serving the session,
+then the browser fetches it from the ``/export`` route of this module,
+which streams it from disk and deletes it. The route is added to the
+server with ``panel serve app/app.py --plugins panel_lca_app_concept.export``.
+Parquet needs ``pyarrow`` and Excel ``xlsxwriter``; formats whose package
+is missing are not offered.
+"""
+import asyncio
+import importlib.util
+import os
+import re
+import secrets
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import panel as pn
+import panel_material_ui as pmu
+import param
+from panel.custom import JSComponent
+from tornado.web import HTTPError, RequestHandler
+
+from panel_lca_app_concept.metrics import timed
+
+# Rows per chunk read from a query or result table
+EXPORT_CHUNK_ROWS = int(os.environ.get("PANEL_LCA_EXPORT_CHUNK_ROWS", 50_000))
+# Label -> file extension of the export formats
+FORMATS = {"CSV": "csv", "Parquet": "parquet", "Excel": "xlsx"}
+# Packages the formats besides CSV need
+_FORMAT_PACKAGES = {"parquet": "pyarrow", "xlsx": "xlsxwriter"}
+# Data rows per Excel sheet, further rows continue on a new sheet
+EXCEL_SHEET_ROWS = 1_048_575
+# Larger integers (e.g. Brightway ids) lose digits as Excel numbers and are written as text
+_EXCEL_MAX_INT = 2**53
+# Seconds an export waits to be fetched before the next export deletes it
+EXPORT_TTL = int(os.environ.get("PANEL_LCA_EXPORT_TTL", 600))
+# Shared by all server processes, as the browser's request may reach any of them
+EXPORT_DIR = Path(tempfile.gettempdir()) / "panel-lca-exports"
+# Media type of each format's files
+_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# Bytes read from disk and sent at a time
+_SEND_BYTES = 1 << 20
+
+
+def available_formats() -> dict[str, str]:
+    """The entries of ``FORMATS`` whose packages are installed."""
+    return {
+        label: ext for label, ext in FORMATS.items()
+        if ext not in _FORMAT_PACKAGES or importlib.util.find_spec(_FORMAT_PACKAGES[ext]) is not None
+    }
+
+
+def frame_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Slices of a table that is in memory anyway, e.g. results, so each chunk is encoded on its own."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_csv(chunks, f) -> None:
+    """Write the chunks as UTF-8 CSV with one header line."""
+    header = True
+    for chunk in chunks:
+        f.write(chunk.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+
+
+def write_parquet(chunks, f) -> None:
+    """Write the chunks as one Parquet file with a row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                # Later chunks are converted to the first one's schema, e.g. an all-empty column stays a string
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(f, schema)
+            # One row group per chunk
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _excel_values(chunk: pd.DataFrame) -> pd.DataFrame:
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        values = chunk[column]
+        if pd.api.types.is_integer_dtype(values) and (values.abs() >= _EXCEL_MAX_INT).any():
+            chunk[column] = values.astype(str)
+    return chunk.astype(object).where(chunk.notna(), None)
+
+
+def write_xlsx(chunks, f) -> None:
+    """Write the chunks as Excel workbook, continued on further sheets past Excel's row limit."""
+    import xlsxwriter
+
+    # Rows are flushed to disk as soon as the next one is written
+    workbook = xlsxwriter.Workbook(f, {"constant_memory": True, "nan_inf_to_errors": True})
+    sheet, row, columns = None, 0, None
+    try:
+        for chunk in chunks:
+            if columns is None:
+                columns = [str(c) for c in chunk.columns]
+            for values in _excel_values(chunk).itertuples(index=False, name=None):
+                if sheet is None or row > EXCEL_SHEET_ROWS:
+                    sheet, row = workbook.add_worksheet(), 1
+                    sheet.write_row(0, 0, columns)
+                sheet.write_row(row, 0, values)
+                row += 1
+        if sheet is None:
+            workbook.add_worksheet().write_row(0, 0, columns or [])
+    finally:
+        workbook.close()
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "xlsx": write_xlsx}
+
+
+def _remove_expired() -> None:
+    """Delete exports nobody fetched within ``EXPORT_TTL``."""
+    expired = time.time() - EXPORT_TTL
+    for path in EXPORT_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < expired:
+                path.unlink()
+        except FileNotFoundError:
+            # Sent or removed by another process meanwhile
+            pass
+
+
+@timed()
+def export_file(chunks, ext: str) -> str:
+    """
+    Write ``chunks`` in the format of ``ext`` to a file in ``EXPORT_DIR``.
+
+    Returns the token the file is fetched with from the ``/export`` route.
+    The file only gets its name once it is complete, so it is never sent in
+    part.
+    """
+    EXPORT_DIR.mkdir(mode=0o700, exist_ok=True)
+    _remove_expired()
+    token = secrets.token_urlsafe(32)
+    part = EXPORT_DIR / f"{token}.part"
+    try:
+        with open(part, "wb") as f:
+            WRITERS[ext](chunks, f)
+        part.rename(EXPORT_DIR / token)
+    finally:
+        part.unlink(missing_ok=True)
+    return token
+
+
+def export_filename(stem: str, ext: str) -> str:
+    return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', stem).strip('_') or 'export'}.{ext}"
+
+
+def export_url(token: str, filename: str) -> str:
+    """Where the browser fetches an export, below the server's prefix."""
+    return f"{pn.state.base_url.rstrip('/')}/export/{token}/{filename}"
+
+
+class ExportHandler(RequestHandler):
+    """
+    Sends an export once, ``_SEND_BYTES`` at a time, and deletes it.
+
+    The token is the only credential, it is random and expires with the
+    file; ``filename`` only names the download.
+    """
+
+    async def get(self, token: str, filename: str):
+        path, sending = EXPORT_DIR / token, EXPORT_DIR / f"{token}.sending"
+        try:
+            # Only one request can claim the file
+            path.rename(sending)
+        except FileNotFoundError:
+            raise HTTPError(404)
+        with open(sending, "rb") as f:
+            # The open file stays readable, nothing is left behind if the client goes away
+            sending.unlink()
+            self.set_header("Content-Type", _MEDIA_TYPES.get(filename.rsplit(".", 1)[-1], "application/octet-stream"))
+            self.set_header("Content-Disposition", f'attachment; filename="{filename}"')
+            self.set_header("Content-Length", os.fstat(f.fileno()).st_size)
+            while data := f.read(_SEND_BYTES):
+                self.write(data)
+                await self.flush()
+
+
+# Picked up by ``panel serve --plugins panel_lca_app_concept.export``
+ROUTES = [
+    (r"/export/([A-Za-z0-9_-]+)/([A-Za-z0-9._-]+)", ExportHandler),
+]
+
+
+class DownloadLink(JSComponent):
+    """Invisible component that has the browser download ``url`` whenever it is set."""
+
+    url = param.String(default=None, allow_None=True)
+
+    _esm = """
+    export function render({ model }) {
+      model.on("url", () => {
+        if (!model.url) {
+          return
+        }
+        const link = document.createElement("a")
+        link.href = model.url
+        link.download = ""
+        document.body.appendChild(link)
+        link.click()
+        link.remove()
+      })
+      return document.createElement("span")
+    }
+    """
+
+
+def create_export_controls(source, stem, label="Export"):
+    """
+    Create a format select and a download button exporting ``source()``.
+
+    ``source`` is called on the event loop when the button is clicked and
+    returns the iterator of DataFrame chunks, which is consumed in a worker
+    thread, so it must not read the current project directly (see
+    ``bw.project_data``). ``stem`` is the file name without extension, or a
+    function returning it. The ``link`` that starts the download must be
+    laid out with the button.
+    """
+    formats = available_formats()
+    format_select = pmu.widgets.Select(
+        label="Format",
+        options=list(formats),
+        value="CSV",
+        width=120,
+    )
+
+    @timed()
+    async def _export(event):
+        ext = formats[format_select.value]
+        filename = export_filename(stem() if callable(stem) else stem, ext)
+        download.loading = True
+        try:
+            token = await asyncio.to_thread(export_file, source(), ext)
+        except Exception as e:
+            print(f"Export error: {e}")
+            pn.state.notifications.error(f"Export failed: {e}")
+            return
+        finally:
+            download.loading = False
+        link.url = export_url(token, filename)
+
+    download = pmu.Button(label=label, icon="download", variant="outlined")
+    download.on_click(_export)
+    link = DownloadLink(visible=False)
+    return {"format_select": format_select, "download": download, "link": link}
@@ -1,5 +1,10 @@
 from collections import defaultdict
 
+from panel_lca_app_concept.search import SearchIndex
+
+# Label of the contributions not listed individually in results and charts
+OTHER_LABEL = "Other"
+
 def build_nested_options(rows, level_names=None):
     """
     rows: list of tuples (any length >=1)
@@ -45,4 +50,56 @@ def build_nested_options(rows, level_names=None):
         # top-level leaves
         options.update({k: k for k in sorted(root[TREE_LEAVES])})
 
-    return options, level_names
\ No newline at end of file
+    return options, level_names
+
+METHOD_LEVELS = ["Source", "Method", "Category", "Indicator"]
+
+
+class MethodTree:
+    """
+    LCIA method tuples as a prefix tree, expanded lazily by a NestedSelect.
+
+    Only the children of each prefix are stored, as tuples. ``options`` is
+    passed to ``NestedSelect(options=..., levels=tree.levels)`` and returns
+    the choices of one level when the user expands it, so the full nested
+    dict is never built or sent. ``search`` finds methods by substring of
+    their "a | b | c" label through a trigram index built once.
+    """
+
+    def __init__(self, methods, level_names=METHOD_LEVELS):
+        self.methods = sorted(tuple(m) for m in methods)
+        depth = max((len(m) for m in self.methods), default=1)
+        self.levels = (list(level_names) + [f"Level {i + 1}" for i in range(len(level_names), depth)])[:depth]
+        children = {}
+        for method in self.methods:
+            for i in range(len(method)):
+                children.setdefault(method[:i], {})[method[i]] = None
+        self._children = {prefix: tuple(names) for prefix, names in children.items()}
+        self.labels = [" | ".join(m) for m in self.methods]
+        self._by_label = dict(zip(self.labels, self.methods))
+        self._index = SearchIndex.from_records((i, label, None, None) for i, label in enumerate(self.labels))
+
+        # A plain function, NestedSelect does not accept bound methods
+        def options(level, value):
+            """Choices for ``level`` given the ``value`` of the levels above it."""
+            i = self.levels.index(level)
+            names = self._children.get(tuple(value.values())[:i], ())
+            if i == len(self.levels) - 1:
+                return list(names)
+            return dict.fromkeys(names, options)
+
+        self.options = options
+
+    def __len__(self):
+        return len(self.methods)
+
+    def search(self, term: str, limit: int = 50) -> list[str]:
+        """Labels of the methods containing ``term``, ignoring case."""
+        return [self.labels[i] for i in self._index.search(name=term, limit=limit)]
+
+    def method(self, label: str) -> tuple:
+        return self._by_label[label]
+
+    def value(self, method) -> dict:
+        """NestedSelect value selecting ``method``."""
+        return {level: method[i] if i < len(method) else None for i, level in enumerate(self.levels)}
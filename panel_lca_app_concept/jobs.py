@@ -0,0 +1,134 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import panel as pn
+
+# Calculations running at the same time, over all sessions
+JOB_WORKERS = int(os.environ.get("PANEL_LCA_JOB_WORKERS", 2))
+
+_executor = None
+# Jobs not finished yet, by key, so identical requests share one
+_inflight = {}
+_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's function once every requester has cancelled it."""
+
+
+class Job:
+    """
+    A calculation running on the shared executor.
+
+    The function receives the job as ``progress`` argument and calls it as
+    ``progress(fraction, message)``; that also raises ``JobCancelled`` once
+    the job has been cancelled, so long calculations stop at their next step.
+    Requesters attach with ``watch`` and detach with ``cancel``; the job is
+    only cancelled when the last one detaches.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.fraction = 0.0
+        self.message = "Queued"
+        self.future = None
+        self.cancelled = False
+        self._watchers = []
+
+    def __call__(self, fraction: float, message: str = "") -> None:
+        if self.cancelled:
+            raise JobCancelled(self.key)
+        self.fraction, self.message = fraction, message
+        for watcher in list(self._watchers):
+            watcher.progress(fraction, message)
+
+    def watch(self, on_progress=None, on_done=None):
+        """Attach a requester; callbacks run on its session's event loop."""
+        watcher = _Watcher(self, on_progress, on_done)
+        with _lock:
+            self._watchers.append(watcher)
+        if self.future is not None and self.future.done():
+            watcher.done(self.future)
+        return watcher
+
+    def _detach(self, watcher) -> None:
+        with _lock:
+            if watcher in self._watchers:
+                self._watchers.remove(watcher)
+            if self._watchers or self.cancelled:
+                return
+            self.cancelled = True
+            self.future.cancel()
+            if _inflight.get(self.key) is self:
+                del _inflight[self.key]
+
+    def _finished(self, future) -> None:
+        with _lock:
+            if _inflight.get(self.key) is self:
+                del _inflight[self.key]
+            watchers = list(self._watchers)
+        for watcher in watchers:
+            watcher.done(future)
+
+
+class _Watcher:
+    def __init__(self, job, on_progress, on_done):
+        self.job = job
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.doc = pn.state.curdoc
+        self.active = True
+        # Set once on_done is dispatched, as both watch and the job's end may report it
+        self.notified = False
+
+    def _dispatch(self, callback, *args):
+        if not self.active or callback is None:
+            return
+        if self.doc is not None and self.doc.session_context is not None:
+            # The only thread-safe way into a Bokeh document
+            self.doc.add_next_tick_callback(lambda: self.active and callback(*args))
+        else:
+            callback(*args)
+
+    def progress(self, fraction, message):
+        self._dispatch(self.on_progress, fraction, message)
+
+    def done(self, future):
+        with _lock:
+            if self.notified:
+                return
+            self.notified = True
+        if future.cancelled():
+            return
+        self._dispatch(self.on_done, future)
+
+    def cancel(self) -> None:
+        """Stop receiving updates; cancels the job if no one else waits for it."""
+        self.active = False
+        self.job._detach(self)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(JOB_WORKERS, thread_name_prefix="calculation")
+    return _executor
+
+
+def submit(key, fn, *args, **kwargs) -> Job:
+    """
+    Run ``fn(*args, progress=job, **kwargs)`` in the background, or join the identical job already running.
+
+    ``key`` must identify the result completely (inputs and data version), as
+    requests with equal keys from any session get the same job.
+    """
+    with _lock:
+        job = _inflight.get(key)
+        if job is not None and not job.cancelled:
+            return job
+        job = Job(key)
+        _inflight[key] = job
+        job.future = get_executor().submit(fn, *args, progress=job, **kwargs)
+    job.future.add_done_callback(job._finished)
+    return job
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import bw2data as bd
+import numpy as np
+from scipy import sparse
+
+# Total size of all cache entries of a project before the least recently used are evicted
+CACHE_SIZE_BUDGET = int(os.environ.get("PANEL_LCA_MATRIX_CACHE_BYTES", 2 * 1024**3))
+CACHE_DIRNAME = "matrix_cache"
+_ACCESS_MARKER = ".last_access"
+_META_FILE = "meta.json"
+
+# Content hashes of processed datapackages: (path, size, mtime_ns) -> sha256
+_file_hashes = {}
+# One cache object per project directory
+_caches = {}
+
+
+def _file_hash(path: Path) -> str:
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def datapackage_key(database_names) -> str:
+    """
+    Cache key for the matrices built from the given databases.
+
+    Hashes the content of each database's processed datapackage, so the key
+    changes whenever ``bd.Database(...).process()`` rewrites one of them.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(database_names):
+        # ``filepath_processed`` also processes the database if it is dirty
+        path = Path(bd.Database(name).filepath_processed())
+        digest.update(name.encode())
+        digest.update(_file_hash(path).encode())
+    return digest.hexdigest()[:32]
+
+
+def pack_sparse(prefix: str, matrix) -> dict[str, np.ndarray]:
+    """Split a CSR/CSC matrix into plain arrays for ``MatrixCache.put``."""
+    return {
+        f"{prefix}.data": matrix.data,
+        f"{prefix}.indices": matrix.indices,
+        f"{prefix}.indptr": matrix.indptr,
+        f"{prefix}.shape": np.array(matrix.shape, dtype=np.int64),
+    }
+
+
+def unpack_sparse(prefix: str, arrays: dict, fmt: str = "csr"):
+    """Rebuild a matrix packed with ``pack_sparse`` without copying the arrays."""
+    cls = sparse.csr_matrix if fmt == "csr" else sparse.csc_matrix
+    return cls(
+        (arrays[f"{prefix}.data"], arrays[f"{prefix}.indices"], arrays[f"{prefix}.indptr"]),
+        shape=tuple(arrays[f"{prefix}.shape"]),
+        copy=False,
+    )
+
+
+class MatrixCache:
+    """
+    On-disk store of NumPy arrays, one directory per key.
+
+    Arrays are read back memory-mapped, so several server processes using
+    the same ``BRIGHTWAY2_DIR`` share one copy through the page cache. Entries
+    are written to a temporary directory and renamed into place, so readers
+    never see partial entries. When the total size exceeds ``size_budget``,
+    the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory, size_budget: int = CACHE_SIZE_BUDGET):
+        self.directory = Path(directory)
+        self.size_budget = size_budget
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str):
+        """Return the memory-mapped arrays stored under ``key``, or ``None``."""
+        path = self.directory / key
+        try:
+            meta = json.loads((path / _META_FILE).read_text())
+            arrays = {
+                name: np.load(path / f"{name}.npy", mmap_mode="r")
+                for name in meta["arrays"]
+            }
+            (path / _ACCESS_MARKER).touch()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        return arrays
+
+    def put(self, key: str, arrays: dict[str, np.ndarray], databases=()) -> None:
+        """Store ``arrays`` under ``key``, replacing older entries for the same databases."""
+        if self.size_budget <= 0:
+            return
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.directory))
+        try:
+            for name, array in arrays.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+            meta = {"arrays": list(arrays), "databases": sorted(databases)}
+            (tmp / _META_FILE).write_text(json.dumps(meta))
+            (tmp / _ACCESS_MARKER).touch()
+            os.rename(tmp, self.directory / key)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._drop_superseded(key, sorted(databases))
+        self.evict()
+
+    def _drop_superseded(self, key: str, databases: list) -> None:
+        if not databases:
+            return
+        for entry in self._entries():
+            if entry.name == key:
+                continue
+            try:
+                meta = json.loads((entry / _META_FILE).read_text())
+            except (FileNotFoundError, ValueError):
+                continue
+            if meta.get("databases") == databases:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _entries(self) -> list[Path]:
+        return [p for p in self.directory.iterdir() if p.is_dir() and not p.name.startswith(".")]
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits its budget."""
+        entries = []
+        for entry in self._entries():
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                last_access = (entry / _ACCESS_MARKER).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((last_access, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.size_budget:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+
+def get_matrix_cache():
+    """Get the matrix cache of the current project, or ``None`` if caching is disabled."""
+    if CACHE_SIZE_BUDGET <= 0:
+        return None
+    directory = Path(bd.projects.dir) / CACHE_DIRNAME
+    if directory not in _caches:
+        _caches[directory] = MatrixCache(directory)
+    return _caches[directory]
@@ -0,0 +1,282 @@
+"""
+Latency, call counts and payload sizes of UI callbacks and Brightway calls.
+
+Functions decorated with ``timed`` are recorded per session and served in the
+Prometheus text format by the ``/metrics`` route of this module. ``/profile``
+switches cProfile on for one callback. Both routes are added to the server
+with ``panel serve app/app.py --plugins panel_lca_app_concept.metrics``. They
+are outside the app's authentication and only answer the clients listed in
+``PANEL_LCA_METRICS_ALLOW``, by default the local host; behind a proxy, add
+its address or run the server with ``--use-xheaders``.
+
+    curl localhost:5006/metrics
+    curl -X POST "localhost:5006/profile?callback=calculation_setup._on_process_click&every=5"
+    curl localhost:5006/profile
+"""
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+import pandas as pd
+import panel as pn
+from tornado.web import HTTPError, RequestHandler
+
+from panel_lca_app_concept.session import _session_id
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Callback profiled from the start, e.g. "calculation_setup._on_calculate_click"
+PROFILE_CALLBACK = os.environ.get("PANEL_LCA_PROFILE") or None
+# Only every n-th call of the profiled callback is profiled
+PROFILE_EVERY = int(os.environ.get("PANEL_LCA_PROFILE_EVERY", 1))
+# Session label of calls outside a browser session, e.g. in calculation jobs
+NO_SESSION = "none"
+# Series of ended sessions are added up under this session label
+CLOSED_SESSIONS = "closed"
+# Client addresses served by /metrics and /profile, comma separated
+METRICS_ALLOW = {
+    address.strip()
+    for address in os.environ.get("PANEL_LCA_METRICS_ALLOW", "127.0.0.1,::1").split(",")
+    if address.strip()
+}
+
+# (name, session) -> _Series
+_series = {}
+_sessions = set()
+_lock = threading.Lock()
+_profile = {"name": PROFILE_CALLBACK, "every": PROFILE_EVERY, "calls": 0, "active": False, "stats": None}
+
+
+class _Series:
+    def __init__(self):
+        # Calls per bucket, the last one is +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.seconds = 0.0
+        self.count = 0
+        self.errors = 0
+        self.payload_bytes = 0
+        self.payloads = 0
+
+    def add(self, seconds: float, payload_bytes=None, failed=False) -> None:
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        self.buckets[bucket] += 1
+        self.seconds += seconds
+        self.count += 1
+        self.errors += failed
+        if payload_bytes is not None:
+            self.payload_bytes += payload_bytes
+            self.payloads += 1
+
+    def merge(self, other) -> None:
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        for attr in ("seconds", "count", "errors", "payload_bytes", "payloads"):
+            setattr(self, attr, getattr(self, attr) + getattr(other, attr))
+
+
+def payload_size(obj) -> int:
+    """Bytes of a result, shallow for DataFrames so measuring stays cheap."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(obj)
+
+
+def _close_session(session_context) -> None:
+    with _lock:
+        _sessions.discard(session_context.id)
+        for name, session in [key for key in _series if key[1] == session_context.id]:
+            series = _series.pop((name, session))
+            _series.setdefault((name, CLOSED_SESSIONS), _Series()).merge(series)
+
+
+def _session_label() -> str:
+    session_id = _session_id()
+    if session_id is None:
+        return NO_SESSION
+    if session_id not in _sessions:
+        _sessions.add(session_id)
+        pn.state.on_session_destroyed(_close_session)
+    return session_id
+
+
+def record(name: str, seconds: float, payload=None, failed=False) -> None:
+    """Add one call of ``name`` to the current session's series."""
+    payload_bytes = None if payload is None else payload_size(payload)
+    session = _session_label()
+    with _lock:
+        _series.setdefault((name, session), _Series()).add(seconds, payload_bytes, failed)
+
+
+def profile(name=None, every: int = 1) -> None:
+    """Profile every ``every``-th call of the callback ``name``, or nothing with ``None``; drops earlier stats."""
+    with _lock:
+        _profile.update(name=name, every=max(int(every), 1), calls=0, stats=None)
+
+
+def profile_report(sort: str = "cumulative", limit: int = 40) -> str:
+    """The pstats listing of the calls profiled so far."""
+    with _lock:
+        name, stats = _profile["name"], _profile["stats"]
+        if stats is None:
+            return f"No profiled calls of {name}\n" if name else "Profiling is off\n"
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats(sort).print_stats(limit)
+    return f"Profile of {name}\n{out.getvalue()}"
+
+
+def _start_profile(name: str):
+    with _lock:
+        if name != _profile["name"] or _profile["active"]:
+            return None
+        _profile["calls"] += 1
+        if (_profile["calls"] - 1) % _profile["every"]:
+            return None
+        _profile["active"] = True
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already running in this interpreter
+        with _lock:
+            _profile["active"] = False
+        return None
+    return profiler
+
+
+def _stop_profile(name: str, profiler) -> None:
+    profiler.disable()
+    with _lock:
+        _profile["active"] = False
+        if name != _profile["name"]:
+            return
+        if _profile["stats"] is None:
+            _profile["stats"] = pstats.Stats(profiler)
+        else:
+            _profile["stats"].add(profiler)
+
+
+class timed:
+    """
+    Record the latency of a function or a block under ``name``.
+
+    As decorator the name defaults to ``<module>.<function>`` and the return
+    value is recorded as payload; coroutine functions are timed until they
+    finish. As context manager, assign the payload to ``.payload``::
+
+        with timed("charts.update") as timer:
+            timer.payload = df
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.payload = None
+
+    def __call__(self, func):
+        name = self.name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with timed(name) as timer:
+                    timer.payload = await func(*args, **kwargs)
+                    return timer.payload
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with timed(name) as timer:
+                    timer.payload = func(*args, **kwargs)
+                    return timer.payload
+        return wrapper
+
+    def __enter__(self):
+        self._profiler = _start_profile(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        if self._profiler is not None:
+            _stop_profile(self.name, self._profiler)
+        record(self.name, seconds, self.payload, failed=exc_type is not None)
+        return False
+
+
+def _labels(name, session, **extra) -> str:
+    labels = {"name": name, "session": session, **extra}
+    return ",".join(
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels.items()
+    )
+
+
+def prometheus_text() -> str:
+    """All series in the Prometheus text exposition format."""
+    with _lock:
+        series = sorted(_series.items())
+        snapshot = [(key, list(s.buckets), s.seconds, s.count, s.errors, s.payload_bytes, s.payloads)
+                    for key, s in series]
+    lines = [
+        "# HELP panel_lca_latency_seconds Time spent in UI callbacks and Brightway calls.",
+        "# TYPE panel_lca_latency_seconds histogram",
+    ]
+    for (name, session), buckets, seconds, count, *_ in snapshot:
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+            cumulative += n
+            lines.append(f"panel_lca_latency_seconds_bucket{{{_labels(name, session, le=bound)}}} {cumulative}")
+        lines.append(f"panel_lca_latency_seconds_sum{{{_labels(name, session)}}} {seconds:.6f}")
+        lines.append(f"panel_lca_latency_seconds_count{{{_labels(name, session)}}} {count}")
+    lines += [
+        "# HELP panel_lca_errors_total Calls that raised an exception.",
+        "# TYPE panel_lca_errors_total counter",
+    ]
+    for (name, session), _, _, _, errors, _, _ in snapshot:
+        lines.append(f"panel_lca_errors_total{{{_labels(name, session)}}} {errors}")
+    lines += [
+        "# HELP panel_lca_payload_bytes Size of the returned values.",
+        "# TYPE panel_lca_payload_bytes summary",
+    ]
+    for (name, session), _, _, _, _, payload_bytes, payloads in snapshot:
+        if payloads:
+            lines.append(f"panel_lca_payload_bytes_sum{{{_labels(name, session)}}} {payload_bytes}")
+            lines.append(f"panel_lca_payload_bytes_count{{{_labels(name, session)}}} {payloads}")
+    return "\n".join(lines) + "\n"
+
+
+class _AllowedClientHandler(RequestHandler):
+    def prepare(self):
+        if self.request.remote_ip not in METRICS_ALLOW:
+            raise HTTPError(403)
+
+
+class MetricsHandler(_AllowedClientHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(prometheus_text())
+
+
+class ProfileHandler(_AllowedClientHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; charset=utf-8")
+        self.write(profile_report(self.get_argument("sort", "cumulative"), int(self.get_argument("limit", 40))))
+
+    def post(self):
+        """``?callback=<name>&every=<n>`` starts profiling, no callback stops it."""
+        name = self.get_argument("callback", "") or None
+        profile(name, int(self.get_argument("every", 1)))
+        self.write(f"Profiling {name}\n" if name else "Profiling is off\n")
+
+
+# Picked up by ``panel serve --plugins panel_lca_app_concept.metrics``
+ROUTES = [
+    (r"/metrics", MetricsHandler),
+    (r"/profile", ProfileHandler),
+]
@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import bw2data as bd
+import numpy as np
+import pandas as pd
+
+from panel_lca_app_concept.calculation import FactorizedMultiLCA, method_label
+from panel_lca_app_concept.workers import set_current_read_only
+
+# Upper limit of Monte Carlo iterations per run
+MC_ITERATIONS = 2000
+# Iterations per pool task; each task builds its matrices once and redraws only their values
+MC_CHUNK_SIZE = 50
+# Iterations between two streamed summaries
+MC_UPDATE_EVERY = 200
+# Stop early once no interval bound moved by more than this share of the mean since the last summary
+MC_TOLERANCE = 0.01
+MC_WORKERS = int(os.environ.get("PANEL_LCA_MC_WORKERS", min(4, os.cpu_count() or 1)))
+QUANTILES = (0.025, 0.5, 0.975)
+
+# Worker processes shared by all sessions, started on first use
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: children must not inherit the server's SQLite connections
+        _pool = ProcessPoolExecutor(MC_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def sample_scores(project: str, demands: dict, methods: list, seed: int, iterations: int) -> np.ndarray:
+    """
+    Draw ``iterations`` Monte Carlo samples of every (method, demand) score.
+
+    Runs in a worker process. The matrices are built once; every iteration
+    only redraws their values from the stored uncertainty distributions with
+    an RNG seeded by ``seed``, refactorizes and solves. Returns an array of
+    shape ``(iterations, len(methods) * len(demands))``, method-major.
+    """
+    set_current_read_only(project)
+    method_config = {"impact_categories": list(methods)}
+    mlca = FactorizedMultiLCA(
+        demands=demands,
+        method_config=method_config,
+        data_objs=bd.get_multilca_data_objs(demands, method_config),
+        use_distributions=True,
+        seed_override=seed,
+    )
+    mlca.load_lci_data()
+    mlca.build_demand_array()
+    mlca.load_lcia_data()
+    demand_matrix = np.column_stack([mlca.demand_arrays[label] for label in demands])
+
+    samples = np.empty((iterations, len(methods) * len(demands)))
+    for i in range(iterations):
+        # Only matrices are iterated; the inventories are never built
+        next(mlca)
+        supply = np.column_stack([mlca.solver(column) for column in demand_matrix.T])
+        for j, method in enumerate(methods):
+            characterized = mlca.characterization_matrices[method] @ mlca.biosphere_matrix
+            unit_scores = np.asarray(characterized.sum(axis=0)).ravel()
+            samples[i, j * len(demands):(j + 1) * len(demands)] = unit_scores @ supply
+    return samples
+
+
+def summarize(samples: np.ndarray, demands: dict, methods: list) -> pd.DataFrame:
+    """Mean and quantiles per product and method, as a long table."""
+    q_low, q_mid, q_high = np.quantile(samples, QUANTILES, axis=0)
+    index = pd.MultiIndex.from_product(
+        [[method_label(m) for m in methods], list(demands)], names=["method", "product"]
+    )
+    return pd.DataFrame({
+        "mean": samples.mean(axis=0),
+        "low": q_low,
+        "median": q_mid,
+        "high": q_high,
+        "iterations": len(samples),
+    }, index=index).reset_index()
+
+
+def _converged(previous: pd.DataFrame, current: pd.DataFrame, tolerance: float) -> bool:
+    scale = np.abs(current["mean"].to_numpy()) + 1e-300
+    moved = np.maximum(
+        np.abs(current["low"].to_numpy() - previous["low"].to_numpy()),
+        np.abs(current["high"].to_numpy() - previous["high"].to_numpy()),
+    )
+    return bool((moved / scale <= tolerance).all())
+
+
+async def stream_monte_carlo(project: str, demands: dict, methods: list,
+                             iterations: int = MC_ITERATIONS, seed=None, early_stop: bool = True,
+                             tolerance: float = MC_TOLERANCE, chunk_size: int = MC_CHUNK_SIZE,
+                             update_every: int = MC_UPDATE_EVERY):
+    """
+    Run a Monte Carlo analysis on the worker pool, yielding running summaries.
+
+    Iterations are split into chunks with independent RNG streams spawned
+    from one ``numpy.random.SeedSequence(seed)``, so a run is reproducible for
+    a given seed whatever the number of workers. A ``summarize`` table (plus a
+    ``converged`` column) is yielded about every ``update_every`` iterations.
+    With ``early_stop``, the run ends once a summary's interval bounds moved
+    less than ``tolerance`` relative to the mean since the previous one.
+    """
+    n_chunks = -(-iterations // chunk_size)
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n_chunks)]
+    sizes = [min(chunk_size, iterations - i * chunk_size) for i in range(n_chunks)]
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    # Keep the pool busy, but do not queue more than needed to stop early
+    pending = list(zip(seeds, sizes))[::-1]
+    running = set()
+    chunks, done, last_update, previous = [], 0, 0, None
+    try:
+        while pending or running:
+            while pending and len(running) < 2 * MC_WORKERS:
+                chunk_seed, size = pending.pop()
+                running.add(asyncio.ensure_future(loop.run_in_executor(
+                    pool, sample_scores, project, demands, methods, chunk_seed, size
+                )))
+            finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                chunks.append(future.result())
+                done += len(chunks[-1])
+            if done - last_update < update_every and (pending or running):
+                continue
+            last_update = done
+            summary = summarize(np.concatenate(chunks), demands, methods)
+            converged = previous is not None and _converged(previous, summary, tolerance)
+            summary["converged"] = converged
+            previous = summary
+            yield summary
+            if early_stop and converged:
+                break
+    finally:
+        for future in running:
+            future.cancel()
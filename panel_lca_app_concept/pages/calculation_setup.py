@@ -1,27 +1,71 @@
 import panel as pn
 import panel_material_ui as pmu
 import pandas as pd
-from panel_lca_app_concept.bw import list_projects, set_current_project, list_databases, list_processes, get_method_options, list_process_production, list_process_inputs
+import param
+import bw2data as bd
+from panel_lca_app_concept.bw import list_projects, set_current_project, list_databases, count_processes, query_processes, iter_processes, get_method_tree, load_process_details, data_version, project_data
+from panel_lca_app_concept.components.method_search import MethodSearch
+from panel_lca_app_concept.calculation import calculate_footprints, contribution_table, functional_unit_demands, method_label, method_unit
+from panel_lca_app_concept.edits import ExchangeEdits
+from panel_lca_app_concept.export import EXPORT_CHUNK_ROWS, create_export_controls, frame_chunks
+from panel_lca_app_concept.events import DATABASE_CHANGED, PROJECT_CHANGED, publish, subscribe
+from panel_lca_app_concept.jobs import JobCancelled, submit
+from panel_lca_app_concept.metrics import timed
+from panel_lca_app_concept.pages.contribution_analysis import set_contribution_inputs
+from panel_lca_app_concept.pages.impact_overview import get_impact_overview_widgets, set_uncertainty_inputs, show_results
+from panel_lca_app_concept.scores import get_scores, request_scores, score_results
+from panel_lca_app_concept.session import get_session_state
+from panel_lca_app_concept.tables import TableModel
+
+# Rows per page of the processes table, each page is one query
+PROCESS_PAGE_SIZE = 50
+# Table columns and the catalog fields they are filtered and sorted on
+PROCESS_COLUMNS = {"Product": "product", "Process": "name", "Location": "location"}
+
+def _get_state():
+    """State of the calculation setup page in the current session"""
+    return get_session_state().namespace(
+        "calculation_setup",
+        current_project=None,
+        current_db=None,
+        df_processes=pd.DataFrame(columns=["id", "Product", "Process", "Location"]),
+        widgets=None,
+        selected_process=None,
+        calculation=None,
+        lca=None,
+        lca_inputs=None,
+        edits=None,
+        scores=None,
+    )
+
+@timed()
+def _run_calculation(project, functional_unit, methods, progress):
+    """Calculation job, runs on the shared executor"""
+    return calculate_footprints(functional_unit, methods, progress=progress, return_lca=True, project=project)
 
-# Module-level shared state for calculation setup
-_shared_state = {
-    'current_project': None,
-    'current_db': None,
-    'df_processes': pd.DataFrame(columns=["Product", "Process", "Location"]),
-    'widgets': None,
-    'selected_process': None
-}
+@timed()
+def _score_totals(project, database, functional_unit, methods, progress):
+    """Totals from the precomputed scores, or ``None``; runs on the shared executor"""
+    with project_data(project):
+        return score_results(database, functional_unit, methods)
+
+def _calculation_key(project, functional_unit, methods):
+    """Everything the result depends on, including the version of the data in the current project"""
+    demands = functional_unit_demands(functional_unit)
+    frozen = tuple((label, tuple(sorted(demand.items()))) for label, demand in demands.items())
+    return (project, frozen, tuple(methods), data_version())
 
 def get_calculation_setup_widgets():
-    """Get or create calculation setup widgets (singleton pattern)"""
-    if _shared_state['widgets'] is not None:
-        return _shared_state['widgets']
-    
-    _shared_state['widgets'] = create_calculation_setup_widgets()
-    return _shared_state['widgets']
+    """Get or create the calculation setup widgets of the current session"""
+    state = _get_state()
+    if state['widgets'] is None:
+        state['widgets'] = create_calculation_setup_widgets()
+    return state['widgets']
 
 def create_calculation_setup_widgets():
     """Create all widgets for calculation setup page"""
+    state = _get_state()
+    state['edits'] = ExchangeEdits()
 
     # Project & Database selection
     select_project = pmu.widgets.Select(
@@ -57,17 +101,22 @@ def create_calculation_setup_widgets():
 
     # Tables
     processes_tabulator = pn.widgets.Tabulator(
-        _shared_state['df_processes'],
+        state['df_processes'],
         sizing_mode="stretch_both",
         widths={
-            "Product": "25%",
-            "Process": "53%",
-            "Location": "22%",
+            "Product": "22%",
+            "Process": "46%",
+            "Location": "18%",
+            "Impact": "14%",
         },
         name="Processes",
-        pagination="remote",
+        # Pages, filters and sorting are queried from the database, see _load_page
+        pagination=None,
         show_index=False,
+        hidden_columns=["id"],
         sorters=[{"field": "Product", "dir": "asc"}],
+        # Impacts are looked up for the shown page only, they can't be sorted on
+        sortable={"Impact": False},
         disabled=True,
         selectable=False,
         header_filters={
@@ -79,6 +128,8 @@ def create_calculation_setup_widgets():
             ":host .tabulator {border-radius: var(--mui-shape-borderRadius);}"
         ],
         )
+    processes_pager = pmu.Pagination(count=1, value=0, sizing_mode="stretch_width")
+    processes_count = pmu.pane.Markdown("")
     
     add_process_button = pmu.widgets.Button(
         label="Create New Process",
@@ -119,8 +170,10 @@ You will be able to enter new process data here.
 
     add_process_button.js_on_click(args={'dialog': dialog_new_process}, code="dialog.data.open = true")
     
+    @timed()
     def _on_create_new_process(event):
         pn.state.notifications.success("New process created successfully! Except not, as this is a demo.")
+    @timed()
     def _on_discard_process(event):
         pn.state.notifications.info("Process creation discarded.")
         
@@ -130,7 +183,7 @@ You will be able to enter new process data here.
     dialog_discard_button.on_click(_on_discard_process)
 
     functional_unit = pn.widgets.Tabulator(
-        pd.DataFrame(columns=["Amount", "Product", "Process", "Location"]),
+        pd.DataFrame(columns=["Amount", "id", "Product", "Process", "Location"]),
         buttons={
             "delete": "<span class='material-icons'>delete_forever</span>",
         },
@@ -138,6 +191,7 @@ You will be able to enter new process data here.
         layout="fit_data_stretch",
         name="Processes",
         show_index=False,
+        hidden_columns=["id"],
         sorters=[{"field": "Product", "dir": "asc"}],
         editors={
             "Amount": "number",
@@ -149,45 +203,160 @@ You will be able to enter new process data here.
             ":host .tabulator {border-radius: var(--mui-shape-borderRadius);}"
         ],
     )
+    functional_unit_model = TableModel(functional_unit)
+    functional_unit_export = create_export_controls(
+        lambda: frame_chunks(functional_unit.value.copy(), EXPORT_CHUNK_ROWS),
+        "functional unit",
+        label="Export Functional Unit",
+    )
 
     # Callbacks
+    @timed()
     def _on_project_select(event):
-        print(f"Project selected: {event.new}")
-        _shared_state['current_project'] = event.new
+        state['current_project'] = event.new
         set_current_project(event.new)
-        select_db.disabled = False
-        select_db.options = list_databases()[::-1]
-        method_select.disabled = False
-        options, levels = get_method_options()
-        method_select.options = options
-        method_select.levels = ["Source", "Method", "Category", "Indicator"]
-        method_select.layout = {"type": pn.GridBox, "ncols": 2}
+        # The database chosen before belongs to the previous project
+        state['current_db'] = None
+        no_db_alert.visible = True
+        catalog_export['download'].disabled = True
+        with param.discard_events(select_db):
+            select_db.param.update(disabled=False, options=list_databases()[::-1], value=None)
+        method_select.disabled = method_search.disabled = False
+        tree = get_method_tree()
+        # Levels are resolved by the tree as the user expands them
+        method_select.param.update(
+            options=tree.options,
+            levels=tree.levels,
+            layout={"type": pn.GridBox, "ncols": 2},
+        )
+        method_search.set_tree(tree)
+        publish(PROJECT_CHANGED, project=event.new)
 
+    @timed()
     def _on_db_select(event):
-        print(f"Database selected: {event.new}")
-        _shared_state['current_db'] = event.new
+        state['current_db'] = event.new
         no_db_alert.visible = False
         select_db.loading = True
-        set_current_project(_shared_state['current_project'])
-        _shared_state['df_processes'] = pd.DataFrame(
-            [
-                {
-                    "Product": p.get("reference product"),
-                    "Process": p.get("name"),
-                    "Location": p.get("location"),
-                }
-                for p in list_processes(_shared_state['current_db'])
-            ]
+        publish(DATABASE_CHANGED, database=event.new)
+
+    def _process_filters():
+        return {
+            PROCESS_COLUMNS[f['field']]: str(f['value'])
+            for f in processes_tabulator.filters
+            if f.get('field') in PROCESS_COLUMNS and f.get('value') not in (None, "", [])
+        }
+
+    def _process_sorters():
+        return [(PROCESS_COLUMNS[s['field']], s['dir'] == 'asc')
+                for s in processes_tabulator.sorters if s['field'] in PROCESS_COLUMNS]
+
+    @timed()
+    def _load_page(event=None):
+        """Query the current page with the table's header filters and sorting"""
+        if state['current_db'] is None:
+            return
+        set_current_project(state['current_project'])
+        filters = _process_filters()
+        count = count_processes(state['current_db'], filters)
+        pages = max(-(-count // PROCESS_PAGE_SIZE), 1)
+        if processes_pager.value >= pages:
+            # Triggers _load_page again for the last page
+            processes_pager.param.update(count=pages, value=pages - 1)
+            return
+        processes_pager.count = pages
+        page = query_processes(
+            state['current_db'],
+            filters,
+            sorters=_process_sorters(),
+            offset=processes_pager.value * PROCESS_PAGE_SIZE,
+            limit=PROCESS_PAGE_SIZE,
         )
-        processes_tabulator.value = _shared_state['df_processes']
-        processes_tabulator.pagination="remote"
-        processes_tabulator.page_size = None
+        scores, methods = get_scores(state['current_db']), _selected_methods()
+        if scores is not None and methods:
+            # Score of one unit of each product under the chosen method
+            page["impact"] = [f"{v:.3g}" if v == v else "" for v in scores.lookup(page["id"], methods[0])]
+            unit = method_unit(methods[0])
+            processes_tabulator.titles = {"Impact": f"Impact ({unit})" if unit else "Impact"}
+        state['df_processes'] = page.rename(
+            columns={"product": "Product", "name": "Process", "location": "Location", "impact": "Impact"}
+        )
+        processes_tabulator.value = state['df_processes']
+        processes_count.object = f"{count:,} processes"
+
+    def _catalog_chunks():
+        """All processes matching the table's filters and sorting, with their impacts once computed"""
+        project, db = state['current_project'], state['current_db']
+        set_current_project(project)
+        filters, sorters = _process_filters(), _process_sorters()
+        scores, methods = get_scores(db), _selected_methods()
+        columns = {"product": "Product", "name": "Process", "location": "Location"}
+        units = {m: method_unit(m) for m in methods}
+
+        def chunks():
+            for chunk in iter_processes(db, filters, sorters, EXPORT_CHUNK_ROWS, project):
+                chunk = chunk.rename(columns=columns)
+                if scores is not None:
+                    for m in methods:
+                        label = method_label(m)
+                        chunk[f"{label} ({units[m]})" if units[m] else label] = scores.lookup(chunk["id"], m)
+                yield chunk
+
+        return chunks()
+
+    catalog_export = create_export_controls(
+        _catalog_chunks,
+        lambda: f"processes {state['current_db'] or ''}",
+        label="Export Processes",
+    )
+    catalog_export['download'].disabled = True
+
+    @timed()
+    def _on_filter_or_sort(event):
+        # New filters or sorting start at the first page
+        if processes_pager.value:
+            processes_pager.value = 0
+        else:
+            _load_page()
+
+    @timed()
+    def _load_processes(events):
+        # Quick successive selections load the table once, for the last database
+        _on_filter_or_sort(events)
         processes_tabulator.layout = "fit_data_stretch"
         # processes_tabulator.layout = "fit_data_table"
         select_db.loading = False
         processes_tabulator.visible = True
         functional_unit.visible = True
+        catalog_export['download'].disabled = False
+        _request_scores()
 
+    @timed()
+    def _on_scores_done(future):
+        state['scores'] = None
+        try:
+            if future.result() is None:
+                return
+        except JobCancelled:
+            return
+        except Exception as e:
+            print(f"Score calculation error: {e}")
+            return
+        _load_page()
+
+    def _request_scores():
+        """Compute the scores of the current database in the background unless they are current"""
+        if state['scores'] is not None:
+            state['scores'].cancel()
+            state['scores'] = None
+        try:
+            job = request_scores(state['current_project'], state['current_db'])
+        except Exception as e:
+            print(f"Score calculation error: {e}")
+            return
+        if job is not None:
+            state['scores'] = job.watch(on_done=_on_scores_done)
+
+    @timed()
     def _on_process_click(event):
         try:
             # Ignore clicks that are not on a data row
@@ -196,68 +365,116 @@ You will be able to enter new process data here.
             # Get the clicked row from the *current* processes tabulator view
             # Use the currently displayed dataframe to respect active filters/sorts
             df_view = processes_tabulator.value
-            clicked = df_view.iloc[[event.row]].copy()
+            clicked = df_view.iloc[[event.row]].drop(columns=["Impact"], errors="ignore")
             # Ensure columns and prepend default Amount
             clicked.insert(0, "Amount", 1.0)
 
-            # Append to functional unit
-            fu_df = functional_unit.value
-            fu_df = pd.concat([fu_df, clicked], ignore_index=True)
-            functional_unit.value = fu_df
+            # Append to functional unit, only the new row is sent
+            functional_unit_model.append(clicked)
             calculate_button.disabled = functional_unit.value.empty
-            print(clicked)
             product_name.value = clicked["Product"].iloc[0]
             process_name.value = clicked["Process"].iloc[0]
             location_name.value = clicked["Location"].iloc[0]
-            process_production = list_process_production(
-                _shared_state['current_db'],
-                clicked["Process"].iloc[0],
-                clicked["Product"].iloc[0],
-                clicked["Location"].iloc[0]
-            )
-            outputs.value = pd.DataFrame(
-                [
-                    (
-                        e.amount,
-                        e.input["reference product"],
-                        e.input["name"],
-                        e.input["location"],
-                    )
-                    for e in process_production
-                ],
-                columns=["Amount", "Product", "Process", "Location"],
-            )
-            process_inputs = list_process_inputs(
-                _shared_state['current_db'],
-                clicked["Process"].iloc[0],
-                clicked["Product"].iloc[0],
-                clicked["Location"].iloc[0]
-            )
-            inputs.value = pd.DataFrame(
-                [
-                    (
-                        e.amount,
-                        e.input["reference product"],
-                        e.input["name"],
-                        e.input["location"],
-                    )
-                    for e in process_inputs
-                ],
-                columns=["Amount", "Product", "Process", "Location"],
-            )
+            state['selected_process'] = int(clicked["id"].iloc[0])
+            _show_process_details()
             # description.value = clicked["Description"].iloc[0]
 
         except Exception as e:
             print(f"Process row click error: {e}")
 
+    def _show_process_details():
+        """Fill the outputs and inputs tables of the selected process, with unsaved amounts"""
+        details = load_process_details(state['selected_process']).rename(columns={
+            "type": "Type", "amount": "Amount", "product": "Product", "name": "Process", "location": "Location",
+        })
+        pending = state['edits'].amounts()
+        if pending:
+            details = details.assign(Amount=[pending.get(e, a) for e, a in zip(details["exchange"], details["Amount"])])
+        is_production = details["Type"] == "production"
+        outputs_model.replace(details.loc[is_production, ["exchange", "id", "Amount", "Product", "Process", "Location"]])
+        inputs_model.replace(details.loc[~is_production, ["exchange", "id", "Amount", "Type", "Product", "Process", "Location"]])
+
+    def _show_lca(lca):
+        """Show the results of a solved calculation, keeping the chosen method"""
+        _, _, methods = state['lca_inputs']
+        show_results(
+            contribution_table(lca),
+            units={method_label(m): method_unit(m) for m in methods},
+            method=get_impact_overview_widgets()['method_choice'].value,
+        )
+
+    def _update_edit_controls(message=""):
+        n = len(state['edits'])
+        save_edits_button.disabled = discard_edits_button.disabled = not n
+        edit_status.object = message or (f"{n} unsaved change{'s' if n != 1 else ''}" if n else "")
+
+    def _preview_edits():
+        """Update the results with the unsaved amounts, without refactorizing if possible"""
+        if state['lca'] is None:
+            _update_edit_controls()
+            return
+        try:
+            _show_lca(state['lca'].with_exchange_changes(state['edits'].changes()))
+        except Exception as e:
+            print(f"What-if update error: {e}")
+            pn.state.notifications.error(f"Updating the results failed: {e}")
+            return
+        _update_edit_controls()
+
+    @timed()
+    def _record_edit(table, event):
+        if event.column != "Amount" or state['selected_process'] is None:
+            return
+        row = table.value.iloc[event.row]
+        stored = load_process_details(state['selected_process']).set_index("exchange")["amount"]
+        state['edits'].set_amount(
+            int(row["exchange"]),
+            row["Type"] if "Type" in row else "production",
+            int(row["id"]),
+            state['selected_process'],
+            stored[row["exchange"]],
+            event.value,
+        )
+        _preview_edits()
+
+    @timed()
+    async def _on_save_edits(event):
+        n = len(state['edits'])
+        try:
+            set_current_project(state['current_project'])
+            changes = await state['edits'].commit()
+        except Exception as e:
+            print(f"Saving exchanges error: {e}")
+            pn.state.notifications.error(f"Saving failed: {e}")
+            return
+        if state['lca'] is not None:
+            # The saved amounts become the base of further what-if edits
+            state['lca'] = state['lca'].with_exchange_changes(changes)
+            _show_lca(state['lca'])
+            set_contribution_inputs(*state['lca_inputs'])
+        _show_process_details()
+        _update_edit_controls()
+        # The shown impacts are outdated until the scores are computed again
+        _load_page()
+        _request_scores()
+        pn.state.notifications.success(f"Saved {n} exchange{'s' if n != 1 else ''}.")
+
+    @timed()
+    def _on_discard_edits(event):
+        state['edits'].discard()
+        if state['lca'] is not None:
+            _show_lca(state['lca'])
+        if state['selected_process'] is not None:
+            _show_process_details()
+        _update_edit_controls()
+
+    @timed()
     def _on_fu_click(event):
         try:
             if event.row is None or event.column != "delete":
                 return
-            df = functional_unit.value.reset_index(drop=True)
-            if 0 <= event.row < len(df):
-                df = df.drop(index=event.row).reset_index(drop=True)
-                functional_unit.value = df
+            if 0 <= event.row < len(functional_unit_model):
+                functional_unit_model.delete([functional_unit_model.row_id(event.row)])
         except Exception as e:
             print(f"Functional unit delete error: {e}")
         calculate_button.disabled = functional_unit.value.empty
@@ -265,7 +482,10 @@ You will be able to enter new process data here.
     # Wire up callbacks
     select_project.param.watch(_on_project_select, "value")
     select_db.param.watch(_on_db_select, "value")
+    subscribe(DATABASE_CHANGED, _load_processes)
     processes_tabulator.on_click(_on_process_click)
+    processes_tabulator.param.watch(_on_filter_or_sort, ["filters", "sorters"])
+    processes_pager.param.watch(_load_page, "value")
     functional_unit.on_click(_on_fu_click)
 
     method_select = pmu.NestedSelect(
@@ -274,6 +494,20 @@ You will be able to enter new process data here.
         # layout={"type": pn.GridBox, "ncols": 2},
         disabled=True,
     )
+    method_search = MethodSearch(
+        label="Search methods",
+        placeholder="Type part of a method name...",
+        disabled=True,
+        sizing_mode="stretch_width",
+    )
+
+    @timed()
+    def _on_method_search(event):
+        if event.new:
+            tree = get_method_tree()
+            method_select.value = tree.value(tree.method(event.new))
+
+    method_search.param.watch(_on_method_search, "value")
 
     calculate_button = pmu.widgets.Button(
         name="Calculate & Show Results",
@@ -286,10 +520,121 @@ You will be able to enter new process data here.
         sizing_mode="stretch_width",
     )
 
+    def _selected_methods():
+        """The chosen method first, then the other categories of the same method family"""
+        chosen = tuple(v for v in (method_select.value or {}).values() if v is not None)
+        if chosen not in bd.methods:
+            return []
+        family = [m for m in get_method_tree().methods if m[:2] == chosen[:2] and m != chosen]
+        return [chosen] + sorted(family)
+
+    calculation_progress = pmu.LinearProgress(
+        value=0,
+        variant="determinate",
+        visible=False,
+        sizing_mode="stretch_width",
+    )
+    calculation_status = pmu.pane.Markdown("", visible=False)
+
+    def _reset_calculation():
+        state['calculation'] = None
+        calculate_button.loading = False
+        calculation_progress.visible = calculation_status.visible = False
+
+    @timed()
+    def _cancel_calculation(event=None):
+        # Stale inputs: stop waiting, the job itself stops if no other session needs it
+        if state['calculation'] is not None:
+            state['calculation'].cancel()
+            _reset_calculation()
+
+    @timed()
+    def _on_calculation_progress(fraction, message):
+        calculation_progress.value = round(100 * fraction)
+        calculation_status.object = message
+
+    @timed()
     def _on_calculate_click(event):
-        pn.state.location.hash = "#results/impact-overview"
+        methods = _selected_methods()
+        if not methods:
+            pn.state.notifications.warning("Select a method first.")
+            return
+        _cancel_calculation()
+        project, fu = state['current_project'], functional_unit.value.copy()
+        try:
+            set_current_project(project)
+            key = _calculation_key(project, fu, methods)
+        except Exception as e:
+            print(f"Calculation error: {e}")
+            pn.state.notifications.error(f"Calculation failed: {e}")
+            return
+        totals_shown = []
+
+        def _show_inputs():
+            set_uncertainty_inputs(project, fu, methods)
+            set_contribution_inputs(project, fu, methods)
+            if not totals_shown:
+                pn.state.location.hash = "#results/impact-overview"
+
+        @timed()
+        def _on_totals(future):
+            # Only useful while the calculation is still running
+            if state['calculation'] is not calculation:
+                return
+            try:
+                totals = future.result()
+            except Exception as e:
+                print(f"Score lookup error: {e}")
+                return
+            if totals is None:
+                return
+            show_results(
+                totals,
+                units={method_label(m): method_unit(m) for m in methods},
+                method=method_label(methods[0]),
+            )
+            _show_inputs()
+            totals_shown.append(True)
+
+        @timed()
+        def _on_done(future):
+            _reset_calculation()
+            try:
+                results, lca = future.result()
+            except JobCancelled:
+                return
+            except Exception as e:
+                print(f"Calculation error: {e}")
+                pn.state.notifications.error(f"Calculation failed: {e}")
+                return
+            show_results(
+                results,
+                units={method_label(m): method_unit(m) for m in methods},
+                method=method_label(methods[0]),
+            )
+            state['lca'], state['lca_inputs'] = lca, (project, fu, methods)
+            if state['edits']:
+                _preview_edits()
+            _show_inputs()
+
+        calculate_button.loading = True
+        calculation_progress.value = 0
+        calculation_status.object = "Queued"
+        calculation_progress.visible = calculation_status.visible = True
+        job = submit(key, _run_calculation, project, fu, methods)
+        state['calculation'] = calculation = job.watch(_on_calculation_progress, _on_done)
+        if state['current_db']:
+            # Totals from the precomputed scores, the contributions follow with the calculation
+            totals = submit(("totals", state['current_db'], *key), _score_totals, project, state['current_db'], fu, methods)
+            totals.watch(on_done=_on_totals)
 
     calculate_button.on_click(_on_calculate_click)
+    # A calculation in the previous project would show its results after the switch
+    subscribe(PROJECT_CHANGED, _cancel_calculation)
+    functional_unit.param.watch(_cancel_calculation, "value")
+    method_select.param.watch(_cancel_calculation, "value")
+    # The impacts in the processes table are shown for the chosen method
+    method_select.param.watch(_load_page, "value")
 
     ### Edit Processes
     product_name = pmu.widgets.TextInput(
@@ -313,9 +658,10 @@ You will be able to enter new process data here.
     )
 
     outputs = pn.widgets.Tabulator(
-        pd.DataFrame(columns=["Amount", "Product", "Process", "Location"]),
+        pd.DataFrame(columns=["exchange", "id", "Amount", "Product", "Process", "Location"]),
         sizing_mode="stretch_width",
         layout="fit_data_stretch",
+        hidden_columns=["exchange", "id"],
         # widths={
         #     "Amount": "10%",
         #     "Product": "25%",
@@ -335,9 +681,10 @@ You will be able to enter new process data here.
     )
 
     inputs = pn.widgets.Tabulator(
-        pd.DataFrame(columns=["Amount", "Product", "Process", "Location"]),
+        pd.DataFrame(columns=["exchange", "id", "Amount", "Type", "Product", "Process", "Location"]),
         sizing_mode="stretch_both",
         layout="fit_data_stretch",
+        hidden_columns=["exchange", "id"],
         # widths={
         #     "Amount": "10%",
         #     "Product": "25%",
@@ -347,6 +694,7 @@ You will be able to enter new process data here.
         show_index=False,
         editors={
             "Amount": "number",
+            "Type": None,
             "Product": None,
             "Process": None,
             "Location": None,
@@ -355,23 +703,57 @@ You will be able to enter new process data here.
             ":host .tabulator {border-radius: var(--mui-shape-borderRadius);}"
         ],
     )
+    inputs_model = TableModel(inputs)
+    outputs_model = TableModel(outputs)
+    outputs.on_edit(lambda event: _record_edit(outputs, event))
+    inputs.on_edit(lambda event: _record_edit(inputs, event))
+
+    save_edits_button = pmu.widgets.Button(
+        label="Save Changes",
+        icon="save",
+        variant="contained",
+        color="primary",
+        disabled=True,
+        sizing_mode="stretch_width",
+    )
+    discard_edits_button = pmu.widgets.Button(
+        label="Discard Changes",
+        icon="undo",
+        variant="outlined",
+        color="default",
+        disabled=True,
+        sizing_mode="stretch_width",
+    )
+    edit_status = pmu.pane.Markdown("")
+    save_edits_button.on_click(_on_save_edits)
+    discard_edits_button.on_click(_on_discard_edits)
 
     return {
         'no_db_alert': no_db_alert,
         'select_project': select_project,
         'select_db': select_db,
         'processes_tabulator': processes_tabulator,
+        'processes_pager': processes_pager,
+        'processes_count': processes_count,
         'add_process_button': add_process_button,
         'dialog_new_process': dialog_new_process,
         'functional_unit': functional_unit,
+        'functional_unit_export': functional_unit_export,
+        'catalog_export': catalog_export,
         'method_select': method_select,
+        'method_search': method_search,
         'calculate_button': calculate_button,
+        'calculation_progress': calculation_progress,
+        'calculation_status': calculation_status,
         'product_name': product_name,
         'process_name': process_name,
         'location_name': location_name,
         'description': description,
         'inputs': inputs,
         'outputs': outputs,
+        'save_edits_button': save_edits_button,
+        'discard_edits_button': discard_edits_button,
+        'edit_status': edit_status,
     }
 
 def create_calculation_setup_right_col():
@@ -387,6 +769,12 @@ These are the products selected for assessment. Amounts can be edited directly i
     fu_section = pmu.Column(
         fu_header,
         widgets['functional_unit'],
+        pmu.Row(
+            widgets['functional_unit_export']['format_select'],
+            widgets['functional_unit_export']['download'],
+            widgets['functional_unit_export']['link'],
+            align="center",
+        ),
         sizing_mode="stretch_width",
     )
     
@@ -398,6 +786,7 @@ Select the method to use for the analysis.
 """)
     method_section = pmu.Column(
         method_header,
+        widgets['method_search'],
         widgets['method_select'],
         sizing_mode="stretch_width",
     )
@@ -405,6 +794,8 @@ Select the method to use for the analysis.
         fu_section,
         method_section,
         widgets['calculate_button'],
+        widgets['calculation_progress'],
+        widgets['calculation_status'],
         sizing_mode="stretch_width",
     )
     
@@ -415,6 +806,12 @@ Select the method to use for the analysis.
         widgets['description'],
         widgets['outputs'],
         widgets['inputs'],
+        pmu.Row(
+            widgets['save_edits_button'],
+            widgets['discard_edits_button'],
+            sizing_mode="stretch_width",
+        ),
+        widgets['edit_status'],
         sizing_mode="stretch_width",
     )
 
@@ -440,7 +837,18 @@ def create_calculation_setup_left_col():
             sizing_mode="stretch_width",
         ),
         widgets['processes_tabulator'],
+        pmu.Row(
+            widgets['processes_pager'],
+            widgets['processes_count'],
+            sizing_mode="stretch_width",
+        ),
         widgets['add_process_button'],
+        pmu.Row(
+            widgets['catalog_export']['format_select'],
+            widgets['catalog_export']['download'],
+            widgets['catalog_export']['link'],
+            align="center",
+        ),
         widgets['dialog_new_process'],
         width=500,
         # sizing_mode="stretch_both",
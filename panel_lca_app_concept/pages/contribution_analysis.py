@@ -0,0 +1,201 @@
+import asyncio
+import time
+
+import panel as pn
+import panel_material_ui as pmu
+import pandas as pd
+from panel_lca_app_concept.bw import set_current_project
+from panel_lca_app_concept.calculation import functional_unit_demands, method_label, method_unit, solve_multilca
+from panel_lca_app_concept.charts import plot_supply_chain, update_supply_chain
+from panel_lca_app_concept.events import PROJECT_CHANGED, THEME_CHANGED, subscribe
+from panel_lca_app_concept.metrics import timed
+from panel_lca_app_concept.session import get_session_state
+from panel_lca_app_concept.traversal import TRAVERSAL_CUTOFF, TRAVERSAL_MAX_NODES, SupplyChainTraversal
+
+NODE_COLUMNS = ["id", "parent", "label", "activity", "amount", "cumulative", "direct"]
+
+def _get_state():
+    """State of the contribution analysis page in the current session"""
+    return get_session_state().namespace(
+        "contribution_analysis",
+        project=None,
+        demands={},
+        methods={},
+        lca_key=None,
+        lca=None,
+        nodes=pd.DataFrame(columns=NODE_COLUMNS),
+        run=0,
+        widgets=None,
+    )
+
+def get_contribution_analysis_widgets():
+    """Get or create the contribution analysis widgets of the current session"""
+    state = _get_state()
+    if state['widgets'] is None:
+        state['widgets'] = create_contribution_analysis_widgets()
+    return state['widgets']
+
+def set_contribution_inputs(project: str, functional_unit: pd.DataFrame, methods: list[tuple]):
+    """Offer the products and methods of the last calculation for analysis"""
+    widgets = get_contribution_analysis_widgets()
+    state = _get_state()
+    state['project'] = project
+    state['demands'] = functional_unit_demands(functional_unit)
+    state['methods'] = {method_label(m): m for m in methods}
+    state['lca_key'] = state['lca'] = None
+    widgets['product_choice'].options = list(state['demands'])
+    widgets['product_choice'].value = next(iter(state['demands']), None)
+    widgets['method_choice'].options = list(state['methods'])
+    widgets['method_choice'].value = next(iter(state['methods']), None)
+    widgets['no_results_alert'].visible = not state['demands']
+    widgets['run_button'].disabled = not state['demands']
+
+def clear_contribution_inputs():
+    """Forget the last calculation's products and methods and the analysis of them"""
+    widgets = get_contribution_analysis_widgets()
+    state = _get_state()
+    # A run still going stops at its next batch
+    state['run'] += 1
+    state['project'] = None
+    state['demands'], state['methods'] = {}, {}
+    state['lca_key'] = state['lca'] = None
+    state['nodes'] = pd.DataFrame(columns=NODE_COLUMNS)
+    widgets['product_choice'].param.update(options=[], value=None)
+    widgets['method_choice'].param.update(options=[], value=None)
+    widgets['no_results_alert'].visible = True
+    widgets['run_button'].param.update(loading=False, disabled=True)
+    widgets['status'].object = ""
+    update_supply_chain(widgets['chart_pane'].object, state['nodes'], widgets['chart_kind'].value, "")
+
+async def _prepare_lca(product, method):
+    """Solve the chosen product under the chosen method in a worker thread, reusing the last solution if possible"""
+    state = _get_state()
+    key = (state['project'], product, method)
+    if state['lca_key'] != key:
+        lca = await asyncio.to_thread(
+            solve_multilca, {product: state['demands'][product]}, [method], project=state['project']
+        )
+        state['lca'], state['lca_key'] = lca, key
+    return state['lca']
+
+def create_contribution_analysis_widgets():
+    """Create widgets for contribution analysis page"""
+    state = _get_state()
+
+    no_results_alert = pmu.Alert(
+        title="No results yet. Set up and run a calculation under Modeling first.",
+        severity="info",
+        margin=10,
+        sizing_mode="stretch_width",
+        visible=not state['demands'],
+    )
+    product_choice = pmu.widgets.Select(label="Product", options=[], sizing_mode="stretch_width")
+    method_choice = pmu.widgets.Select(label="Method", options=[], sizing_mode="stretch_width")
+    cutoff = pmu.widgets.FloatSlider(
+        label="Cutoff (share of total)", start=0.001, end=0.1, step=0.001, value=TRAVERSAL_CUTOFF,
+        format="0.0%", sizing_mode="stretch_width",
+    )
+    max_nodes = pmu.widgets.IntInput(
+        label="Node budget", value=TRAVERSAL_MAX_NODES, start=10, end=10000, sizing_mode="stretch_width",
+    )
+    chart_kind = pmu.widgets.RadioButtonGroup(options=["sunburst", "treemap"], value="sunburst")
+    run_button = pmu.widgets.Button(
+        label="Analyze",
+        icon="account_tree",
+        variant="contained",
+        color="primary",
+        disabled=not state['demands'],
+    )
+    status = pmu.pane.Markdown("")
+    chart_pane = pn.pane.Plotly(
+        plot_supply_chain(state['nodes'], chart_kind.value),
+        sizing_mode="stretch_width",
+        height=650,
+        config={"responsive": True},
+    )
+
+    def _unit():
+        return method_unit(state['methods'][method_choice.value]) if method_choice.value in state['methods'] else ""
+
+    @timed()
+    def _redraw(_=None):
+        update_supply_chain(chart_pane.object, state['nodes'], chart_kind.value, _unit())
+
+    @timed()
+    async def _on_run(event):
+        # A newer run makes older ones stop at their next batch
+        state['run'] += 1
+        run = state['run']
+        start = time.perf_counter()
+        run_button.loading = True
+        try:
+            product, method = product_choice.value, state['methods'][method_choice.value]
+            lca = await _prepare_lca(product, method)
+            if state['run'] != run:
+                return
+            traversal = SupplyChainTraversal(lca, product, method, cutoff=cutoff.value, max_nodes=max_nodes.value)
+            nodes = {}
+            # The traversal looks up labels on the event loop, where other sessions may switch projects
+            set_current_project(state['project'])
+            for batch in traversal.run():
+                if state['run'] != run:
+                    return
+                nodes.update((node["id"], node) for node in batch)
+                state['nodes'] = pd.DataFrame(list(nodes.values()), columns=NODE_COLUMNS)
+                _redraw()
+                status.object = f"{len(nodes)} nodes, {traversal.expanded} expanded, {time.perf_counter() - start:.2f} s"
+                # Let the partial chart reach the browser before the walk continues
+                await asyncio.sleep(0)
+                set_current_project(state['project'])
+        except Exception as e:
+            print(f"Contribution analysis error: {e}")
+            pn.state.notifications.error(f"Contribution analysis failed: {e}")
+        finally:
+            if state['run'] == run:
+                run_button.loading = False
+
+    def _on_project_changed(events):
+        # The analysed products belong to the previous project
+        if state['project'] is not None and state['project'] != events[PROJECT_CHANGED]['project']:
+            clear_contribution_inputs()
+
+    run_button.on_click(_on_run)
+    chart_kind.param.watch(_redraw, "value")
+    subscribe(THEME_CHANGED, _redraw)
+    subscribe(PROJECT_CHANGED, _on_project_changed)
+
+    return {
+        'no_results_alert': no_results_alert,
+        'product_choice': product_choice,
+        'method_choice': method_choice,
+        'cutoff': cutoff,
+        'max_nodes': max_nodes,
+        'chart_kind': chart_kind,
+        'run_button': run_button,
+        'status': status,
+        'chart_pane': chart_pane,
+    }
+
+def create_contribution_analysis_view():
+    """Create the contribution analysis page view"""
+    widgets = get_contribution_analysis_widgets()
+
+    header = pmu.pane.Markdown(
+        "Follow the supply chain of a product upstream, largest contributions first."
+    )
+
+    controls = pmu.Row(
+        widgets['product_choice'],
+        widgets['method_choice'],
+        widgets['cutoff'],
+        widgets['max_nodes'],
+        sizing_mode="stretch_width",
+    )
+
+    return pmu.Container(
+        header,
+        widgets['no_results_alert'],
+        controls,
+        pmu.Row(widgets['chart_kind'], widgets['run_button'], widgets['status']),
+        widgets['chart_pane'],
+    )
@@ -1,87 +1,237 @@
 import panel as pn
 import panel_material_ui as pmu
-from panel_lca_app_concept.data import STAGES, PRODUCTS, compute_footprint
-from panel_lca_app_concept.charts import plot_stacked_bars, update_stacked_bars, plot_sankey, update_sankey
+import pandas as pd
+import param
+from panel_lca_app_concept.calculation import N_CONTRIBUTORS, functional_unit_demands
+from panel_lca_app_concept.charts import plot_stacked_bars, update_stacked_bars, plot_sankey, update_sankey, update_uncertainty
+from panel_lca_app_concept.export import EXPORT_CHUNK_ROWS, create_export_controls, frame_chunks
+from panel_lca_app_concept.events import PROJECT_CHANGED, RESULTS_CHANGED, THEME_CHANGED, publish, subscribe
+from panel_lca_app_concept.metrics import timed
+from panel_lca_app_concept.montecarlo import MC_ITERATIONS, MC_UPDATE_EVERY, stream_monte_carlo
+from panel_lca_app_concept.session import get_session_state
 
-# Module-level shared state for results
-_shared_state = {
-    'source_df': None,
-    'colors': None,
-    'widgets': None,
-}
+# palette for bars (use PMU to keep your look), one color per contributor plus "Other"
+_colors = []
+
+def _get_state():
+    """State of the impact overview page in the current session"""
+    return get_session_state().namespace(
+        "impact_overview",
+        results=None,
+        units={},
+        source_df=None,
+        colors=None,
+        calculation=None,
+        uncertainty=None,
+        mc_run=0,
+        widgets=None,
+    )
 
 def initialize_results_data():
     """Initialize results data and charts"""
-    # palette for bars (use PMU to keep your look)
-    _shared_state['colors'] = pmu.theme.generate_palette("#5a4fcf", n_colors=len(STAGES))
-    _shared_state['source_df'] = compute_footprint(PRODUCTS[:5])
+    state = _get_state()
+    if not _colors:
+        _colors.extend(pmu.theme.generate_palette("#5a4fcf", n_colors=N_CONTRIBUTORS + 1))
+    state['colors'] = _colors
+    state['results'] = pd.DataFrame(columns=["product", "method", "stage", "value"])
+    state['source_df'] = pd.DataFrame(columns=["product", "stage", "value"])
 
 def get_impact_overview_widgets():
-    """Get or create impact overview widgets (singleton pattern)"""
-    if _shared_state['widgets'] is not None:
-        return _shared_state['widgets']
-    
-    _shared_state['widgets'] = create_impact_overview_widgets()
-    return _shared_state['widgets']
+    """Get or create the impact overview widgets of the current session"""
+    state = _get_state()
+    if state['widgets'] is None:
+        state['widgets'] = create_impact_overview_widgets()
+    return state['widgets']
+
+def show_results(results: pd.DataFrame, units: dict, method=None):
+    """
+    Show a new calculation result.
+
+    ``results`` is the long table returned by ``calculation.calculate_footprints``,
+    ``units`` maps its method labels to units and ``method`` is shown first.
+    """
+    widgets = get_impact_overview_widgets()
+    state = _get_state()
+    state['results'] = results
+    state['units'] = units
+    # Intervals of the previous results no longer apply, stop a Monte Carlo run still going
+    state['uncertainty'] = None
+    state['mc_run'] += 1
+    widgets['mc_button'].loading = False
+    widgets['mc_status'].object = ""
+    # Selections derived from the previous results are stale now
+    get_session_state().discard(lambda key: key[0] == "impact_overview")
+    methods = list(dict.fromkeys(results["method"]))
+    products = list(dict.fromkeys(results["product"]))
+    # Batch the option/value changes so the charts are redrawn once
+    with param.discard_events(widgets['method_choice']), param.discard_events(widgets['products_mc']):
+        widgets['method_choice'].options = methods
+        widgets['method_choice'].value = method if method in methods else methods[0]
+        widgets['products_mc'].options = products
+        widgets['products_mc'].value = products
+    publish(RESULTS_CHANGED)
+
+def clear_results():
+    """Forget the shown results and the calculation they came from"""
+    widgets = get_impact_overview_widgets()
+    state = _get_state()
+    initialize_results_data()
+    state['units'] = {}
+    state['calculation'] = None
+    state['uncertainty'] = None
+    state['mc_run'] += 1
+    widgets['mc_button'].param.update(loading=False, disabled=True)
+    widgets['mc_status'].object = ""
+    get_session_state().discard(lambda key: key[0] == "impact_overview")
+    with param.discard_events(widgets['method_choice']), param.discard_events(widgets['products_mc']):
+        widgets['method_choice'].param.update(options=[], value=None)
+        widgets['products_mc'].param.update(options=[], value=[])
+    publish(RESULTS_CHANGED)
+
+def set_uncertainty_inputs(project: str, functional_unit: pd.DataFrame, methods: list[tuple]):
+    """Remember the last calculation, so a Monte Carlo run can repeat it with uncertainties"""
+    widgets = get_impact_overview_widgets()
+    _get_state()['calculation'] = (project, functional_unit_demands(functional_unit), list(methods))
+    widgets['mc_button'].disabled = False
+
+def _select_source(method, products) -> pd.DataFrame:
+    """Rows of the current results for one method and the chosen products, kept per session"""
+    def select():
+        results = _get_state()['results']
+        rows = results[(results["method"] == method) & results["product"].isin(products)]
+        return rows[["product", "stage", "value"]]
+
+    return get_session_state().derive(("impact_overview", "source", method, tuple(products)), select)
 
 def create_impact_overview_widgets():
     """Create widgets for impact overview page"""
-    
-    if _shared_state['source_df'] is None:
+    state = _get_state()
+
+    if state['source_df'] is None:
         initialize_results_data()
-    
+
     # Widgets
+    no_results_alert = pmu.Alert(
+        title="No results yet. Set up and run a calculation under Modeling first.",
+        severity="info",
+        margin=10,
+        sizing_mode="stretch_width",
+        visible=state['results'].empty,
+    )
+    method_choice = pmu.widgets.Select(
+        label="Method", options=[], sizing_mode="stretch_width"
+    )
     products_mc = pmu.widgets.MultiChoice(
-        name="Products", options=PRODUCTS, value=PRODUCTS[:5], sizing_mode="stretch_width"
+        name="Products", options=[], value=[], sizing_mode="stretch_width"
     )
     normalize = pmu.widgets.Checkbox(name="Normalize bars (100%)", value=False)
+    mc_iterations = pmu.widgets.IntInput(
+        label="Monte Carlo iterations", value=MC_ITERATIONS, start=MC_UPDATE_EVERY, end=100000, step=MC_UPDATE_EVERY,
+    )
+    mc_early_stop = pmu.widgets.Checkbox(name="Stop when converged", value=True)
+    mc_button = pmu.widgets.Button(
+        label="Run Monte Carlo", icon="casino", variant="outlined", disabled=state['calculation'] is None,
+    )
+    mc_status = pmu.pane.Markdown("")
+
+    def _results_chunks():
+        """The whole result table, with the unit of each method"""
+        results, units = state['results'], dict(state['units'])
+        return (chunk.assign(unit=chunk["method"].map(units)) for chunk in frame_chunks(results, EXPORT_CHUNK_ROWS))
+
+    results_export = create_export_controls(_results_chunks, "lca results", label="Export Results")
+    results_export['download'].disabled = state['results'].empty
+
+    def _unit():
+        return state['units'].get(method_choice.value, "")
 
     # Charts
     plotly_pane = pn.pane.Plotly(
-        plot_stacked_bars(_shared_state['source_df'], normalize.value, _shared_state['colors']),
+        plot_stacked_bars(state['source_df'], normalize.value, state['colors'], _unit()),
         sizing_mode="stretch_width",
         config={"responsive": True},
     )
 
     sankey_pane = pn.pane.Plotly(
-        plot_sankey(_shared_state['source_df']), sizing_mode="stretch_width", config={"responsive": True}
+        plot_sankey(state['source_df']), sizing_mode="stretch_width", config={"responsive": True}
     )
 
     # Callbacks
+    def _update_uncertainty():
+        summary = state['uncertainty']
+        if summary is not None:
+            summary = summary[(summary["method"] == method_choice.value) & summary["product"].isin(products_mc.value)]
+        update_uncertainty(plotly_pane.object, summary, normalize.value)
+
+    @timed()
     def _recalc(_=None):
-        _shared_state['source_df'] = compute_footprint(products_mc.value)
-        update_stacked_bars(plotly_pane.object, _shared_state['source_df'], normalize.value, _shared_state['colors'])
-        update_sankey(sankey_pane.object, _shared_state['source_df'])
+        no_results_alert.visible = results_export['download'].disabled = state['results'].empty
+        state['source_df'] = _select_source(method_choice.value, products_mc.value)
+        update_stacked_bars(plotly_pane.object, state['source_df'], normalize.value, state['colors'], _unit())
+        _update_uncertainty()
+        update_sankey(sankey_pane.object, state['source_df'])
 
+    @timed()
     def _toggle_normalize(_):
-        update_stacked_bars(plotly_pane.object, _shared_state['source_df'], normalize.value, _shared_state['colors'])
+        update_stacked_bars(plotly_pane.object, state['source_df'], normalize.value, state['colors'], _unit())
+        _update_uncertainty()
+
+    @timed()
+    async def _on_monte_carlo(event):
+        # A newer run (or new results) makes older ones stop at their next summary
+        state['mc_run'] += 1
+        run = state['mc_run']
+        mc_button.loading = True
+        try:
+            project, demands, methods = state['calculation']
+            async for summary in stream_monte_carlo(
+                project, demands, methods, iterations=mc_iterations.value, early_stop=mc_early_stop.value
+            ):
+                if state['mc_run'] != run:
+                    return
+                state['uncertainty'] = summary
+                _update_uncertainty()
+                n = int(summary["iterations"].iloc[0])
+                mc_status.object = f"{n} iterations" + (", converged" if summary["converged"].iloc[0] else "")
+        except Exception as e:
+            print(f"Monte Carlo error: {e}")
+            pn.state.notifications.error(f"Monte Carlo failed: {e}")
+        finally:
+            if state['mc_run'] == run:
+                mc_button.loading = False
+
+    @timed()
+    def _on_events(events):
+        if RESULTS_CHANGED in events:
+            _recalc()
+        else:
+            # re-apply backgrounds and line colors after theme flips
+            update_stacked_bars(plotly_pane.object, state['source_df'], normalize.value, state['colors'], _unit())
 
-    def _on_theme_change(_):
-        # re-apply backgrounds and line colors after theme flips
-        update_stacked_bars(plotly_pane.object, _shared_state['source_df'], normalize.value, _shared_state['colors'])
+    def _on_project_changed(events):
+        # Results of the previous project don't belong next to this one's processes
+        calculation = state['calculation']
+        if calculation is not None and calculation[0] != events[PROJECT_CHANGED]['project']:
+            clear_results()
 
     # Wire up callbacks
     normalize.param.watch(_toggle_normalize, "value")
+    mc_button.on_click(_on_monte_carlo)
     products_mc.param.watch(_recalc, "value")
-
-    # Theme polling (if needed globally)
-    _prev_theme = [str(getattr(pn.config, "theme", "dark"))]
-
-    def _poll_theme():
-        cur = str(getattr(pn.config, "theme", "dark"))
-        if cur != _prev_theme[0]:
-            _prev_theme[0] = cur
-            _on_theme_change(None)
-
-    # Add periodic callback if not already added globally
-    try:
-        pn.state.add_periodic_callback(_poll_theme, period=200, start=False)
-    except:
-        pass  # Already added or no event loop
+    method_choice.param.watch(_recalc, "value")
+    subscribe([RESULTS_CHANGED, THEME_CHANGED], _on_events)
+    subscribe(PROJECT_CHANGED, _on_project_changed)
 
     return {
+        'no_results_alert': no_results_alert,
+        'method_choice': method_choice,
         'products_mc': products_mc,
         'normalize': normalize,
+        'mc_iterations': mc_iterations,
+        'mc_early_stop': mc_early_stop,
+        'mc_button': mc_button,
+        'mc_status': mc_status,
+        'results_export': results_export,
         'plotly_pane': plotly_pane,
         'sankey_pane': sankey_pane,
     }
@@ -94,18 +244,44 @@ def create_impact_overview_view():
         "Explore PMI-LCA results through interactive visualizations."
     )
 
+    uncertainty_controls = pmu.Row(
+        widgets['mc_iterations'],
+        widgets['mc_early_stop'],
+        widgets['mc_button'],
+        widgets['mc_status'],
+    )
+
     results_tabs = pmu.Tabs(
-        ("Stacked Bars", widgets['plotly_pane']),
+        ("Stacked Bars", pmu.Column(uncertainty_controls, widgets['plotly_pane'], sizing_mode="stretch_width")),
         ("Sankey", widgets['sankey_pane']),
     )
 
-    return pmu.Container(header, results_tabs)
+    contribution_button = pmu.widgets.Button(
+        label="Contribution Analysis",
+        icon="account_tree",
+        variant="text",
+    )
+    contribution_button.js_on_click(code="window.location.hash = '#results/contribution-analysis'")
+
+    controls = pmu.Row(
+        widgets['method_choice'],
+        widgets['products_mc'],
+        widgets['normalize'],
+        contribution_button,
+        widgets['results_export']['format_select'],
+        widgets['results_export']['download'],
+        widgets['results_export']['link'],
+        sizing_mode="stretch_width",
+    )
+
+    return pmu.Container(header, widgets['no_results_alert'], controls, results_tabs)
 
 def create_impact_overview_sidebar():
     """Create the impact overview page sidebar"""
     widgets = get_impact_overview_widgets()
-    
+
     return pmu.Column(
+        widgets['method_choice'],
         widgets['products_mc'],
         widgets['normalize'],
         sizing_mode="stretch_width",
@@ -0,0 +1,146 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from panel_lca_app_concept.helpers import OTHER_LABEL
+
+# Nodes whose throughput is below this share of the largest node are folded into "Other"
+SANKEY_CUTOFF = 0.005
+# Hard cap on the number of links, more nodes are folded until it holds
+SANKEY_MAX_LINKS = 300
+ROOT_LABEL = "Total footprint"
+
+_PALETTE = [
+    (99, 110, 250), (239, 85, 59), (0, 204, 150), (171, 99, 250), (255, 161, 90),
+    (25, 211, 243), (255, 102, 146), (182, 232, 128), (255, 151, 255), (254, 203, 82),
+]
+_OTHER_COLOR = (160, 160, 170)
+
+
+def _collapse(src, tgt, val, mapping, n_total):
+    """Relabel link ends through ``mapping`` and sum links that end up parallel."""
+    s, t = mapping[src], mapping[tgt]
+    keep = s != t
+    key = s[keep].astype(np.int64) * n_total + t[keep]
+    unique, inverse = np.unique(key, return_inverse=True)
+    return unique // n_total, unique % n_total, np.bincount(inverse, weights=val[keep], minlength=len(unique))
+
+
+def fold_small_flows(src, tgt, val, labels, other_of, cutoff=SANKEY_CUTOFF, max_links=SANKEY_MAX_LINKS):
+    """
+    Merge minor nodes into "Other" nodes until the flow graph is small enough.
+
+    ``labels`` names the ``n`` nodes the links refer to. ``other_of[i]`` is the
+    node node ``i`` is folded into; ids ``>= n`` create extra "Other" nodes,
+    ``-1`` means it is never folded. A node is folded when its throughput is
+    below ``cutoff`` times the largest throughput, and the threshold is raised
+    further (by bisection over the node throughputs) until there are at most
+    ``max_links`` links. Returns ``labels, src, tgt, val`` of the folded
+    graph, with unused nodes dropped.
+    """
+    src, tgt = np.asarray(src, dtype=np.int64), np.asarray(tgt, dtype=np.int64)
+    val, other_of = np.asarray(val, dtype=float), np.asarray(other_of, dtype=np.int64)
+    n = len(labels)
+    n_total = max(n, int(other_of.max(initial=-1)) + 1)
+    throughput = np.maximum(
+        np.bincount(src, weights=np.abs(val), minlength=n_total),
+        np.bincount(tgt, weights=np.abs(val), minlength=n_total),
+    )[:n]
+    foldable = other_of >= 0
+
+    def collapse(threshold):
+        mapping = np.arange(n_total)
+        fold = foldable & (throughput < threshold)
+        mapping[:n][fold] = other_of[fold]
+        return _collapse(src, tgt, val, mapping, n_total)
+
+    threshold = cutoff * throughput.max(initial=0)
+    links = collapse(threshold)
+    if len(links[0]) > max_links:
+        candidates = np.unique(throughput[foldable & (throughput >= threshold)])
+        lo, hi = 0, len(candidates)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(collapse(np.nextafter(candidates[mid], np.inf))[0]) <= max_links:
+                hi = mid
+            else:
+                lo = mid + 1
+        threshold = np.nextafter(candidates[min(lo, len(candidates) - 1)], np.inf) if len(candidates) else threshold
+        links = collapse(threshold)
+
+    s, t, v = links
+    used, compact = np.unique(np.concatenate([s, t]), return_inverse=True)
+    all_labels = np.asarray(list(labels) + [OTHER_LABEL] * (n_total - n), dtype=object)
+    return list(all_labels[used]), compact[:len(s)], compact[len(s):], v
+
+
+def flows_from_table(df: pd.DataFrame, levels, value="value", root=ROOT_LABEL,
+                     cutoff=SANKEY_CUTOFF, max_links=SANKEY_MAX_LINKS):
+    """
+    Build Sankey links from a table with one row per path through the tiers.
+
+    ``levels`` are the columns of ``df`` from the first tier to the last, e.g.
+    ``["product", "stage"]`` or ``["product", "supplier", "process"]``; each
+    row sends its ``value`` from ``root`` through one node per level. Every
+    level gets its own "Other" node for folded nodes, rows already labelled
+    "Other" go there as well. Returns ``labels, src, tgt, val``.
+    """
+    values = df[value].to_numpy(dtype=float)
+    labels = [root]
+    other_ids = []
+    codes = [np.zeros(len(df), dtype=np.int64)]
+    n_levels = len(levels)
+    for i, level in enumerate(levels):
+        level_codes, uniques = pd.factorize(df[level])
+        codes.append(level_codes + len(labels))
+        labels.extend(uniques)
+        other_ids.append(len(uniques))
+    n = len(labels)
+    # Other nodes get ids after all named nodes, one per level
+    other_of = np.full(n, -1, dtype=np.int64)
+    start = 1
+    for i, size in enumerate(other_ids):
+        other_of[start:start + size] = n + i
+        start += size
+    label_array = np.asarray(labels, dtype=object)
+    for i in range(n_levels):
+        # Rows that already are "Other" (e.g. the remainder of a contribution analysis)
+        codes[i + 1] = np.where(label_array[codes[i + 1]] == OTHER_LABEL, n + i, codes[i + 1])
+
+    src = np.concatenate(codes[:-1])
+    tgt = np.concatenate(codes[1:])
+    val = np.tile(values, n_levels)
+    return fold_small_flows(src, tgt, val, labels, other_of, cutoff, max_links)
+
+
+def flows_from_matrix(matrix, labels, cutoff=SANKEY_CUTOFF, max_links=SANKEY_MAX_LINKS):
+    """
+    Build Sankey links from a sparse flow matrix, ``matrix[i, j]`` flowing from node ``i`` to ``j``.
+
+    All folded nodes share a single "Other" node. Returns ``labels, src, tgt, val``.
+    """
+    from scipy import sparse
+
+    coo = sparse.coo_matrix(matrix)
+    keep = coo.data != 0
+    other_of = np.full(len(labels), len(labels), dtype=np.int64)
+    return fold_small_flows(coo.row[keep], coo.col[keep], coo.data[keep], labels, other_of, cutoff, max_links)
+
+
+def node_colors(labels, alpha=1.0) -> list[str]:
+    """Colors that depend only on the node label, so nodes keep their color between updates."""
+    colors = []
+    for label in labels:
+        if label == OTHER_LABEL:
+            r, g, b = _OTHER_COLOR
+        else:
+            r, g, b = _PALETTE[zlib.crc32(str(label).encode()) % len(_PALETTE)]
+        colors.append(f"rgba({r},{g},{b},{alpha})")
+    return colors
+
+
+def link_colors(node_cols, src, alpha=0.5) -> list[str]:
+    """Link colors, the source node's color made translucent."""
+    faded = [c.rsplit(",", 1)[0] + f",{alpha})" for c in node_cols]
+    return [faded[s] for s in src]
@@ -0,0 +1,216 @@
+"""
+Cradle-to-gate scores of every product under every installed method.
+
+``compute_scores`` factorizes the technosphere matrix of a database and its
+supply chains once and solves ``A^T S = B^T C`` for all methods at once, in
+blocks of right-hand sides. The products x methods array ``S`` is stored
+with its id index in the project's matrix cache, so all server processes
+read one memory-mapped copy and a lookup is an array read. Scores are only
+recomputed when a database is modified or methods are registered or
+deleted.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+import bw2data as bd
+import numpy as np
+import pandas as pd
+from bw2data.backends import ActivityDataset as AD
+
+from panel_lca_app_concept.bw import data_version, project_data, set_current_project
+from panel_lca_app_concept.calculation import FactorizedMultiLCA, _no_progress, functional_unit_demands, method_label
+from panel_lca_app_concept.jobs import submit
+from panel_lca_app_concept.matrix_cache import datapackage_key, get_matrix_cache
+from panel_lca_app_concept.metrics import timed
+from panel_lca_app_concept.workers import on_change
+
+# Compute the scores of a database in the background when it is opened, "0" turns this off
+PRECOMPUTE_SCORES = os.environ.get("PANEL_LCA_PRECOMPUTE_SCORES", "1") != "0"
+# Methods solved together, as columns of one right-hand side
+SCORE_BLOCK_METHODS = 32
+# Stage of results read from the scores, which have no contribution breakdown
+TOTAL_LABEL = "Total"
+# Tags score entries in the matrix cache, so they only supersede other score entries
+_CACHE_TAG = "scores"
+
+# Score tables shared by all sessions: (project, db) -> (version, cache key, ScoreTable or None)
+_tables = {}
+
+
+class ScoreTable:
+    """Scores per unit of each product (rows, by id) under each method (columns)."""
+
+    def __init__(self, arrays: dict):
+        self.scores = arrays["scores"]
+        self.index = pd.Index(np.asarray(arrays["ids"]))
+        self.methods = {tuple(json.loads(m)): col for col, m in enumerate(arrays["methods"])}
+
+    def __contains__(self, method) -> bool:
+        return tuple(method) in self.methods
+
+    def lookup(self, ids, method: tuple) -> np.ndarray:
+        """Scores of the product ``ids`` under ``method``, NaN where a product or the method is unknown."""
+        rows = self.index.get_indexer(np.asarray(ids, dtype=np.int64))
+        values = np.full(len(rows), np.nan)
+        col = self.methods.get(tuple(method))
+        if col is not None:
+            found = rows >= 0
+            values[found] = self.scores[rows[found], col]
+        return values
+
+
+def scores_key(database: str, version=None) -> str:
+    """
+    Matrix cache key of the scores of ``database`` with the current data and methods.
+
+    Built from ``bw.data_version``, i.e. the timestamps in the project's
+    metadata, so no datapackage is read. The timestamps are stored in the
+    project, so all processes get the same key.
+    """
+    digest = hashlib.sha256(repr((database, version or data_version())).encode())
+    return f"{_CACHE_TAG}-{digest.hexdigest()[:32]}"
+
+
+def _cached_key(database: str) -> str:
+    version = data_version()
+    cached = _tables.get((bd.projects.current, database))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    key = scores_key(database, version)
+    _tables[(bd.projects.current, database)] = (version, key, None)
+    return key
+
+
+def get_scores(database: str) -> ScoreTable | None:
+    """The scores of ``database`` in the current project, or ``None`` if they are not computed for its current version."""
+    key = _cached_key(database)
+    version, _, table = _tables[(bd.projects.current, database)]
+    if table is None:
+        # Another process may have computed them in the meantime
+        cache = get_matrix_cache()
+        arrays = cache.get(key) if cache is not None else None
+        if arrays is None:
+            return None
+        table = ScoreTable(arrays)
+        _tables[(bd.projects.current, database)] = (version, key, table)
+    return table
+
+
+@timed()
+def compute_scores(database: str, progress=_no_progress, project: str | None = None) -> ScoreTable | None:
+    """
+    Compute the score of one unit of every product under every installed method.
+
+    Covers the products of ``database`` and of the databases it links to.
+    The technosphere matrix is factorized once (or read from the matrix
+    cache); each method block is one transposed solve with the direct
+    impacts of all activities as right-hand sides. Data is read from
+    ``project``, or the current project if ``None``. Returns ``None`` for
+    databases without processes, e.g. biosphere databases.
+    """
+    with project_data(project):
+        project = bd.projects.current
+        methods = sorted(bd.methods)
+        first = (
+            AD.select(AD.id)
+            .where((AD.database == database) & AD.type.in_(bd.labels.lci_node_types))
+            .tuples()
+            .first()
+        )
+        if first is None or not methods:
+            return None
+
+        progress(0.05, "Collecting data")
+        version = data_version()
+        key = scores_key(database, version)
+        dependents = bd.Database(database).find_graph_dependents()
+        # Any demand will do, the scores are solved for all products
+        demands = {"scores": {first[0]: 1.0}}
+        method_config = {"impact_categories": methods}
+        mlca = FactorizedMultiLCA(
+            demands=demands,
+            method_config=method_config,
+            data_objs=bd.get_multilca_data_objs(demands, method_config),
+            cache_key=datapackage_key(dependents),
+            databases=dependents,
+        )
+    mlca.load_lci_data()
+    mlca.load_lcia_data()
+
+    progress(0.2, "Solving")
+    biosphere = mlca.biosphere_matrix.T.tocsr()
+    scores = np.empty((mlca.technosphere_matrix.shape[0], len(methods)))
+    for start in range(0, len(methods), SCORE_BLOCK_METHODS):
+        block = methods[start:start + SCORE_BLOCK_METHODS]
+        factors = np.column_stack([mlca.characterization_matrices[m].diagonal() for m in block])
+        # Direct impacts per unit of each activity, one column per method
+        direct = biosphere @ factors
+        scores[:, start:start + len(block)] = np.asarray(mlca.solve_transposed(direct)).reshape(len(direct), -1)
+        done = start + len(block)
+        progress(0.2 + 0.75 * done / len(methods), f"Solved {done} of {len(methods)} methods")
+
+    rows = mlca.dicts.product.reversed
+    arrays = {
+        "scores": scores,
+        "ids": np.array([rows[i] for i in range(len(rows))], dtype=np.int64),
+        "methods": np.array([json.dumps(list(m)) for m in methods]),
+    }
+    cache = mlca.matrix_cache
+    if cache is not None:
+        cache.put(key, arrays, [_CACHE_TAG, *dependents])
+        arrays = cache.get(key) or arrays
+    table = ScoreTable(arrays)
+    _tables[(project, database)] = (version, key, table)
+    progress(1.0, "Done")
+    return table
+
+
+def _compute_job(project: str, database: str, progress):
+    """Score job, runs on the shared executor"""
+    return compute_scores(database, progress, project)
+
+
+def request_scores(project: str, database: str):
+    """
+    Start computing the scores of ``database`` unless they are current.
+
+    Returns the ``jobs.Job`` to watch, shared with other sessions asking for
+    the same scores, or ``None`` if there is nothing to compute.
+    """
+    if not PRECOMPUTE_SCORES:
+        return None
+    set_current_project(project)
+    if get_scores(database) is not None:
+        return None
+    return submit((_CACHE_TAG, project, _cached_key(database)), _compute_job, project, database)
+
+
+def score_results(database: str, functional_unit: pd.DataFrame, methods: list[tuple]) -> pd.DataFrame | None:
+    """
+    Results as from ``calculate_footprints`` read from the precomputed scores.
+
+    Each score is a single ``TOTAL_LABEL`` stage. Returns ``None`` unless
+    the scores are current and cover every functional unit row and method.
+    """
+    table = get_scores(database)
+    if table is None or functional_unit.empty or not all(m in table for m in methods):
+        return None
+    rows = []
+    for label, demand in functional_unit_demands(functional_unit).items():
+        ids, amounts = list(demand), np.array(list(demand.values()))
+        for method in methods:
+            values = table.lookup(ids, method)
+            if np.isnan(values).any():
+                return None
+            rows.append((label, method_label(method), TOTAL_LABEL, float(amounts @ values)))
+    return pd.DataFrame(rows, columns=["product", "method", "stage", "value"])
+
+
+def _drop_tables(project: str) -> None:
+    for key in [k for k in _tables if k[0] == project]:
+        del _tables[key]
+
+on_change(_drop_tables)
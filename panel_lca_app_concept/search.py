@@ -0,0 +1,134 @@
+from collections import defaultdict
+
+SEARCH_FIELDS = ("name", "product", "location")
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _FieldIndex:
+    """
+    Trigram postings over the distinct lower-cased values of one field.
+
+    Rows sharing a value (e.g. all activities located in "DE") share one
+    entry, so short queries only scan the distinct values, not every row.
+    """
+
+    def __init__(self):
+        self.value_ids = {}
+        self.values = []
+        self.rows = []
+        self.postings = defaultdict(set)
+        # Last query and its matches; typing usually extends the previous term
+        self._last = ("", None)
+
+    def add(self, value, row: int) -> int:
+        value = value.lower() if isinstance(value, str) else ""
+        vid = self.value_ids.get(value)
+        if vid is None:
+            vid = len(self.values)
+            self.value_ids[value] = vid
+            self.values.append(value)
+            self.rows.append([])
+            for gram in _trigrams(value):
+                self.postings[gram].add(vid)
+            self._last = ("", None)
+        self.rows[vid].append(row)
+        return vid
+
+    def match(self, term: str) -> set[int]:
+        """Return the ids of all distinct values containing ``term``."""
+        last_term, last_matches = self._last
+        if last_matches is not None and last_term and last_term in term:
+            if last_term == term:
+                return last_matches
+            matches = {vid for vid in last_matches if term in self.values[vid]}
+        else:
+            grams = _trigrams(term)
+            if not grams:
+                matches = {vid for vid, value in enumerate(self.values) if term in value}
+            else:
+                candidate_sets = sorted((self.postings.get(g, set()) for g in grams), key=len)
+                matches = set.intersection(*candidate_sets)
+                if len(term) > 3:
+                    matches = {vid for vid in matches if term in self.values[vid]}
+        self._last = (term, matches)
+        return matches
+
+
+class SearchIndex:
+    """
+    In-memory substring index over name, reference product and location.
+
+    Built once per database and extended with ``add`` when nodes are created.
+    ``search`` answers combined case-insensitive substring queries by
+    intersecting trigram postings, starting from the most selective field, and
+    stops as soon as ``limit`` rows are found.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self._fields = {field: _FieldIndex() for field in SEARCH_FIELDS}
+        self._row_values = {field: [] for field in SEARCH_FIELDS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_records(cls, records) -> "SearchIndex":
+        """Build an index from ``(id, name, product, location)`` tuples."""
+        index = cls()
+        for id_, name, product, location in records:
+            index.add(id_, name, product, location)
+        return index
+
+    def add(self, id_: int, name=None, product=None, location=None) -> None:
+        """Add a single node to the index."""
+        row = len(self.ids)
+        self.ids.append(id_)
+        for field, value in zip(SEARCH_FIELDS, (name, product, location)):
+            self._row_values[field].append(self._fields[field].add(value, row))
+
+    def search(self, name="", product="", location="", limit=100) -> list[int]:
+        """
+        Return ids of nodes whose fields contain all given terms.
+
+        Empty terms match everything. Results are in insertion order and
+        capped at ``limit`` (``None`` for no cap).
+        """
+        terms = {
+            field: term.lower()
+            for field, term in zip(SEARCH_FIELDS, (name, product, location))
+            if term
+        }
+        if not terms:
+            rows = range(len(self.ids))
+            return [self.ids[row] for row in rows[:limit]]
+
+        matches = {field: self._fields[field].match(term) for field, term in terms.items()}
+        # Drive the scan from the field that matches the fewest rows
+        sizes = {
+            field: sum(len(self._fields[field].rows[vid]) for vid in vids)
+            for field, vids in matches.items()
+        }
+        driver = min(sizes, key=sizes.get)
+        others = [(self._row_values[f], matches[f]) for f in matches if f != driver]
+
+        if sizes[driver] * 8 > len(self.ids):
+            # Broad match: walking rows in order finds ``limit`` hits quickly
+            driver_values, driver_vids = self._row_values[driver], matches[driver]
+            driver_rows = (
+                row for row in range(len(self.ids)) if driver_values[row] in driver_vids
+            )
+        else:
+            driver_rows = sorted(
+                row for vid in matches[driver] for row in self._fields[driver].rows[vid]
+            )
+        result = []
+        for row in driver_rows:
+            if all(row_values[row] in vids for row_values, vids in others):
+                result.append(self.ids[row])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
@@ -0,0 +1,100 @@
+import os
+import sys
+from collections import OrderedDict
+
+import pandas as pd
+import panel as pn
+
+# Memory of derived data a single browser session may hold before the least recently used is dropped
+SESSION_MEMORY_BUDGET = int(os.environ.get("PANEL_LCA_SESSION_MEMORY_BYTES", 256 * 1024**2))
+
+# Session id -> SessionState, ``None`` outside a server (scripts, notebooks)
+_sessions = {}
+
+
+def estimate_size(obj) -> int:
+    """Rough size of ``obj`` in bytes, deep for DataFrames."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True, index=True))
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(obj)
+
+
+class SessionState:
+    """
+    State of one browser session.
+
+    Pages keep their widgets and selections in a ``namespace``; values stored
+    there are plain references, so large immutable objects such as the cached
+    process catalogs are shared with every other session rather than copied.
+    Data that can be recomputed from them goes through ``derive``, which
+    keeps it in an LRU whose total ``estimate_size`` stays within
+    ``memory_budget``.
+    """
+
+    def __init__(self, memory_budget: int = SESSION_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self._namespaces = {}
+        self._derived = OrderedDict()
+        self._derived_size = 0
+
+    def namespace(self, name: str, **defaults) -> dict:
+        """Get the state dict of a page, created with ``defaults`` on first use."""
+        if name not in self._namespaces:
+            self._namespaces[name] = dict(defaults)
+        return self._namespaces[name]
+
+    def derive(self, key, compute):
+        """Return the derived value stored under ``key``, calling ``compute()`` if it is missing."""
+        if key in self._derived:
+            self._derived.move_to_end(key)
+            return self._derived[key][0]
+        value = compute()
+        size = estimate_size(value)
+        self._derived[key] = (value, size)
+        self._derived_size += size
+        # The newest value is kept even if it exceeds the budget on its own
+        while self._derived_size > self.memory_budget and len(self._derived) > 1:
+            _, (_, dropped) = self._derived.popitem(last=False)
+            self._derived_size -= dropped
+        return value
+
+    def discard(self, match=None) -> None:
+        """Drop derived values whose key satisfies ``match(key)``, or all of them."""
+        for key in [k for k in self._derived if match is None or match(k)]:
+            _, size = self._derived.pop(key)
+            self._derived_size -= size
+
+    @property
+    def derived_size(self) -> int:
+        return self._derived_size
+
+    def clear(self) -> None:
+        self._namespaces.clear()
+        self.discard()
+
+
+def _session_id():
+    doc = pn.state.curdoc
+    context = getattr(doc, "session_context", None) if doc is not None else None
+    return getattr(context, "id", None)
+
+
+def _release_session(session_context) -> None:
+    state = _sessions.pop(session_context.id, None)
+    if state is not None:
+        state.clear()
+
+
+def get_session_state() -> SessionState:
+    """Get the state of the current session, creating it on first use."""
+    session_id = _session_id()
+    if session_id not in _sessions:
+        _sessions[session_id] = SessionState()
+        if session_id is not None:
+            pn.state.on_session_destroyed(_release_session)
+    return _sessions[session_id]
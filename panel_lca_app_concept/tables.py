@@ -0,0 +1,50 @@
+import pandas as pd
+
+
+class TableModel:
+    """
+    Row-level edits of a Tabulator without resending the whole table.
+
+    The index of the table's DataFrame is a row id: appended rows get the
+    next id and deletes keep the ids of the remaining rows, so nothing is
+    ever renumbered with ``reset_index``. Appends go out as one ``stream``
+    message with only the new rows and cell edits as one ``patch`` message
+    with only the changed cells. Bokeh has no message to remove rows, so a
+    delete sends the remaining rows once.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @property
+    def value(self) -> pd.DataFrame:
+        return self.table.value
+
+    def __len__(self):
+        return len(self.table.value)
+
+    def row_id(self, row: int):
+        """Id of the row at position ``row``, e.g. ``event.row`` of a click."""
+        return self.table.value.index[row]
+
+    def replace(self, df: pd.DataFrame) -> None:
+        """Show new content, with fresh row ids."""
+        self.table.value = df.reset_index(drop=True)
+
+    def append(self, rows: pd.DataFrame) -> list:
+        """Append ``rows`` and return their ids."""
+        if rows.empty:
+            return []
+        # ``stream`` numbers the new rows after the largest id
+        self.table.stream(rows[list(self.table.value.columns)], follow=False)
+        return list(self.table.value.index[-len(rows):])
+
+    def delete(self, row_ids) -> None:
+        """Remove rows by id."""
+        row_ids = [i for i in row_ids if i in self.table.value.index]
+        if row_ids:
+            self.table.value = self.table.value.drop(index=row_ids)
+
+    def update(self, row_id, **values) -> None:
+        """Set cells of one row by id, e.g. ``update(3, Amount=2.0)``."""
+        self.table.patch({column: [(row_id, value)] for column, value in values.items()}, as_index=True)
@@ -0,0 +1,134 @@
+import heapq
+import time
+
+import numpy as np
+
+from panel_lca_app_concept.calculation import activity_labels
+
+# Inputs whose cumulative score is below this share of the total are not listed
+TRAVERSAL_CUTOFF = 0.01
+# Maximum number of nodes whose inputs are expanded
+TRAVERSAL_MAX_NODES = 400
+# Seconds between streamed batches of nodes
+TRAVERSAL_BATCH_SECONDS = 0.05
+
+
+class SupplyChainTraversal:
+    """
+    Best-first walk through the supply chain of one solved demand.
+
+    The cumulative score per unit of every product comes from a single
+    transposed solve with the LCA's factorization. Expanding a node then only
+    reads one technosphere column: each input's cumulative score is its
+    amount times that unit score. Inputs go on a priority queue and the one
+    with the largest absolute cumulative score is expanded next, so the
+    most relevant part of the graph is explored first. Inputs below
+    ``cutoff`` times the total score are not listed and the walk stops after
+    ``max_nodes`` expansions; cycles end there or below the cutoff.
+
+    Nodes are dicts with ``id``, ``parent`` (``None`` for the root), ``label``,
+    ``activity`` (database id), ``amount``, ``cumulative`` and ``direct``
+    (``None`` while not expanded).
+    """
+
+    def __init__(self, lca, demand_label: str, method: tuple,
+                 cutoff: float = TRAVERSAL_CUTOFF, max_nodes: int = TRAVERSAL_MAX_NODES):
+        self.cutoff = cutoff
+        self.max_nodes = max_nodes
+        self.technosphere = lca.technosphere_matrix.tocsc()
+        characterized = lca.characterization_matrices[method] @ lca.biosphere_matrix
+        # Direct score per unit of each activity, cumulative score per unit of each product
+        self.direct = np.asarray(characterized.sum(axis=0)).ravel()
+        self.unit_scores = lca.solve_transposed(self.direct)
+        self.demand = np.asarray(lca.demand_arrays[demand_label]).ravel()
+        self.total = float(self.demand @ self.unit_scores)
+
+        product_ids = np.asarray(lca.technosphere_mm.row_mapper.array)
+        activity_ids = np.asarray(lca.technosphere_mm.col_mapper.array)
+        # Column of the activity producing each product row, -1 if there is none
+        cols = np.clip(np.searchsorted(activity_ids, product_ids), 0, len(activity_ids) - 1)
+        self.producer = np.where(activity_ids[cols] == product_ids, cols, -1)
+        self.activity_ids = activity_ids
+        self.root_label = demand_label
+        self.expanded = 0
+
+    def _children(self, row, amount):
+        """Inputs of the activity producing ``amount`` of product ``row``, above the cutoff."""
+        col = self.producer[row]
+        if col < 0:
+            return None, np.empty(0, dtype=np.int64), np.empty(0)
+        start, end = self.technosphere.indptr[col], self.technosphere.indptr[col + 1]
+        rows = self.technosphere.indices[start:end]
+        values = self.technosphere.data[start:end]
+        is_output = rows == row
+        production = values[is_output].sum()
+        if production == 0:
+            return None, np.empty(0, dtype=np.int64), np.empty(0)
+        level = amount / production
+        direct = level * self.direct[col]
+        rows, amounts = rows[~is_output], -values[~is_output] * level
+        cumulative = amounts * self.unit_scores[rows]
+        keep = np.abs(cumulative) >= self.cutoff * abs(self.total)
+        return direct, rows[keep], amounts[keep]
+
+    def run(self, batch_seconds: float = TRAVERSAL_BATCH_SECONDS):
+        """
+        Walk the supply chain, yielding lists of new or updated nodes.
+
+        A batch is yielded whenever ``batch_seconds`` have passed, so a view
+        can draw the partial tree while the walk continues.
+        """
+        root = {"id": 0, "parent": None, "label": self.root_label, "activity": None,
+                "amount": 1.0, "cumulative": self.total, "direct": 0.0}
+        batch = [root]
+        queue = []
+        next_id = 1
+        threshold = self.cutoff * abs(self.total)
+        for row in np.flatnonzero(self.demand):
+            cumulative = self.demand[row] * self.unit_scores[row]
+            if abs(cumulative) >= threshold:
+                node = self._node(next_id, 0, row, self.demand[row])
+                heapq.heappush(queue, (-abs(cumulative), next_id, row, node))
+                batch.append(node)
+                next_id += 1
+
+        last_yield = time.perf_counter()
+        while queue and self.expanded < self.max_nodes:
+            _, node_id, row, node = heapq.heappop(queue)
+            direct, rows, amounts = self._children(row, node["amount"])
+            self.expanded += 1
+            node["direct"] = direct
+            batch.append(node)
+            for child_row, child_amount in zip(rows, amounts):
+                child = self._node(next_id, node_id, child_row, child_amount)
+                heapq.heappush(queue, (-abs(child["cumulative"]), next_id, child_row, child))
+                batch.append(child)
+                next_id += 1
+            if time.perf_counter() - last_yield >= batch_seconds:
+                yield self._labelled(batch)
+                batch, last_yield = [], time.perf_counter()
+        if batch:
+            yield self._labelled(batch)
+
+    def _node(self, node_id, parent_id, row, amount):
+        col = self.producer[row]
+        return {
+            "id": node_id,
+            "parent": parent_id,
+            "label": None,
+            "activity": int(self.activity_ids[col]) if col >= 0 else None,
+            "amount": float(amount),
+            "cumulative": float(amount * self.unit_scores[row]),
+            "direct": None,
+        }
+
+    @staticmethod
+    def _labelled(batch):
+        # Deduplicate nodes updated within the batch, then fetch labels in one query
+        nodes = list({node["id"]: node for node in batch}.values())
+        missing = {node["activity"] for node in nodes if node["label"] is None and node["activity"] is not None}
+        labels = activity_labels(missing) if missing else {}
+        for node in nodes:
+            if node["label"] is None:
+                node["label"] = labels.get(node["activity"], str(node["activity"]))
+        return nodes
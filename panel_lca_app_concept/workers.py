@@ -0,0 +1,374 @@
+import asyncio
+import functools
+import hashlib
+import importlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import bw2data as bd
+from bw2data.backends import Activity
+from bw2data.configuration import config
+from bw2data.signals import project_changed
+from tornado.ioloop import IOLoop
+
+# "single": every server process reads and writes the Brightway directory itself.
+# "shared": for ``panel serve --num-procs N``, one process becomes the writer and
+# the others open the SQLite databases read-only and forward their writes to it.
+WORKER_MODE = os.environ.get("PANEL_LCA_WORKER_MODE", "single")
+# How long a reader waits for a running writer to accept a connection, in seconds.
+# If the writer process has exited, forwarded writes fail at once with WriterUnavailable
+# and readers keep serving reads; the next process to start (e.g. the one Tornado forks
+# to replace it) becomes the writer, and readers reconnect to it.
+WRITER_CONNECT_TIMEOUT = float(os.environ.get("PANEL_LCA_WRITER_TIMEOUT", 30))
+# How long a reader waits for the writer to finish a forwarded write, in seconds
+WRITER_REPLY_TIMEOUT = float(os.environ.get("PANEL_LCA_WRITER_REPLY_TIMEOUT", 120))
+_LOCK_FILE = "panel-lca-writer.lock"
+_KEY_FILE = "panel-lca-writer.key"
+_PID_FILE = "panel-lca-writer.pid"
+
+_role = None
+_lock = threading.Lock()
+# Held while the current project is switched, and by worker threads while they read it (see bw.project_data)
+project_lock = threading.RLock()
+# Serializes forwarded writes when there is no event loop to run them on
+_write_lock = threading.Lock()
+# Kept open by the writer for its whole life, the lock is released when it exits
+_lock_fd = None
+# The server's event loop, recorded whenever a role is asked for on it
+_loop = None
+# Write functions by name, run by the writer on behalf of readers
+_write_functions = {}
+# Reader connections waiting for change notifications (writer only)
+_subscribers = []
+# Called with the project name after another process changed it (readers only)
+_change_callbacks = []
+
+
+class WriterUnavailable(Exception):
+    """Raised in a reader when no writer process accepts the forwarded write."""
+
+
+class _NodeRef:
+    """An Activity sent between processes by id, proxies don't survive pickling."""
+
+    def __init__(self, node_id: int):
+        self.id = node_id
+
+
+def _base_dir() -> Path:
+    return Path(bd.projects.dir).parent
+
+
+def _socket_path() -> str:
+    # Unix socket paths are limited to ~100 characters, BRIGHTWAY2_DIR may be longer
+    digest = hashlib.sha1(str(_base_dir().resolve()).encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"panel-lca-{digest}.sock")
+
+
+def role() -> str:
+    """``"single"``, or ``"writer"``/``"reader"`` in the shared mode, decided on first use."""
+    global _role
+    _remember_loop()
+    with _lock:
+        if _role is None:
+            _role = _elect() if WORKER_MODE == "shared" else "single"
+    return _role
+
+
+def _remember_loop() -> None:
+    global _loop
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Not on the event loop, e.g. at import or in a worker thread
+        return
+    _loop = IOLoop.current()
+
+
+def is_reader() -> bool:
+    return role() == "reader"
+
+
+def on_change(callback) -> None:
+    """Call ``callback(project)`` whenever the writer changed a project."""
+    _change_callbacks.append(callback)
+
+
+def _elect() -> str:
+    import fcntl
+
+    global _lock_fd
+    fd = os.open(_base_dir() / _LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        project_changed.connect(_configure_reader)
+        _configure_reader()
+        threading.Thread(target=_receive_changes, name="writer-changes", daemon=True).start()
+        print(f"Worker {os.getpid()} reads, writes go to the writer process")
+        return "reader"
+
+    _lock_fd = fd
+    (_base_dir() / _PID_FILE).write_text(str(os.getpid()))
+    project_changed.connect(_configure_writer)
+    _configure_writer()
+    key = os.urandom(32)
+    key_path = _base_dir() / _KEY_FILE
+    tmp = key_path.with_name(key_path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp, key_path)
+    if os.path.exists(_socket_path()):
+        os.unlink(_socket_path())
+    listener = Listener(_socket_path(), family="AF_UNIX", authkey=key)
+    threading.Thread(target=_accept, args=(listener,), name="writer-listener", daemon=True).start()
+    print(f"Worker {os.getpid()} is the writer")
+    return "writer"
+
+
+def _configure_reader(*args, **kwargs) -> None:
+    # Connections are replaced on every project change, permanent pragmas apply to new ones
+    for _, database in config.sqlite3_databases:
+        database.db.pragma("query_only", 1, permanent=True)
+
+
+def _configure_writer(*args, **kwargs) -> None:
+    # WAL lets readers query while the writer writes; the mode is stored in the file
+    for _, database in config.sqlite3_databases:
+        database.db.pragma("journal_mode", "wal")
+
+
+def set_current_read_only(project: str) -> None:
+    """Make ``project`` current in a process that only reads it, e.g. a Monte Carlo worker."""
+    bd.projects.set_current(project, writable=False, update=False)
+    if WORKER_MODE == "shared":
+        # Readers' children must not write to the databases either
+        _configure_reader()
+
+
+def _to_wire(value):
+    return _NodeRef(value.id) if isinstance(value, Activity) else value
+
+
+def _from_wire(value):
+    return bd.get_node(id=value.id) if isinstance(value, _NodeRef) else value
+
+
+def _data_version():
+    """Changes whenever a write replaces the current project or the metadata of its databases or methods."""
+    version = []
+    for path in (bd.projects.dir, bd.databases.filepath, bd.methods.filepath):
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+def _write(func, args, kwargs):
+    """Run a write function in this process; returns its result and whether it changed any data."""
+    with project_lock:
+        before = _data_version()
+        result = func(*args, **kwargs)
+        changed = _data_version() != before
+        if changed and role() == "writer":
+            _after_write(bd.projects.current)
+    return result, changed
+
+
+def forward_writes(func):
+    """Run ``func`` in the writer process when this one only reads; readers reload if it changed data."""
+    name = f"{func.__module__}.{func.__qualname__}"
+    _write_functions[name] = func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if role() == "reader":
+            result, changed = _call_writer(name, bd.projects.current, args, kwargs)
+            if changed:
+                _reload(bd.projects.current)
+            return _from_wire(result)
+        return _write(func, args, kwargs)[0]
+
+    wrapper.write_name = name
+    return wrapper
+
+
+async def run_write(write, *args, **kwargs):
+    """
+    Call a ``forward_writes`` function from a session callback.
+
+    In a reader, the call to the writer runs in a thread, so a slow or stuck
+    writer doesn't hold up the event loop; the reload after a change runs
+    back on the loop. Elsewhere the write runs right away.
+    """
+    if role() != "reader":
+        return write(*args, **kwargs)
+    project = bd.projects.current
+    result, changed = await asyncio.to_thread(_call_writer, write.write_name, project, args, kwargs)
+    if changed:
+        _reload(project)
+    return _from_wire(result)
+
+
+def _writer_running() -> bool:
+    """Whether the process that last became the writer is still alive."""
+    try:
+        os.kill(int((_base_dir() / _PID_FILE).read_text()), 0)
+    except PermissionError:
+        # Alive, but run by another user
+        return True
+    except (OSError, ValueError):
+        # Also when the pid file is missing, i.e. no writer was ever elected
+        return False
+    return True
+
+
+def _connect(timeout: float = WRITER_CONNECT_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while True:
+        try:
+            key = (_base_dir() / _KEY_FILE).read_bytes()
+            return Client(_socket_path(), family="AF_UNIX", authkey=key)
+        except (OSError, EOFError, AuthenticationError):
+            if not _writer_running():
+                raise WriterUnavailable("The writer process is not running, changes can't be saved until one starts")
+            # The writer may still be starting up
+            if time.monotonic() > deadline:
+                raise WriterUnavailable(f"No writer process is listening on {_socket_path()}")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+
+def _call_writer(name: str, project: str, args, kwargs):
+    """Returns the result of the write and whether it changed any data."""
+    with _connect() as conn:
+        conn.send(("call", name, project, args, kwargs))
+        try:
+            if not conn.poll(WRITER_REPLY_TIMEOUT):
+                raise WriterUnavailable(f"The writer process did not finish {name} within {WRITER_REPLY_TIMEOUT:g} s")
+            status, value = conn.recv()
+        except EOFError:
+            raise WriterUnavailable(f"The writer process closed the connection during {name}")
+    if status == "error":
+        raise value
+    return value
+
+
+def _accept(listener) -> None:
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            print(f"Writer connection error: {e}")
+            continue
+        threading.Thread(target=_serve, args=(conn,), daemon=True).start()
+
+
+def _serve(conn) -> None:
+    try:
+        request = conn.recv()
+    except (EOFError, OSError):
+        conn.close()
+        return
+    if request == "subscribe":
+        with _lock:
+            _subscribers.append(conn)
+        return
+    _, name, project, args, kwargs = request
+    future = Future()
+
+    def run():
+        try:
+            if name not in _write_functions:
+                # Registered when its module is imported, which this process may not have done yet
+                importlib.import_module(name.rsplit(".", 1)[0])
+            # The writer's own sessions and jobs keep their project
+            with project_lock:
+                previous = bd.projects.current
+                try:
+                    if previous != project:
+                        bd.projects.set_current(project)
+                    result, changed = _write(_write_functions[name], args, kwargs)
+                finally:
+                    if bd.projects.current != previous:
+                        bd.projects.set_current(previous)
+            future.set_result(("ok", (_to_wire(result), changed)))
+        except Exception as e:
+            future.set_result(("error", e))
+
+    # Writes run on the server's event loop, one at a time with the writer's own sessions;
+    # before a session has recorded the loop, nothing else runs on it yet
+    loop = _loop
+    if loop is not None:
+        loop.add_callback(run)
+    else:
+        with _write_lock:
+            run()
+    reply = future.result()
+    try:
+        try:
+            conn.send(reply)
+        except Exception:
+            # The exception itself may not pickle
+            conn.send(("error", RuntimeError(repr(reply[1]))))
+    except OSError as e:
+        print(f"Writer reply error: {e}")
+    finally:
+        conn.close()
+
+
+def _after_write(project: str) -> None:
+    # Process changed databases here, so readers never have to write their datapackages
+    bd.databases.clean()
+    with _lock:
+        subscribers = list(_subscribers)
+    for conn in subscribers:
+        try:
+            conn.send(("changed", project))
+        except OSError:
+            with _lock:
+                _subscribers.remove(conn)
+
+
+def _reload(project: str) -> None:
+    # Callbacks drop caches the event loop reads, worker threads wait for the lock
+    with project_lock:
+        if project != bd.projects.current:
+            # ``set_current`` reads the metadata of the other project anew anyway
+            return
+        bd.databases.load()
+        bd.methods.load()
+        for callback in _change_callbacks:
+            try:
+                callback(project)
+            except Exception as e:
+                print(f"Change callback error: {e}")
+
+
+def _receive_changes() -> None:
+    while True:
+        try:
+            with _connect(timeout=float("inf")) as conn:
+                conn.send("subscribe")
+                while True:
+                    _, project = conn.recv()
+                    # Sessions read the reloaded metadata and caches on the event loop
+                    loop = _loop
+                    if loop is not None:
+                        loop.add_callback(_reload, project)
+                    else:
+                        _reload(project)
+        except (EOFError, OSError, WriterUnavailable):
+            # The writer went away, wait for the next one
+            time.sleep(1)
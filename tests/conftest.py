@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+import pytest
+
+# bw2data picks its data directory on import, so the tests get their own
+# before any of them imports the package
+_bw_dir = tempfile.TemporaryDirectory(prefix="panel-lca-tests-")
+os.environ["BRIGHTWAY2_DIR"] = _bw_dir.name
+
+
+@pytest.fixture(scope="session")
+def synthetic_project():
+    """A project with a small ``add_synthetic_database``, current for the whole session."""
+    import bw2data as bd
+
+    from panel_lca_app_concept.demo_databases import add_synthetic_database
+
+    bd.projects.set_current("tests-synthetic")
+    add_synthetic_database(300, seed=1, cycle_share=0.05)
+    return "tests-synthetic"
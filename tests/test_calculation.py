@@ -0,0 +1,129 @@
+import bw2data as bd
+import numpy as np
+import pytest
+from scipy import sparse
+from scipy.sparse.linalg import spsolve, splu
+
+from panel_lca_app_concept import calculation
+from panel_lca_app_concept.calculation import (
+    FactorizedMultiLCA,
+    _low_rank_solvers,
+    _lu_solver,
+    _lu_transposed_solver,
+    solve_multilca,
+)
+
+METHOD = ("synthetic", "synthetic", "random")
+
+
+def technosphere(n: int, seed: int = 0) -> sparse.csc_matrix:
+    """A random sparse matrix shaped like a technosphere: unit diagonal, small negative inputs."""
+    rng = np.random.default_rng(seed)
+    inputs = sparse.random(n, n, density=5 / n, random_state=rng, data_rvs=lambda k: -rng.uniform(0, 0.1, k))
+    return (sparse.eye(n) + inputs).tocsc()
+
+
+def column_change(matrix, columns, seed: int = 1) -> sparse.csc_matrix:
+    """A change of ``matrix`` in ``columns`` only, including their diagonal."""
+    rng = np.random.default_rng(seed)
+    rows, cols = [], []
+    for col in columns:
+        rows += [col, *rng.choice(matrix.shape[0], 3, replace=False)]
+        cols += [col] * 4
+    values = rng.uniform(-0.05, 0.05, len(rows))
+    return sparse.csc_matrix((values, (rows, cols)), shape=matrix.shape)
+
+
+def test_lu_solvers_match_superlu():
+    A = technosphere(200)
+    lu = splu(A)
+    b = np.random.default_rng(2).uniform(size=200)
+    np.testing.assert_allclose(_lu_solver(lu.L, lu.U, lu.perm_r, lu.perm_c)(b), lu.solve(b), rtol=1e-12)
+    np.testing.assert_allclose(
+        _lu_transposed_solver(lu.L, lu.U, lu.perm_r, lu.perm_c)(b), lu.solve(b, trans="T"), rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("columns", [[7], [3, 50, 51, 199]])
+def test_low_rank_solvers_match_refactorization(columns):
+    A = technosphere(200)
+    delta = column_change(A, columns)
+    lu = splu(A)
+    solve, solve_transposed = _low_rank_solvers(
+        lu.solve, lambda b: lu.solve(b, trans="T"), delta, np.array(columns)
+    )
+    b = np.random.default_rng(3).uniform(size=200)
+    changed = (A + delta).tocsc()
+    np.testing.assert_allclose(solve(b), spsolve(changed, b), rtol=1e-10)
+    np.testing.assert_allclose(solve_transposed(b), spsolve(changed.T.tocsc(), b), rtol=1e-10)
+
+
+@pytest.fixture(scope="module")
+def mlca(synthetic_project):
+    ids = [node.id for node in bd.Database("synthetic")]
+    return solve_multilca({"first": {ids[0]: 1.0}, "middle": {ids[150]: 2.0}}, [METHOD])
+
+
+def exchange_changes(n: int, scale: float = 0.5) -> list[tuple]:
+    """
+    ``(type, input_id, output_id, delta)`` scaling the first technosphere
+    input of ``n`` processes that have one, and raising an emission of the
+    first of them.
+    """
+    changes = []
+    for node in bd.Database("synthetic"):
+        exchange = next(iter(node.technosphere()), None)
+        if exchange is None:
+            continue
+        if not changes:
+            changes.append(("biosphere", next(iter(node.biosphere())).input.id, node.id, 1.0))
+        changes.append(("technosphere", exchange.input.id, node.id, exchange["amount"] * scale))
+        if len(changes) > n:
+            return changes
+    raise AssertionError(f"fewer than {n} processes have technosphere inputs")
+
+
+def assert_same_results(lca, expected):
+    for name, supply in expected.supply_arrays.items():
+        np.testing.assert_allclose(lca.supply_arrays[name], supply, rtol=1e-9, atol=1e-12)
+    for key, score in expected.scores.items():
+        assert lca.scores[key] == pytest.approx(score, rel=1e-9)
+
+
+def test_exchange_changes_low_rank_matches_refactorization(mlca, monkeypatch):
+    changes = exchange_changes(5)
+    refactorized = mlca.with_exchange_changes(changes, max_columns=0)
+    decompositions = []
+    monkeypatch.setattr(FactorizedMultiLCA, "decompose_technosphere", lambda self: decompositions.append(self))
+    updated = mlca.with_exchange_changes(changes)
+    assert decompositions == []
+    assert_same_results(updated, refactorized)
+    # Cumulative impacts use the transposed solve of the updated matrix
+    vector = np.random.default_rng(4).uniform(size=updated.technosphere_matrix.shape[0])
+    np.testing.assert_allclose(
+        updated.solve_transposed(vector), refactorized.solve_transposed(vector), rtol=1e-9
+    )
+
+
+def test_exchange_changes_leave_the_original_untouched(mlca):
+    matrix, scores = mlca.technosphere_matrix.copy(), dict(mlca.scores)
+    updated = mlca.with_exchange_changes(exchange_changes(3))
+    assert (mlca.technosphere_matrix != matrix).nnz == 0
+    assert mlca.scores == scores
+    assert updated.scores != scores
+
+
+def test_exchange_changes_refactorize_beyond_max_columns(mlca, monkeypatch):
+    changes = exchange_changes(calculation.LOW_RANK_MAX_COLUMNS + 4)
+    expected = mlca.with_exchange_changes(changes, max_columns=len(changes))
+    decompose = FactorizedMultiLCA.decompose_technosphere
+    decompositions = []
+
+    def counting(self):
+        decompositions.append(self)
+        decompose(self)
+
+    monkeypatch.setattr(FactorizedMultiLCA, "decompose_technosphere", counting)
+    updated = mlca.with_exchange_changes(changes)
+    assert decompositions == [updated]
+    assert_same_results(updated, expected)
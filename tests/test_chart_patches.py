@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import panel as pn
+import pytest
+from bokeh.document import Document
+from bokeh.protocol import Protocol
+
+from panel_lca_app_concept import charts
+from panel_lca_app_concept.calculation import N_CONTRIBUTORS, OTHER_LABEL
+
+COLORS = [f"#{i:02x}4fcf" for i in range(0, 255, 28)]
+# About 1.5 times what an update sends now, JSON plus binary buffers
+BYTE_CEILINGS = {
+    ("stacked bars", 8): 3_000,
+    ("stacked bars", 500): 56_000,
+    ("sankey", 8): 3_000,
+    ("sankey", 500): 3_000,
+}
+
+
+def results(n_products: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    stages = [f"process {i} (GLO)" for i in range(N_CONTRIBUTORS)] + [OTHER_LABEL]
+    return pd.DataFrame(
+        [(f"product {p}", stage, float(rng.uniform(0, 10))) for p in range(n_products) for stage in stages],
+        columns=["product", "stage", "value"],
+    )
+
+
+def patch_messages(fig, update) -> list[int]:
+    """Sizes of the PATCH-DOC messages ``update()`` sends for a figure shown in a Plotly pane."""
+    pane = pn.pane.Plotly(fig)
+    doc = Document()
+    root = pane.get_root(doc)
+    doc.add_root(root)
+    events = []
+    doc.on_change(events.append)
+    update()
+    protocol = Protocol()
+    sizes = []
+    for event in events:
+        msg = protocol.create("PATCH-DOC", [event])
+        sizes.append(
+            len(msg.header_json) + len(msg.metadata_json) + len(msg.content_json)
+            + sum(len(buffer.to_bytes()) for buffer in msg.buffers)
+        )
+    pane._cleanup(root)
+    return sizes
+
+
+@pytest.mark.parametrize("n_products", [8, 500])
+@pytest.mark.parametrize("chart, plot, update", [
+    ("stacked bars", lambda df: charts.plot_stacked_bars(df, colors=COLORS),
+     lambda fig, df: charts.update_stacked_bars(fig, df, colors=COLORS)),
+    ("sankey", charts.plot_sankey, charts.update_sankey),
+])
+def test_update_sends_one_patch(chart, plot, update, n_products):
+    fig = plot(results(n_products, seed=0))
+    after = results(n_products, seed=1)
+    sizes = patch_messages(fig, lambda: update(fig, after))
+    assert len(sizes) == 1
+    assert sizes[0] <= BYTE_CEILINGS[chart, n_products]
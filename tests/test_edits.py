@@ -0,0 +1,63 @@
+import asyncio
+
+import bw2data as bd
+import pytest
+
+from panel_lca_app_concept.edits import ExchangeEdits
+
+
+@pytest.fixture
+def exchanges(synthetic_project):
+    """Two technosphere exchanges of the synthetic database with their ids."""
+    found = []
+    for node in bd.Database("synthetic"):
+        for exchange in node.technosphere():
+            found.append((exchange._document.id, exchange.input.id, node.id, exchange["amount"]))
+            if len(found) == 2:
+                return found
+    raise AssertionError("the synthetic database has fewer than two technosphere exchanges")
+
+
+def stored_amount(exchange_id: int) -> float:
+    return bd.backends.ExchangeDataset.get_by_id(exchange_id).data["amount"]
+
+
+def test_set_amount_keeps_the_stored_amount(exchanges):
+    (first, input_id, output_id, amount), _ = exchanges
+    edits = ExchangeEdits()
+    edits.set_amount(first, "technosphere", input_id, output_id, amount, amount + 1)
+    # A second edit of the same exchange is still relative to what is stored
+    edits.set_amount(first, "technosphere", input_id, output_id, amount + 1, amount + 3)
+    assert len(edits) == 1
+    assert edits.amounts() == {first: amount + 3}
+    assert edits.changes() == [("technosphere", input_id, output_id, pytest.approx(3))]
+    edits.set_amount(first, "technosphere", input_id, output_id, amount + 3, amount)
+    assert len(edits) == 0
+
+
+def test_commit_writes_all_edits(exchanges):
+    edits = ExchangeEdits()
+    for exchange_id, input_id, output_id, amount in exchanges:
+        edits.set_amount(exchange_id, "technosphere", input_id, output_id, amount, amount * 2)
+    changes = asyncio.run(edits.commit())
+    assert len(edits) == 0
+    assert changes == [
+        ("technosphere", input_id, output_id, pytest.approx(amount))
+        for _, input_id, output_id, amount in exchanges
+    ]
+    for exchange_id, _, _, amount in exchanges:
+        assert stored_amount(exchange_id) == pytest.approx(amount * 2)
+    # Restore the database for the other tests
+    for exchange_id, input_id, output_id, amount in exchanges:
+        edits.set_amount(exchange_id, "technosphere", input_id, output_id, amount * 2, amount)
+    asyncio.run(edits.commit())
+
+
+def test_discard_writes_nothing(exchanges):
+    exchange_id, input_id, output_id, amount = exchanges[0]
+    edits = ExchangeEdits()
+    edits.set_amount(exchange_id, "technosphere", input_id, output_id, amount, amount + 1)
+    edits.discard()
+    assert len(edits) == 0
+    assert asyncio.run(edits.commit()) == []
+    assert stored_amount(exchange_id) == pytest.approx(amount)
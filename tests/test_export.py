@@ -0,0 +1,63 @@
+import io
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from panel_lca_app_concept import export
+from panel_lca_app_concept.export import ROUTES, export_file, frame_chunks
+
+
+def table(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "id": np.arange(rows, dtype="int64") + 2**60,
+        "name": [f"production of product {i}" for i in range(rows)],
+        "score": rng.uniform(size=rows),
+    })
+
+
+class ExportRouteTest(AsyncHTTPTestCase):
+    def get_app(self):
+        return Application(ROUTES)
+
+    def test_sends_the_export_once(self):
+        df = table(1_000)
+        token = export_file(frame_chunks(df, 300), "csv")
+        response = self.fetch(f"/export/{token}/processes.csv")
+        assert response.code == 200
+        assert response.headers["Content-Disposition"] == 'attachment; filename="processes.csv"'
+        pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(response.body)), df)
+        assert self.fetch(f"/export/{token}/processes.csv").code == 404
+        assert not list(export.EXPORT_DIR.glob(f"{token}*"))
+
+    def test_streams_without_holding_the_file(self):
+        df = table(400_000)
+        token = export_file(frame_chunks(df, 50_000), "csv")
+        size = (export.EXPORT_DIR / token).stat().st_size
+        received = []
+        tracemalloc.start()
+        try:
+            response = self.fetch(f"/export/{token}/big.csv", streaming_callback=lambda data: received.append(len(data)))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert response.code == 200
+        assert sum(received) == size
+        assert peak < size / 4
+
+    def test_unknown_token_is_not_found(self):
+        assert self.fetch("/export/unknown/export.csv").code == 404
+
+
+def test_exports_expire(monkeypatch):
+    stale = export_file(frame_chunks(table(10)), "csv")
+    path = export.EXPORT_DIR / stale
+    os.utime(path, (time.time() - export.EXPORT_TTL - 1,) * 2)
+    fresh = export_file(frame_chunks(table(10)), "csv")
+    assert not path.exists()
+    assert (export.EXPORT_DIR / fresh).exists()
@@ -0,0 +1,90 @@
+"""
+Check what starting the app imports, with ``python -X importtime``.
+
+``app/app.py`` is run in a fresh interpreter and the top-level imports a
+bare interpreter does not do are added up, so the list of startup modules
+follows the app. None of them may pull in a module that should only be
+loaded on first use, and together they may take at most ``MARGIN`` longer
+than importing the app's dependencies (``DEPENDENCY_MODULES``) measured the
+same way, as the app's own modules should add little to them. The time
+depends on the machine and a warm disk cache, so the best of ``REPEAT``
+runs is compared. The first run builds the demo project in the tests'
+``BRIGHTWAY2_DIR``.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app" / "app.py"
+# What the app can't start without, the budget is relative to them
+DEPENDENCY_MODULES = ["panel", "panel_material_ui", "bw2data"]
+# Loaded on first use only; scipy is not listed as bw2data imports it
+DEFERRED_MODULES = [
+    "bw2calc",
+    "plotly",
+    "panel_lca_app_concept.calculation",
+    "panel_lca_app_concept.charts",
+    "panel_lca_app_concept.scores",
+    "panel_lca_app_concept.pages.calculation_setup",
+    "panel_lca_app_concept.pages.impact_overview",
+    "panel_lca_app_concept.pages.contribution_analysis",
+]
+# Allowed slowdown of the startup imports over the dependencies alone
+MARGIN = 0.25
+REPEAT = 3
+
+
+def import_times(code: str) -> list[tuple[str, int, int]]:
+    """(module, depth, cumulative µs) of every import of ``code``, in the order ``-X importtime`` reports them."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=os.environ.copy(), cwd=APP_PATH.parent.parent,
+    )
+    assert result.returncode == 0, result.stderr
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(cumulative_us)))
+    return rows
+
+
+def best_run(code: str, bare: set) -> tuple[set, float]:
+    """Imported modules and milliseconds of top-level imports of the fastest of ``REPEAT`` runs of ``code``."""
+    runs = []
+    for _ in range(REPEAT):
+        rows = import_times(code)
+        # Interpreter startup (site, encodings) shows up as top-level imports too
+        total = sum(
+            cumulative for name, depth, cumulative in rows
+            if depth == 0 and name not in bare and name != "runpy"
+        )
+        runs.append(({name for name, *_ in rows}, total / 1e3))
+    return min(runs, key=lambda run: run[1])
+
+
+@pytest.fixture(scope="module")
+def startup():
+    bare = {name for name, *_ in import_times("pass")}
+    # Builds the demo project before anything is timed
+    import_times(f"import runpy; runpy.run_path({str(APP_PATH)!r})")
+    imported, total = best_run(f"import runpy; runpy.run_path({str(APP_PATH)!r})", bare)
+    _, dependencies = best_run("import " + ", ".join(DEPENDENCY_MODULES), bare)
+    return imported, total, dependencies
+
+
+@pytest.mark.parametrize("module", DEFERRED_MODULES)
+def test_module_not_imported_at_startup(startup, module):
+    imported, _, _ = startup
+    assert module not in imported
+
+
+def test_startup_imports_within_budget(startup):
+    _, total, dependencies = startup
+    budget = dependencies * (1 + MARGIN)
+    assert total <= budget, f"startup imports take {total:.0f} ms, budget is {budget:.0f} ms"
@@ -0,0 +1,22 @@
+import threading
+
+from panel_lca_app_concept import jobs
+
+
+def test_watch_reports_a_finished_job_once():
+    job = jobs.submit(("test", "finished"), lambda progress: 42)
+    job.future.result()
+    results = []
+    job.watch(on_done=lambda future: results.append(future.result()))
+    # A watcher attached while the job ends is reported by both watch and _finished
+    job._finished(job.future)
+    assert results == [42]
+
+
+def test_identical_requests_share_a_job():
+    release = threading.Event()
+    first = jobs.submit(("test", "shared"), lambda progress: release.wait())
+    second = jobs.submit(("test", "shared"), lambda progress: None)
+    release.set()
+    assert first is second
+    assert first.future.result() is True